@@ -7,16 +7,25 @@ from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from config import config
+from utils.http_cache import apply_cache_control
 
 db = SQLAlchemy()
 
-def create_app(config_name=None):
-    """Create Flask application using the factory pattern"""
-    app = Flask(__name__)
+def create_app(config_name=None, background_workers=False, instance_path=None):
+    """
+    Create Flask application using the factory pattern
+    
+    Background threads and worker pools are only started with
+    background_workers, i.e. by the served app in api.py. Scripts leave them
+    off and do that work inline, or leave it queued for the served app.
+    instance_path overrides the instance folder (caches, uploads, locks).
+    """
+    app = Flask(__name__, instance_path=instance_path)
     
     # Load configuration
     config_name = config_name or os.getenv('FLASK_ENV', 'development')
     app.config.from_object(config[config_name])
+    app.config['BACKGROUND_WORKERS'] = background_workers
     
     # Configure logging
     if app.debug:
@@ -43,7 +52,9 @@ def create_app(config_name=None):
         
         for header, value in security_headers.items():
             response.headers[header] = value
-        return response
+        
+        # Per-route Cache-Control for responses that carry validators
+        return apply_cache_control(response)
     
     # Register blueprints
     from routes.auth import auth_bp
@@ -51,15 +62,44 @@ def create_app(config_name=None):
     from routes.posts import posts_bp
     from routes.settings import settings_bp
     from routes.uploads import uploads_bp
+    from routes.email import email_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(blog_bp, url_prefix='/api/blog')
     app.register_blueprint(posts_bp)
     app.register_blueprint(settings_bp, url_prefix='/api')
     app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
+    app.register_blueprint(email_bp, url_prefix='/api/email')
     
     # Create database tables
     with app.app_context():
         db.create_all()
+        
+        # Full-text search index over posts, kept in sync by triggers
+        from utils.search import ensure_search_index
+        if ensure_search_index(db):
+            app.logger.info("Created the blog search index")
+    
+    # Start buffering post view counts, caching responses and principals,
+    # computing related posts, keeping static copies of published posts and
+    # optimizing uploaded images
+    from utils.view_counter import view_counter
+    from utils.cache import response_cache
+    from utils.auth import principal_cache
+    from utils.related import related_posts
+    from utils.prerender import static_posts
+    from utils.images import image_processor
+    from utils.transforms import image_transformer
+    from utils.outbox import email_outbox
+    from utils.passwords import password_hasher
+    view_counter.init_app(app)
+    response_cache.init_app(app)
+    principal_cache.init_app(app)
+    static_posts.init_app(app)
+    related_posts.init_app(app)
+    image_processor.init_app(app)
+    image_transformer.init_app(app)
+    email_outbox.init_app(app)
+    password_hasher.init_app(app)
     
     return app
\ No newline at end of file
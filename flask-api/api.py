@@ -4,7 +4,7 @@ Modular Flask API Application
 """
 from __init__ import create_app, db
 
-app = create_app()
+app = create_app(background_workers=True)
 
 if __name__ == '__main__':
     app.run(debug=True, passthrough_errors=True)
\ No newline at end of file
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Index audit for the hot API query shapes
+
+Replays each endpoint below against a scratch SQLite database that carries
+the live database's schema (or the models' schema with --models), records
+every SELECT it issues and runs EXPLAIN QUERY PLAN on it. Exits non-zero if
+any statement falls back to a full table scan or a temporary sort.
+"""
+import re
+import sys
+from sqlalchemy import event, text
+from werkzeug.security import generate_password_hash
+
+from __init__ import create_app, db
+from utils.search import SEARCH_TABLE, ensure_search_index
+
+# (description, path, needs admin token)
+ENDPOINTS = [
+    ('Public listing', '/api/blog/posts?status=published', False),
+    ('Public listing by category', '/api/blog/posts?status=published&category=Tech', False),
+    ('Public listing, cursor mode', '/api/blog/posts?status=published&cursor=', False),
+    ('Admin listing', '/api/blog/posts?per_page=100', False),
+    ('Admin listing by status', '/api/blog/posts?status=draft', False),
+    ('Admin listing by category', '/api/blog/posts?category=Tech', False),
+    ('Admin listing by author', '/api/blog/posts?author_id=1', False),
+    ('Post detail', '/api/blog/posts/audit-post', False),
+    ('Post by id', '/api/blog/posts/1', False),
+    ('Public listing by tag', '/api/blog/posts?status=published&tag=audit', False),
+    ('Admin listing by tag', '/api/blog/posts?tag=audit', False),
+    ('Tags', '/api/blog/tags', False),
+    ('Public listing by category id', '/api/blog/posts?status=published&category_id=1', False),
+    ('Categories', '/api/blog/categories', False),
+    ('Search', '/api/blog/search?q=audit', False),
+    ('RSS feed', '/api/blog/feed.xml', False),
+    ('Atom feed', '/api/blog/atom.xml', False),
+    ('Sitemap', '/api/blog/sitemap.xml', False),
+    ('Pending comments', '/api/blog/comments/pending?page=1&per_page=10', True),
+    ('Email verification', '/verify-email?token=audit-token', False),
+    ('Email outbox by status', '/api/email/outbox?status=failed', True),
+]
+
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+BOUNDED_SORT_INDEX = 'ix_blog_post_tags_tag_post'
+
+def copy_live_schema(live_app):
+    """Read the CREATE statements of the configured database"""
+    with live_app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            sys.exit('The index audit uses EXPLAIN QUERY PLAN and only supports SQLite')
+        # The search index and its shadow tables are recreated by ensure_search_index
+        rows = db.session.execute(text(
+            "SELECT type, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "AND name NOT LIKE :search"
+        ), {'search': SEARCH_TABLE + '%'}).all()
+    # Tables first so indexes have something to attach to
+    return [sql for kind, sql in sorted(rows, key=lambda row: row[0] != 'table')]
+
+def seed(models):
+    """Insert just enough rows for every endpoint to run its full query set"""
+    from models.user import User
+    from utils.tags import sync_post_tags
+    from utils.categories import link_post_category
+    BlogPost, BlogComment = models['BlogPost'], models['BlogComment']
+
+    admin = User(username='audit', password=generate_password_hash('audit-password'), email='audit@example.com',
+                 firstname='Audit', lastname='User', is_admin=True, email_verified=True,
+                 email_verification_token='audit-token')
+    db.session.add(admin)
+    db.session.flush()
+
+    post = BlogPost(title='Audit post', slug='audit-post', content='Audit', author_id=admin.id,
+                    status='published', tags='Audit, Index')
+    link_post_category(post, 'Tech', create=True)
+    sync_post_tags(post)
+    db.session.add(post)
+    db.session.flush()
+
+    comment = BlogComment(post_id=post.id, content='Audit', author_name='Audit',
+                          author_email='audit@example.com', status='approved')
+    db.session.add(comment)
+    db.session.flush()
+    db.session.add(BlogComment(post_id=post.id, content='Reply', author_name='Audit',
+                               author_email='audit@example.com', status='pending', parent_id=comment.id))
+    db.session.commit()
+    return admin
+
+def full_scans(connection, statement, parameters):
+    """Return the plan lines of statement that scan a table without an index"""
+    plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+    # A sort is fine when only the rows of a selective lookup are sorted:
+    # a full-text match or a single tag's posts
+    bounded = f'{SEARCH_TABLE} MATCH' in statement or any(
+        detail.startswith('SEARCH') and BOUNDED_SORT_INDEX in detail for detail in plan
+    )
+    problems = []
+    for detail in plan:
+        match = SCAN_RE.match(detail)
+        if (match and not match.group(1).startswith('anon_')) or ('USE TEMP B-TREE' in detail and not bounded):
+            problems.append(detail)
+    return problems
+
+def audit(use_models=False):
+    schema = None if use_models else copy_live_schema(create_app())
+
+    app = create_app('testing')
+    from shared_models import get_models
+    from utils.auth import generate_access_token
+    from utils.cache import response_cache
+    response_cache.enabled = False
+
+    failures = 0
+    with app.app_context():
+        if schema is not None:
+            db.drop_all()
+            for sql in schema:
+                db.session.execute(text(sql))
+            db.session.commit()
+            ensure_search_index(db)
+        admin = seed(get_models())
+        with app.test_request_context():
+            token = generate_access_token(admin)
+
+        captured = []
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and not executemany:
+                captured.append((statement, parameters))
+        event.listen(db.engine, 'before_cursor_execute', capture)
+
+        client = app.test_client()
+        for description, path, needs_admin in ENDPOINTS:
+            captured.clear()
+            headers = {'Authorization': f'Bearer {token}'} if needs_admin else {}
+            status = client.get(path, headers=headers).status_code
+            db.session.remove()
+
+            print(f"\n{description}: GET {path} -> {status} ({len(captured)} queries)")
+            with db.engine.connect() as connection:
+                for statement, parameters in captured:
+                    problems = full_scans(connection, statement, parameters)
+                    summary = ' '.join(statement.split())[:110]
+                    if problems:
+                        failures += 1
+                        print(f"  FAIL {summary}")
+                        for problem in problems:
+                            print(f"       {problem}")
+                    else:
+                        print(f"  ok   {summary}")
+
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    print(f"\n{failures} statement(s) fall back to a full scan or temporary sort" if failures
+          else "\nAll audited statements use indexes")
+    return failures
+
+if __name__ == '__main__':
+    sys.exit(1 if audit(use_models='--models' in sys.argv[1:]) else 0)
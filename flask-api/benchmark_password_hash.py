@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Time password hashing cost settings on this machine
+
+Prints how long one hash takes for a range of scrypt and pbkdf2 costs and
+how many logins per second a worker sustains with PASSWORD_HASH_WORKERS
+hashing threads, then suggests the strongest PASSWORD_HASH_METHOD that
+stays under the target time. Run it on the production host (or one like
+it); existing hashes are upgraded to the new method as users log in.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+
+SCRYPT_METHODS = [f'scrypt:{2 ** exponent}:8:1' for exponent in range(14, 18)]
+PBKDF2_METHODS = [f'pbkdf2:sha256:{iterations}' for iterations in (260000, 600000, 1000000)]
+
+def time_hash(method, rounds):
+    """Median seconds for one hash with method"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        generate_password_hash('benchmark-password', method)
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2]
+
+def throughput(method, threads, hashes):
+    """Hashes per second with threads hashing in parallel"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: generate_password_hash('benchmark-password', method), range(hashes)))
+    return hashes / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time password hashing cost settings")
+    parser.add_argument('--target-ms', type=float, default=250,
+                        help="Longest acceptable time for one hash (default 250)")
+    parser.add_argument('--rounds', type=int, default=3, help="Hashes timed per setting (default 3)")
+    parser.add_argument('--workers', type=int, default=max(Config.PASSWORD_HASH_WORKERS, 1),
+                        help="Hashing threads per worker for the throughput figure "
+                             "(default PASSWORD_HASH_WORKERS)")
+    args = parser.parse_args()
+
+    print(f"Current PASSWORD_HASH_METHOD: {Config.PASSWORD_HASH_METHOD}")
+    print(f"{'method':<28} {'ms/hash':>8}")
+    results = []
+    for method in SCRYPT_METHODS + PBKDF2_METHODS:
+        seconds = time_hash(method, args.rounds)
+        results.append((method, seconds))
+        print(f"{method:<28} {seconds * 1000:8.1f}")
+
+    # Settings are listed weakest first within each algorithm; scrypt is preferred
+    # because it is memory-hard as well as slow
+    fitting = [method for method, seconds in results if seconds * 1000 <= args.target_ms]
+    scrypt = [method for method in fitting if method.startswith('scrypt')]
+    pbkdf2 = [method for method in fitting if method.startswith('pbkdf2')]
+    suggested = scrypt[-1] if scrypt else (pbkdf2[-1] if pbkdf2 else None)
+    if suggested is None:
+        print(f"\nNo setting hashes within {args.target_ms:.0f}ms on this machine")
+        return False
+
+    rate = throughput(suggested, args.workers, max(args.rounds, args.workers) * 2)
+    print(f"\n{suggested}: about {rate:.1f} logins/s per worker with {args.workers} hashing thread(s)")
+    print(f"Suggested setting: PASSWORD_HASH_METHOD={suggested}")
+    return True
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
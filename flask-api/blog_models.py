@@ -4,6 +4,25 @@ from datetime import datetime
 def create_blog_models(db):
     """Create blog models with the provided database instance"""
     
+    # Post <-> tag association. The primary key serves post -> tags and the
+    # (tag_id, post_id) index serves tag -> posts
+    blog_post_tags = db.Table(
+        'blog_post_tags',
+        db.Column('post_id', db.Integer, db.ForeignKey('blog_posts.id'), primary_key=True),
+        db.Column('tag_id', db.Integer, db.ForeignKey('blog_tags.id'), primary_key=True),
+        db.Index('ix_blog_post_tags_tag_post', 'tag_id', 'post_id'),
+    )
+    
+    # Post -> uploaded image references, kept in step with each post's content
+    # and featured image. The primary key serves image -> posts (may it be
+    # deleted?) and the (post_id, image_id) index serves post -> images
+    image_references = db.Table(
+        'image_references',
+        db.Column('image_id', db.Integer, db.ForeignKey('image_uploads.id'), primary_key=True),
+        db.Column('post_id', db.Integer, db.ForeignKey('blog_posts.id'), primary_key=True),
+        db.Index('ix_image_references_post_image', 'post_id', 'image_id'),
+    )
+    
     class BlogPost(db.Model):
         __tablename__ = 'blog_posts'
         id = db.Column(db.Integer, primary_key=True)
@@ -24,8 +43,9 @@ def create_blog_models(db):
         published_at = db.Column(db.DateTime)
         
         # Categories and tags
-        category = db.Column(db.String(100))
-        tags = db.Column(db.Text)  # JSON array of tags
+        category_id = db.Column(db.Integer, db.ForeignKey('blog_categories.id'))
+        category = db.Column(db.String(100))  # Name of category_id's category, kept for display
+        tags = db.Column(db.Text)  # Comma-separated tags as entered; normalized into tag_rows
         
         # Analytics
         view_count = db.Column(db.Integer, default=0)
@@ -35,8 +55,23 @@ def create_blog_models(db):
         updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
         
         # Relationships
-        author = db.relationship('User', backref='blog_posts')
+        # Joined so listings serialize author names without a query per post
+        author = db.relationship('User', backref='blog_posts', lazy='joined')
         comments = db.relationship('BlogComment', backref='post', lazy=True, cascade='all, delete-orphan')
+        category_row = db.relationship('BlogCategory', lazy=True)
+        tag_rows = db.relationship('BlogTag', secondary=blog_post_tags, lazy=True)
+        image_rows = db.relationship('ImageUpload', secondary=image_references, lazy=True)
+        
+        # Listing filters and orderings. id keeps the (sort key, id) keyset order
+        # index-backed
+        __table_args__ = (
+            db.Index('ix_blog_posts_status_published', 'status', 'published_at', 'id'),
+            db.Index('ix_blog_posts_status_created', 'status', 'created_at', 'id'),
+            db.Index('ix_blog_posts_created', 'created_at', 'id'),
+            db.Index('ix_blog_posts_category_id_status_published', 'category_id', 'status', 'published_at', 'id'),
+            db.Index('ix_blog_posts_category_id_created', 'category_id', 'created_at', 'id'),
+            db.Index('ix_blog_posts_author_created', 'author_id', 'created_at'),
+        )
         
         def to_dict(self, include_content=True):
             data = {
@@ -51,6 +86,7 @@ def create_blog_models(db):
                 'status': self.status,
                 'published_at': self.published_at.isoformat() if self.published_at else None,
                 'category': self.category,
+                'category_id': self.category_id,
                 'tags': self.tags,
                 'view_count': self.view_count,
                 'created_at': self.created_at.isoformat(),
@@ -86,8 +122,14 @@ def create_blog_models(db):
         # Relationships
         replies = db.relationship('BlogComment', backref=db.backref('parent', remote_side=[id]))
         
-        def to_dict(self):
-            return {
+        __table_args__ = (
+            db.Index('ix_blog_comments_post_status_created', 'post_id', 'status', 'created_at'),
+            db.Index('ix_blog_comments_status_created', 'status', 'created_at'),
+            db.Index('ix_blog_comments_parent', 'parent_id'),
+        )
+        
+        def to_dict(self, include_replies=True):
+            data = {
                 'id': self.id,
                 'post_id': self.post_id,
                 'content': self.content,
@@ -96,9 +138,50 @@ def create_blog_models(db):
                 'author_website': self.author_website,
                 'status': self.status,
                 'parent_id': self.parent_id,
-                'created_at': self.created_at.isoformat(),
-                'replies': [reply.to_dict() for reply in self.replies if reply.status == 'approved']
+                'created_at': self.created_at.isoformat()
             }
+            
+            if include_replies:
+                data['replies'] = [reply.to_dict() for reply in self.replies if reply.status == 'approved']
+                
+            return data
+        
+        @classmethod
+        def approved_tree(cls, post_id, max_depth=None, reply_limit=None):
+            """
+            Load every approved comment for a post in one query and nest them in memory.
+            
+            Top-level comments are newest first, replies oldest first. Replies nested
+            deeper than max_depth are dropped, and at most reply_limit replies are kept
+            under each comment; reply_count always reports the full number.
+            """
+            comments = cls.query.filter_by(post_id=post_id, status='approved')\
+                .order_by(cls.created_at, cls.id).all()
+            
+            nodes = {comment.id: comment.to_dict(include_replies=False) for comment in comments}
+            children = {}
+            roots = []
+            for comment in comments:
+                if comment.parent_id is None:
+                    roots.append(nodes[comment.id])
+                else:
+                    children.setdefault(comment.parent_id, []).append(nodes[comment.id])
+            
+            # Walk down from the roots so replies under unapproved parents stay hidden
+            stack = [(node, 0) for node in roots]
+            while stack:
+                node, depth = stack.pop()
+                replies = children.get(node['id'], [])
+                node['reply_count'] = len(replies)
+                if max_depth is not None and depth >= max_depth:
+                    replies = []
+                elif reply_limit is not None:
+                    replies = replies[:reply_limit]
+                node['replies'] = replies
+                stack.extend((reply, depth + 1) for reply in replies)
+            
+            roots.reverse()
+            return roots
 
     class BlogCategory(db.Model):
         __tablename__ = 'blog_categories'
@@ -111,6 +194,9 @@ def create_blog_models(db):
         # SEO
         meta_description = db.Column(db.Text)
         
+        # Published posts in the category, recounted whenever they change
+        post_count = db.Column(db.Integer, nullable=False, default=0)
+        
         # Timestamps
         created_at = db.Column(db.DateTime, default=func.now())
         
@@ -122,9 +208,95 @@ def create_blog_models(db):
                 'description': self.description,
                 'color': self.color,
                 'meta_description': self.meta_description,
+                'post_count': self.post_count,
                 'created_at': self.created_at.isoformat()
             }
 
+    class BlogTag(db.Model):
+        __tablename__ = 'blog_tags'
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(100), nullable=False)
+        slug = db.Column(db.String(100), unique=True, nullable=False)
+        
+        # Published posts carrying the tag, recounted whenever they change
+        post_count = db.Column(db.Integer, nullable=False, default=0)
+        
+        # Timestamps
+        created_at = db.Column(db.DateTime, default=func.now())
+        
+        # Serves the tag listing (most used first) without sorting
+        __table_args__ = (
+            db.Index('ix_blog_tags_popular', db.text('post_count DESC'), db.text('name COLLATE NOCASE')),
+        )
+        
+        def to_dict(self):
+            return {
+                'id': self.id,
+                'name': self.name,
+                'slug': self.slug,
+                'post_count': self.post_count
+            }
+
+    class BlogRelatedPost(db.Model):
+        __tablename__ = 'blog_related_posts'
+        # The primary key serves a post's neighbours in rank order
+        post_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id'), primary_key=True)
+        rank = db.Column(db.Integer, primary_key=True)
+        related_post_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id'), nullable=False)
+        score = db.Column(db.Float, nullable=False)
+        computed_at = db.Column(db.DateTime, default=func.now())
+
+    class BlogRelatedSource(db.Model):
+        __tablename__ = 'blog_related_sources'
+        # updated_at of the post version its neighbours were last computed from
+        post_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id'), primary_key=True)
+        source_updated_at = db.Column(db.DateTime)
+
+    class ImageUpload(db.Model):
+        __tablename__ = 'image_uploads'
+        id = db.Column(db.Integer, primary_key=True)
+        filename = db.Column(db.String(255), unique=True, nullable=False)  # Name in the image URL
+        # SHA-256 of the uploaded bytes; new uploads are also named after it
+        content_hash = db.Column(db.String(64), unique=True, index=True)
+        original_filename = db.Column(db.String(255))
+        uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+        
+        # processing -> ready | failed; the original is served until ready
+        status = db.Column(db.String(20), nullable=False, default='processing')
+        error = db.Column(db.Text)
+        attempts = db.Column(db.Integer, nullable=False, default=0)
+        
+        # Byte sizes of the upload and of the optimized image, and its dimensions
+        original_size = db.Column(db.Integer)
+        size = db.Column(db.Integer)
+        width = db.Column(db.Integer)
+        height = db.Column(db.Integer)
+        
+        # JSON list of the smaller JPEG/WebP copies: filename, format, width, height, size
+        variants = db.Column(db.Text)
+        
+        # Timestamps
+        created_at = db.Column(db.DateTime, default=func.now())
+        queued_at = db.Column(db.DateTime, default=datetime.now)  # Compared with datetime.now() when polled
+        processed_at = db.Column(db.DateTime)
+        
+        def to_dict(self):
+            return {
+                'id': self.id,
+                'filename': self.filename,
+                'content_hash': self.content_hash,
+                'image_url': f"/api/uploads/images/{self.filename}",
+                'original_filename': self.original_filename,
+                'status': self.status,
+                'error': self.error,
+                'original_size': self.original_size,
+                'size': self.size,
+                'width': self.width,
+                'height': self.height,
+                'created_at': self.created_at.isoformat() if self.created_at else None,
+                'processed_at': self.processed_at.isoformat() if self.processed_at else None
+            }
+
     class Setting(db.Model):
         __tablename__ = 'settings'
         
@@ -147,5 +319,11 @@ def create_blog_models(db):
         'BlogPost': BlogPost,
         'BlogComment': BlogComment,
         'BlogCategory': BlogCategory,
+        'BlogTag': BlogTag,
+        'BlogPostTags': blog_post_tags,
+        'BlogRelatedPost': BlogRelatedPost,
+        'BlogRelatedSource': BlogRelatedSource,
+        'ImageUpload': ImageUpload,
+        'ImageReferences': image_references,
         'Setting': Setting
     }
\ No newline at end of file
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Compute related posts for published blog posts
+
+The app does this in the background after posts change. Run this to fill
+blog_related_posts for an existing database right away, or with --full to
+recompute every post (e.g. after many posts were added, which shifts the
+TF-IDF weights of older ones).
+"""
+import sys
+
+from __init__ import create_app
+
+def build_related_posts(full=False):
+    """Update the stored related posts; recompute all of them with full"""
+    app = create_app()
+
+    with app.app_context():
+        from utils.related import related_posts
+        # Waits for a run already in progress in a worker
+        updated = related_posts.run(full=full, wait=True)
+        if updated is None:
+            print("Error computing related posts; see the application log")
+            return False
+        print(f"Related posts computed for {updated} post(s)")
+        return True
+
+if __name__ == '__main__':
+    sys.exit(0 if build_related_posts(full='--full' in sys.argv[1:]) else 1)
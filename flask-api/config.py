@@ -24,6 +24,105 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    
+    # View counts are buffered per worker and flushed every interval seconds,
+    # or sooner once threshold views are pending
+    VIEW_COUNT_FLUSH_INTERVAL = int(os.getenv('VIEW_COUNT_FLUSH_INTERVAL', 30))
+    VIEW_COUNT_FLUSH_THRESHOLD = int(os.getenv('VIEW_COUNT_FLUSH_THRESHOLD', 100))
+    
+    # Public site address used in feeds and sitemaps
+    BASE_URL = os.getenv('BASE_URL', 'https://isodigm.ca')
+    FEED_ITEM_LIMIT = int(os.getenv('FEED_ITEM_LIMIT', 50))
+    
+    # Related posts are recomputed in the background every interval seconds,
+    # or soon after a post is written
+    RELATED_POSTS_INTERVAL = int(os.getenv('RELATED_POSTS_INTERVAL', 300))
+    RELATED_POSTS_LIMIT = int(os.getenv('RELATED_POSTS_LIMIT', 5))
+    
+    # Static copies of published posts for nginx (defaults to instance/prerendered)
+    PRERENDER_POSTS = os.getenv('PRERENDER_POSTS', 'True').lower() == 'true'
+    PRERENDER_DIR = os.getenv('PRERENDER_DIR')
+    
+    # Uploaded images are optimized by a pool of IMAGE_WORKERS processes per
+    # app worker, with at most IMAGE_QUEUE_LIMIT waiting
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    IMAGE_QUEUE_LIMIT = int(os.getenv('IMAGE_QUEUE_LIMIT', 16))
+    IMAGE_PROCESS_TIMEOUT = int(os.getenv('IMAGE_PROCESS_TIMEOUT', 600))
+    # Uploads past either limit are refused; pixels are checked from the header
+    IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('IMAGE_MAX_UPLOAD_SIZE', 5 * 1024 * 1024))
+    IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 50_000_000))
+    IMAGE_MAX_WIDTH = int(os.getenv('IMAGE_MAX_WIDTH', 1200))
+    IMAGE_MAX_HEIGHT = int(os.getenv('IMAGE_MAX_HEIGHT', 800))
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 85))
+    # Widths of the smaller copies made of each upload, in every format listed
+    IMAGE_VARIANT_WIDTHS = [int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,960').split(',') if width.strip()]
+    IMAGE_VARIANT_FORMATS = [fmt.strip() for fmt in os.getenv('IMAGE_VARIANT_FORMATS', 'jpeg,webp').split(',') if fmt.strip()]
+    # Sizes (px) allowed for on-demand copies (?w=&h=&fmt=), and the disk space
+    # their cache may use before the least recently used are evicted
+    IMAGE_TRANSFORM_SIZES = [int(size) for size in os.getenv('IMAGE_TRANSFORM_SIZES', '32,48,64,96,128,160,240,320,480,640,800').split(',') if size.strip()]
+    IMAGE_TRANSFORM_CACHE_SIZE = int(os.getenv('IMAGE_TRANSFORM_CACHE_SIZE', 256 * 1024 * 1024))
+    # Set to nginx's internal uploads location (e.g. /_uploads/) to hand image
+    # bytes to nginx with X-Accel-Redirect instead of sending them from the app
+    IMAGE_ACCEL_REDIRECT = os.getenv('IMAGE_ACCEL_REDIRECT', '')
+    # Processed images never change under their name; an original only stands
+    # in until its optimized copy is ready
+    IMAGE_CACHE_CONTROL = os.getenv('IMAGE_CACHE_CONTROL', 'public, max-age=31536000, immutable')
+    IMAGE_PENDING_CACHE_CONTROL = os.getenv('IMAGE_PENDING_CACHE_CONTROL', 'public, no-cache')
+    
+    # Outgoing mail server; emails are queued in email_outbox and sent in the
+    # background every EMAIL_OUTBOX_INTERVAL seconds (or right after queuing)
+    # over one kept connection, retried with doubling delays; 0 disables the sender
+    SMTP_SERVER = os.getenv('SMTP_SERVER', 'host.docker.internal')
+    SMTP_PORT = int(os.getenv('SMTP_PORT', 25))
+    SMTP_USERNAME = os.getenv('SMTP_USERNAME')
+    SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+    SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'False').lower() == 'true'
+    SMTP_TIMEOUT = int(os.getenv('SMTP_TIMEOUT', 10))
+    SMTP_IDLE_TIMEOUT = int(os.getenv('SMTP_IDLE_TIMEOUT', 60))
+    MAIL_FROM = os.getenv('MAIL_FROM', 'Blog CMS <noreply@isodigm.ca>')
+    EMAIL_OUTBOX_INTERVAL = int(os.getenv('EMAIL_OUTBOX_INTERVAL', 5))
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))
+    EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 8))
+    EMAIL_RETRY_BACKOFF = int(os.getenv('EMAIL_RETRY_BACKOFF', 30))
+    EMAIL_RETRY_BACKOFF_MAX = int(os.getenv('EMAIL_RETRY_BACKOFF_MAX', 3600))
+    # Bulk sends (send_announcement.py): recipients read per batch, SMTP
+    # connections used in parallel and messages sent over each before reconnecting
+    BULK_MAIL_CHUNK_SIZE = int(os.getenv('BULK_MAIL_CHUNK_SIZE', 200))
+    SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 4))
+    SMTP_MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MESSAGES_PER_CONNECTION', 100))
+    
+    # Password hashing: werkzeug method string (pick its cost with
+    # benchmark_password_hash.py; older hashes are upgraded on login), threads
+    # per worker that hash, and hashes allowed to wait before logins get a 503
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 1))
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 8))
+    
+    # Public blog responses cache (per worker, invalidated on writes)
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 512))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+    
+    # Authenticated principal cache (token -> id, username, is_admin, email_verified).
+    # Only used for legacy tokens without role claims; access tokens are
+    # authorized from their claims until JWT_ACCESS_TOKEN_EXPIRES
+    PRINCIPAL_CACHE_ENABLED = os.getenv('PRINCIPAL_CACHE_ENABLED', 'True').lower() == 'true'
+    PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv('PRINCIPAL_CACHE_MAX_ENTRIES', 1024))
+    PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', 60))
+    
+    # Cache-Control by endpoint; clients and nginx revalidate with ETag/Last-Modified
+    CACHE_CONTROL = {
+        'blog.get_blog_posts': os.getenv('CACHE_CONTROL_POSTS', 'public, max-age=0, must-revalidate'),
+        'blog.get_blog_post': os.getenv('CACHE_CONTROL_POST', 'public, max-age=60, must-revalidate'),
+        'blog.get_blog_categories': os.getenv('CACHE_CONTROL_CATEGORIES', 'public, max-age=300'),
+        'blog.get_blog_tags': os.getenv('CACHE_CONTROL_TAGS', 'public, max-age=300'),
+        'blog.search_blog_posts': os.getenv('CACHE_CONTROL_SEARCH', 'public, max-age=0, must-revalidate'),
+        'blog.get_rss_feed': os.getenv('CACHE_CONTROL_FEEDS', 'public, max-age=300'),
+        'blog.get_atom_feed': os.getenv('CACHE_CONTROL_FEEDS', 'public, max-age=300'),
+        'blog.get_sitemap': os.getenv('CACHE_CONTROL_SITEMAP', 'public, max-age=3600'),
+        'blog.get_sitemap_page': os.getenv('CACHE_CONTROL_SITEMAP', 'public, max-age=3600'),
+        'uploads.image_variants': os.getenv('CACHE_CONTROL_IMAGE_VARIANTS', 'public, max-age=60'),
+    }
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -50,6 +149,11 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    VIEW_COUNT_FLUSH_INTERVAL = 0  # Write view counts immediately
+    RELATED_POSTS_INTERVAL = 0  # Recompute related posts on every post write
+    IMAGE_WORKERS = 0  # Optimize uploaded images within the request
+    EMAIL_OUTBOX_INTERVAL = 0  # Leave queued email pending; tests call deliver()
+    PASSWORD_HASH_WORKERS = 0  # Hash within the request
 
 config = {
     'development': DevelopmentConfig,
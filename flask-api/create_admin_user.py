@@ -6,13 +6,14 @@ import sys
 import os
 import secrets
 import string
-from werkzeug.security import generate_password_hash
 
 # Add the flask-api directory to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from models.user import User
 from __init__ import db, create_app
+from utils.auth import invalidate_principal
+from utils.passwords import password_hasher
 
 def generate_random_password(length=16):
     """Generate a secure random password"""
@@ -39,9 +40,10 @@ def create_admin_user():
         if existing_user:
             print("User 'amranu' already exists!")
             # Update password and ensure admin status
-            existing_user.password = generate_password_hash(random_password)
+            existing_user.password = password_hasher.hash(random_password)
             existing_user.is_admin = True
             db.session.commit()
+            invalidate_principal(existing_user.id)
             print("Updated existing user 'amranu':")
             print(f"  Username: amranu")
             print(f"  Password: {random_password}")
@@ -51,7 +53,7 @@ def create_admin_user():
         
         # Create admin user
         print("Creating admin user 'amranu'...")
-        hashed_password = generate_password_hash(random_password)
+        hashed_password = password_hasher.hash(random_password)
         admin_user = User(
             username='amranu',
             password=hashed_password,
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Database migration script to link posts to categories by id
+
+Adds blog_posts.category_id and blog_categories.post_count, links every post
+to the category named by its category text (creating missing categories),
+then counts each category's published posts. Posts are linked in id-ordered
+batches, one transaction per batch. Safe to re-run.
+"""
+import sys
+from sqlalchemy import text
+
+from __init__ import create_app, db
+
+BATCH_SIZE = 500
+
+# Indexes on the category text, replaced by the category_id indexes
+OBSOLETE_INDEXES = ['ix_blog_posts_category_status_published', 'ix_blog_posts_category_created']
+
+def add_column(statement, description):
+    try:
+        db.session.execute(text(statement))
+        db.session.commit()
+        print(f"Added {description}")
+    except Exception as e:
+        if "duplicate column name" in str(e).lower() or "already exists" in str(e).lower():
+            print(f"{description} already exists")
+        else:
+            print(f"Error adding {description}: {e}")
+        db.session.rollback()
+
+def migrate_categories(batch_size=BATCH_SIZE):
+    """Add the category columns and link existing posts in batches"""
+    app = create_app()
+
+    with app.app_context():
+        from shared_models import get_blog_post
+        from utils.categories import link_post_category, refresh_category_counts
+        from utils.cache import response_cache
+        BlogPost = get_blog_post()
+
+        add_column('ALTER TABLE blog_posts ADD COLUMN category_id INTEGER REFERENCES blog_categories (id)',
+                   'blog_posts.category_id column')
+        add_column('ALTER TABLE blog_categories ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0',
+                   'blog_categories.post_count column')
+
+        for name in OBSOLETE_INDEXES:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        db.session.commit()
+        for index in BlogPost.__table__.indexes:
+            if index.name.startswith('ix_blog_posts_category_id'):
+                index.create(bind=db.engine, checkfirst=True)
+        print("Category indexes are up to date")
+
+        # Categories are few, so resolved rows are shared by every batch
+        known = {}
+        last_id = 0
+        linked = 0
+        while True:
+            posts = BlogPost.query.filter(
+                BlogPost.id > last_id, BlogPost.category_id.is_(None),
+                BlogPost.category.isnot(None), BlogPost.category != ''
+            ).order_by(BlogPost.id).limit(batch_size).all()
+            if not posts:
+                break
+
+            try:
+                for post in posts:
+                    link_post_category(post, post.category, known=known, create=True)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error linking posts {posts[0].id}-{posts[-1].id}: {e}")
+                return False
+
+            linked += len(posts)
+            last_id = posts[-1].id
+            print(f"Linked {linked} post(s) to their categories (through id {last_id})")
+
+        try:
+            refresh_category_counts()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error counting category posts: {e}")
+            return False
+
+        response_cache.invalidate('posts', 'categories')
+        print(f"Category migration completed: {linked} post(s) linked")
+        return True
+
+if __name__ == '__main__':
+    sys.exit(0 if migrate_categories() else 1)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Database migration script for the users.email_announcements column
+
+Databases whose users table predates the announcement opt-out get the
+column, with every existing user opted in. Safe to re-run.
+"""
+
+from sqlalchemy import text
+
+from __init__ import create_app, db
+
+def migrate_email_preferences():
+    """Add users.email_announcements if it is missing"""
+    app = create_app()
+
+    with app.app_context():
+        try:
+            db.session.execute(text('ALTER TABLE users ADD COLUMN email_announcements BOOLEAN DEFAULT 1 NOT NULL'))
+            db.session.commit()
+            print("Added users.email_announcements column")
+        except Exception as e:
+            if "duplicate column name" in str(e).lower() or "already exists" in str(e).lower():
+                print("users.email_announcements column already exists")
+            else:
+                print(f"Error adding users.email_announcements: {e}")
+            db.session.rollback()
+        print("Email preferences migration completed")
+
+if __name__ == '__main__':
+    migrate_email_preferences()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Database migration script for the image upload columns
+
+Adds image_uploads.variants to databases whose image_uploads table predates
+responsive image variants, and image_uploads.content_hash with the
+post -> image references to those that predate deduplicated uploads.
+Images uploaded before image_uploads existed get a ready row first, so the
+hash of every stored image and the images every post links to are filled
+in and posts keep their images from being deleted. Safe to re-run.
+"""
+import os
+import re
+from datetime import datetime
+
+from PIL import Image
+from sqlalchemy import text
+
+from __init__ import create_app, db
+
+def add_column(statement, description):
+    try:
+        db.session.execute(text(statement))
+        db.session.commit()
+        print(f"Added {description}")
+    except Exception as e:
+        if "duplicate column name" in str(e).lower() or "already exists" in str(e).lower():
+            print(f"{description} already exists")
+        else:
+            print(f"Error adding {description}: {e}")
+        db.session.rollback()
+
+BATCH_SIZE = 500
+
+# <uuid hex>.<ext>, the names uploads were stored under before image_uploads
+LEGACY_NAME_RE = re.compile(r'^[0-9a-f]{32}\.(?:png|jpe?g|gif|webp)$')
+
+def backfill_legacy_uploads():
+    """Add a ready image_uploads row for every legacy upload that has none"""
+    from shared_models import get_image_upload
+    from utils.images import upload_dirs
+    ImageUpload = get_image_upload()
+    _, optimized = upload_dirs()
+
+    known = {row.filename for row in db.session.query(ImageUpload.filename)}
+    added = 0
+    for name in sorted(os.listdir(optimized)):
+        if not LEGACY_NAME_RE.match(name) or name in known:
+            continue
+        path = os.path.join(optimized, name)
+        # They were resized and re-encoded in place when uploaded
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        size = os.path.getsize(path)
+        db.session.add(ImageUpload(
+            filename=name, original_filename=name, status='ready', original_size=size, size=size,
+            width=width, height=height, processed_at=datetime.now()
+        ))
+        added += 1
+        if added % BATCH_SIZE == 0:
+            db.session.commit()
+    db.session.commit()
+    print(f"Recorded {added} legacy upload(s)")
+
+def backfill_hashes():
+    """Hash the stored file of every upload that has no content_hash yet"""
+    from shared_models import get_image_upload
+    from utils.images import file_digest, upload_dirs
+    ImageUpload = get_image_upload()
+    originals, optimized = upload_dirs()
+
+    hashed = 0
+    seen = set()
+    for upload in ImageUpload.query.filter(ImageUpload.content_hash.is_(None)).order_by(ImageUpload.id).all():
+        # Prefer the original; uploads from before it was kept only have the optimized copy
+        for directory in (originals, optimized):
+            path = os.path.join(directory, upload.filename)
+            if os.path.exists(path):
+                digest = file_digest(path)
+                # Identical legacy uploads stay separate rows; only the first gets the hash
+                if digest not in seen and not ImageUpload.query.filter_by(content_hash=digest).first():
+                    upload.content_hash = digest
+                    seen.add(digest)
+                    hashed += 1
+                break
+    db.session.commit()
+    print(f"Hashed {hashed} stored image(s)")
+
+def backfill_references():
+    """Record the uploads every post links to"""
+    from shared_models import get_blog_post
+    from utils.image_references import sync_post_images
+    BlogPost = get_blog_post()
+
+    last_id = 0
+    linked = 0
+    while True:
+        posts = BlogPost.query.filter(BlogPost.id > last_id).order_by(BlogPost.id).limit(BATCH_SIZE).all()
+        if not posts:
+            break
+        for post in posts:
+            linked += len(sync_post_images(post))
+        last_id = posts[-1].id
+        db.session.commit()
+    print(f"Recorded {linked} post image reference(s)")
+
+def migrate_images():
+    """Add the image upload columns that are missing"""
+    app = create_app()
+
+    with app.app_context():
+        from shared_models import get_image_upload
+        add_column('ALTER TABLE image_uploads ADD COLUMN variants TEXT', 'image_uploads.variants column')
+        add_column('ALTER TABLE image_uploads ADD COLUMN content_hash VARCHAR(64)', 'image_uploads.content_hash column')
+        for index in get_image_upload().__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        backfill_legacy_uploads()
+        backfill_hashes()
+        backfill_references()
+        print("Image migration completed")
+
+if __name__ == '__main__':
+    migrate_images()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Database migration script to create the indexes declared on the models
+
+db.create_all() only creates indexes together with new tables, so databases
+created before an index was declared need this run once. An index whose
+columns changed since it was created is dropped and rebuilt. Safe to re-run.
+"""
+
+from __init__ import create_app, db
+
+def migrate_indexes():
+    """Create every model index that is missing from the database"""
+    app = create_app()
+
+    with app.app_context():
+        created = 0
+        inspector = db.inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name']: index['column_names'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    columns = [getattr(expression, 'name', None) for expression in index.expressions]
+                    # Expression indexes cannot be compared by column name
+                    if None in columns or existing[index.name] == columns:
+                        print(f"{index.name} already exists")
+                        continue
+                    index.drop(bind=db.engine)
+                    print(f"Dropped {index.name} on {table.name}: its columns changed")
+                try:
+                    index.create(bind=db.engine)
+                    created += 1
+                    print(f"Created {index.name} on {table.name}")
+                except Exception as e:
+                    print(f"Error creating {index.name}: {e}")
+
+        # Refresh planner statistics so SQLite weighs the new indexes properly
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('ANALYZE')
+            print("Updated query planner statistics")
+
+        print(f"Index migration completed: {created} index(es) created")
+
+if __name__ == '__main__':
+    migrate_indexes()
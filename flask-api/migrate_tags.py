@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Database migration script to backfill the normalized tag tables
+
+Parses the tags text of every existing post into blog_tags rows and
+blog_post_tags associations, then counts each tag's published posts.
+Posts are processed in id order, one batch per transaction, so large
+databases are never locked for long. Safe to re-run.
+"""
+import sys
+
+from __init__ import create_app, db
+
+BATCH_SIZE = 500
+
+def migrate_tags(batch_size=BATCH_SIZE):
+    """Create tag rows and associations from the posts' tags column"""
+    app = create_app()
+
+    with app.app_context():
+        from shared_models import get_blog_post, get_blog_tag
+        from utils.tags import sync_post_tags, refresh_tag_counts
+        from utils.cache import response_cache
+        BlogPost = get_blog_post()
+
+        last_id = 0
+        migrated = 0
+        while True:
+            posts = BlogPost.query.filter(BlogPost.id > last_id)\
+                .order_by(BlogPost.id).limit(batch_size).all()
+            if not posts:
+                break
+
+            # Tags resolved once per batch and shared by its posts
+            known = {}
+            try:
+                for post in posts:
+                    sync_post_tags(post, known=known)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error migrating posts {posts[0].id}-{posts[-1].id}: {e}")
+                return False
+
+            migrated += len(posts)
+            last_id = posts[-1].id
+            print(f"Migrated tags for {migrated} post(s) (through id {last_id})")
+            # Drop the batch from the identity map before loading the next one
+            db.session.expunge_all()
+
+        try:
+            refresh_tag_counts()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error counting tagged posts: {e}")
+            return False
+
+        response_cache.invalidate('posts')
+        print(f"Tag migration completed: {migrated} post(s), {get_blog_tag().query.count()} tag(s)")
+        return True
+
+if __name__ == '__main__':
+    sys.exit(0 if migrate_tags() else 1)
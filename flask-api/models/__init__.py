@@ -1,6 +1,6 @@
 """
 Database models package
 """
-from . import user, post
+from . import user, post, outbox
 
-__all__ = ['user', 'post']
\ No newline at end of file
+__all__ = ['user', 'post', 'outbox']
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Email outbox and bulk email campaign models
+"""
+from __init__ import db
+from datetime import datetime
+
+class EmailMessage(db.Model):
+    """
+    An email waiting for, or done with, delivery. Rows are added in the same
+    transaction as whatever the email is about and sent in the background.
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # The sender's "what is due" query
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, default='generic')
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True, index=True)
+    to_email = db.Column(db.String(), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body_html = db.Column(db.Text, nullable=False)
+    body_text = db.Column(db.Text, nullable=True)
+    # Fixed when queued, so a retried message keeps its identity
+    message_id = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'user_id': self.user_id,
+            'to_email': self.to_email,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at and self.status == 'pending' else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+class EmailCampaign(db.Model):
+    """
+    One bulk send to every verified user who has not opted out. Recipients
+    are taken in users.id order and last_user_id is checkpointed as they are
+    handled, so an interrupted run resumes after the last recipient it
+    finished.
+    """
+    __tablename__ = "email_campaigns"
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id', ondelete='SET NULL'), nullable=True, index=True)
+    subject = db.Column(db.String(255), nullable=False)
+    body_html = db.Column(db.Text, nullable=False)
+    body_text = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    # Refused for good, and handed to the outbox to retry
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    deferred_count = db.Column(db.Integer, nullable=False, default=0)
+    # Sending time across runs, for the messages/second figure
+    elapsed = db.Column(db.Float, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        handled = self.sent_count + self.failed_count + self.deferred_count
+        return {
+            'id': self.id,
+            'post_id': self.post_id,
+            'subject': self.subject,
+            'status': self.status,
+            'last_user_id': self.last_user_id,
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'deferred': self.deferred_count,
+            'messages_per_second': round(handled / self.elapsed, 1) if self.elapsed else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
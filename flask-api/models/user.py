@@ -16,8 +16,10 @@ class User(db.Model):
     middlename = db.Column(db.String(), nullable=True)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
     email_verified = db.Column(db.Boolean, default=False, nullable=False)
-    email_verification_token = db.Column(db.String(64), nullable=True)
+    email_verification_token = db.Column(db.String(64), nullable=True, index=True)
     email_verification_sent_at = db.Column(db.DateTime, nullable=True)
+    # New post announcements; turned off by the unsubscribe link in them
+    email_announcements = db.Column(db.Boolean, default=True, server_default=db.true(), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
     def generate_verification_token(self):
@@ -50,5 +52,6 @@ class User(db.Model):
             'middlename': self.middlename,
             'is_admin': self.is_admin,
             'is_verified': self.email_verified,
+            'email_announcements': self.email_announcements,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
\ No newline at end of file
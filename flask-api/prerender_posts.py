@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Rebuild the static copies of every published post
+
+The app keeps PRERENDER_DIR current as posts change. Run this after
+turning pre-rendering on, changing the site name or BASE_URL, or restoring
+a database. Posts are rendered in parallel, one worker process per core by
+default; copies of posts that are no longer published are removed.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from __init__ import create_app, db
+
+CHUNK_SIZE = 200
+
+# Set before the pool forks so workers inherit the app instead of creating
+# one (and its background threads) each
+_app = None
+
+def _init_worker():
+    _app.app_context().push()
+    # Connections must not be shared with the parent process
+    db.engine.dispose(close=False)
+
+def _render(post_ids):
+    """Write the files of one chunk of posts; returns how many changed"""
+    from shared_models import get_blog_post
+    from utils.feeds import site_info
+    from utils.prerender import static_posts
+    BlogPost = get_blog_post()
+
+    site = site_info()
+    changed = 0
+    posts = BlogPost.query.filter(BlogPost.id.in_(post_ids), BlogPost.status == 'published')
+    for post in posts:
+        changed += static_posts.write(post, site)
+    db.session.remove()
+    return changed
+
+def prerender_posts(workers=None):
+    """Render every published post and drop copies of unpublished ones"""
+    global _app
+    _app = create_app()
+
+    with _app.app_context():
+        from shared_models import get_blog_post
+        from utils.prerender import static_posts
+        if not static_posts.enabled:
+            print("Pre-rendering is disabled (PRERENDER_POSTS)")
+            return False
+
+        BlogPost = get_blog_post()
+        rows = db.session.query(BlogPost.id, BlogPost.slug).filter_by(status='published').order_by(BlogPost.id).all()
+        published = {row.slug for row in rows}
+        removed = sum(static_posts.remove(slug) for slug in static_posts.slugs() - published)
+        db.session.remove()
+        db.engine.dispose()
+
+    ids = [row.id for row in rows]
+    chunks = [ids[i:i + CHUNK_SIZE] for i in range(0, len(ids), CHUNK_SIZE)]
+    workers = workers or os.cpu_count() or 1
+    started = time.monotonic()
+    print(f"Rendering {len(ids)} published post(s) with {workers} worker(s)")
+
+    changed = 0
+    try:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+            for count in pool.map(_render, chunks):
+                changed += count
+    except Exception as e:
+        print(f"Error rendering posts: {str(e)}")
+        return False
+
+    elapsed = time.monotonic() - started
+    print(f"Rendered {len(ids)} post(s) in {elapsed:.1f}s: {changed} changed, {removed} unpublished post(s) removed")
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    args = parser.parse_args()
+    sys.exit(0 if prerender_posts(workers=args.workers) else 1)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Rebuild the blog full-text search index
+
+The index is created and filled automatically the first time the app starts
+against a database, and triggers keep it in sync from then on. Run this to
+repopulate it after bulk changes made with the triggers absent, or to merge
+its segments. Safe to re-run.
+"""
+
+from __init__ import create_app, db
+from utils.search import search_available, rebuild_search_index
+
+def rebuild():
+    """Rebuild the search index from the blog_posts table"""
+    app = create_app()
+
+    with app.app_context():
+        if not search_available(db):
+            print("Search uses SQLite FTS5; nothing to rebuild on this database")
+            return
+        try:
+            indexed = rebuild_search_index(db)
+            print(f"Search index rebuilt: {indexed} post(s) indexed")
+        except Exception as e:
+            print(f"Error rebuilding search index: {e}")
+
+if __name__ == '__main__':
+    rebuild()
@@ -2,16 +2,23 @@
 Authentication routes
 """
 import re
-from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, request, jsonify, current_app
 from models.user import User
 from utils.validation import sanitize_input
-from utils.auth import generate_token, admin_required
-from utils.email import send_verification_email
+from utils.auth import generate_access_token, generate_refresh_token, decode_token, bearer_token, admin_required, invalidate_principal
+from utils.email import queue_verification_email
+from utils.outbox import email_outbox
+from utils.passwords import password_hasher, HasherBusy
 from __init__ import db
 
 auth_bp = Blueprint('auth', __name__)
 
+def hasher_busy_response(key):
+    """503 for a request that found this worker's password hashing queue full"""
+    response = jsonify({key: False, "error": "The server is busy, please try again in a moment"})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.json
@@ -25,7 +32,23 @@ def login():
     password = data['password']  # Don't sanitize password as it might contain special chars
     
     user = User.query.filter_by(username=username).first()
-    if user and check_password_hash(user.password, password):
+    try:
+        valid = user is not None and password_hasher.check(user.password, password)
+    except HasherBusy:
+        return hasher_busy_response("login")
+    
+    if valid:
+        # Bring hashes made with older cost parameters up to date while the password is at hand
+        try:
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+        except HasherBusy:
+            pass
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to upgrade password hash of user {user.id}: {str(e)}")
+        
         # Check if email is verified (admins are automatically verified)
         if not user.email_verified and not user.is_admin:
             return jsonify({
@@ -34,10 +57,12 @@ def login():
                 "verification_required": True
             }), 401
         
-        token = generate_token(user.id)
+        token = generate_access_token(user)
         return jsonify({
             "login": True, 
             "token": token,
+            "refresh_token": generate_refresh_token(user),
+            "expires_in": int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()),
             "user": {
                 'id': user.id, 
                 'username': user.username, 
@@ -51,6 +76,35 @@ def login():
     else:
         return jsonify({"login": False, "error": "Invalid credentials"}), 401
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Exchange a refresh token for a new access token with current role claims"""
+    data = request.get_json(silent=True) or {}
+    token = data.get('refresh_token') or bearer_token()
+    if not token:
+        return jsonify({"refreshed": False, "error": "Refresh token required"}), 400
+    
+    payload = decode_token(token, expected_type='refresh')
+    if payload is None:
+        return jsonify({"refreshed": False, "error": "Invalid or expired refresh token"}), 401
+    
+    # The only authenticated path that reads the users table
+    user = User.query.get(payload['user_id'])
+    if not user:
+        return jsonify({"refreshed": False, "error": "User not found"}), 401
+    if not user.email_verified and not user.is_admin:
+        return jsonify({
+            "refreshed": False,
+            "error": "Please verify your email address before logging in",
+            "verification_required": True
+        }), 401
+    
+    return jsonify({
+        "refreshed": True,
+        "token": generate_access_token(user),
+        "expires_in": int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
+    }), 200
+
 @auth_bp.route('/register_user', methods=['POST'])
 @admin_required
 def register_user(user):
@@ -79,7 +133,10 @@ def register_user(user):
     if len(password) < 8:
         return jsonify({"registered": False, "error": "Password must be at least 8 characters long"}), 400
     
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HasherBusy:
+        return hasher_busy_response("registered")
     new_user = User(
         username=username, 
         password=hashed_password, 
@@ -125,7 +182,10 @@ def register():
     if len(password) < 8:
         return jsonify({"registered": False, "error": "Password must be at least 8 characters long"}), 400
     
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HasherBusy:
+        return hasher_busy_response("registered")
     new_user = User(
         username=username, 
         password=hashed_password, 
@@ -141,16 +201,11 @@ def register():
         # Generate verification token
         verification_token = new_user.generate_verification_token()
         
+        # The email is queued with the user: both are saved or neither is
         db.session.add(new_user)
+        queue_verification_email(new_user, verification_token)
         db.session.commit()
-        
-        # Send verification email
-        full_name = f"{firstname} {lastname}"
-        try:
-            send_verification_email(email, full_name, verification_token)
-        except Exception as e:
-            # Log error but don't fail registration
-            print(f"Failed to send verification email: {str(e)}")
+        email_outbox.notify()
         
         return jsonify({
             "registered": True,
@@ -244,6 +299,7 @@ def verify_email():
     
     try:
         db.session.commit()
+        invalidate_principal(user.id)
         # Return HTML page for successful verification
         return '''
         <!DOCTYPE html>
@@ -316,11 +372,9 @@ def resend_verification():
     verification_token = user.generate_verification_token()
     
     try:
+        queue_verification_email(user, verification_token)
         db.session.commit()
-        
-        # Send verification email
-        full_name = f"{user.firstname} {user.lastname}"
-        send_verification_email(user.email, full_name, verification_token)
+        email_outbox.notify()
         
         return jsonify({
             "sent": True,
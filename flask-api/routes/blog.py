@@ -2,13 +2,28 @@
 Blog CMS routes
 """
 import re
-from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app
+from datetime import datetime, timezone
+from flask import Blueprint, request, jsonify, current_app, abort, send_file
+from sqlalchemy import select, update
 from utils.validation import sanitize_input, validate_blog_post
-from utils.auth import token_required, admin_required
+from utils.auth import token_required, admin_required, bearer_token, get_principal
+from utils.slug import commit_with_slug, slugify
+from utils.tags import sync_post_tags, refresh_tag_counts
+from utils.categories import category_lookup, resolve_category, link_post_category, refresh_category_counts, \
+    UnknownCategory
+from utils.image_references import sync_post_images
+from utils.view_counter import view_counter
+from utils.related import related_posts
+from utils.prerender import static_posts, post_detail
+from utils.cache import response_cache, post_tag, post_views_tag
+from utils.http_cache import make_etag, body_etag, as_utc, is_not_modified, not_modified, set_validators
+from utils.feeds import published_fingerprint, document_path, write_rss, write_atom, write_sitemap, \
+    write_sitemap_index, sitemap_pages
+from utils.pagination import keyset_paginate, InvalidCursor, MAX_PER_PAGE
+from utils.search import search_available, match_expression, search_posts
 from __init__ import db
 from models.user import User
-from shared_models import get_blog_post, get_blog_comment, get_blog_category
+from shared_models import get_blog_post, get_blog_comment, get_blog_category, get_blog_tag, get_blog_post_tags
 
 blog_bp = Blueprint('blog', __name__)
 
@@ -16,15 +31,40 @@ blog_bp = Blueprint('blog', __name__)
 BlogPost = get_blog_post()
 BlogComment = get_blog_comment()
 BlogCategory = get_blog_category()
+BlogTag = get_blog_tag()
+BlogPostTags = get_blog_post_tags()
 
-@blog_bp.route('/posts', methods=['GET'])
-def get_blog_posts():
-    """Get all blog posts with filtering options"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+def cached_json(tags, build, ttl=None):
+    """
+    Serve a (payload, status) builder as JSON through the response cache.
+    
+    The ETag is a hash of the encoded body, so it changes with every input
+    to the payload. No Last-Modified is sent: no single timestamp covers them.
+    """
+    entry = response_cache.get(request.full_path)
+    if entry is None:
+        stamps = response_cache.stamps(tags)
+        payload, status = build()
+        body = current_app.json.dumps(payload).encode()
+        entry = (body, status, body_etag(body))
+        response_cache.set(request.full_path, entry, stamps)
+    
+    body, status, etag = entry
+    if status == 200 and is_not_modified(etag):
+        return not_modified(etag)
+    
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if status == 200:
+        set_validators(response, etag)
+    return response
+
+def filtered_posts_query():
+    """Apply the listing filters from the request; returns (query, order, sort_column)"""
     status = request.args.get('status')
     category = request.args.get('category')
+    category_id = request.args.get('category_id', type=int)
     author_id = request.args.get('author_id', type=int)
+    tag = request.args.get('tag')
     
     query = BlogPost.query
     
@@ -32,51 +72,168 @@ def get_blog_posts():
     if status and status != 'all':
         query = query.filter_by(status=status)
     
-    # Filter by category
-    if category:
-        query = query.filter_by(category=category)
+    # Filter by category (id, or name or slug resolved to its id)
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+    elif category:
+        query = query.filter(BlogPost.category_id == category_lookup(category))
         
     # Filter by author
     if author_id:
         query = query.filter_by(author_id=author_id)
     
+    # Filter by tag (name or slug) through the tag -> posts index
+    if tag:
+        tagged = db.session.query(BlogPostTags.c.post_id)\
+            .join(BlogTag, BlogTag.id == BlogPostTags.c.tag_id)\
+            .filter(BlogTag.slug == slugify(tag))
+        query = query.filter(BlogPost.id.in_(tagged))
+    
     # Order by published date or created date
     if status == 'published':
-        query = query.order_by(BlogPost.published_at.desc())
-    else:
-        query = query.order_by(BlogPost.created_at.desc())
+        return query, 'published_at', BlogPost.published_at
+    return query, 'created_at', BlogPost.created_at
+
+@blog_bp.route('/posts', methods=['GET'])
+def get_blog_posts():
+    """Get all blog posts with filtering options and page or cursor pagination"""
+    return cached_json(('posts',), list_blog_posts)
+
+def list_blog_posts():
+    """Build the post listing payload for the current request arguments"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 10, type=int)
+    query, order, sort_column = filtered_posts_query()
+    
+    # Cursor mode: ?cursor= (empty for the first page) switches to keyset pagination
+    if 'cursor' in request.args:
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        try:
+            posts, next_cursor, prev_cursor = keyset_paginate(
+                query, order, sort_column, BlogPost.id, per_page,
+                cursor=request.args.get('cursor')
+            )
+        except InvalidCursor as e:
+            return {'error': str(e)}, 400
+        
+        response = {
+            'posts': [post.to_dict(include_content=False) for post in posts],
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
+            'per_page': per_page
+        }
+        # Counting scans every matching row, so it is opt-in
+        if request.args.get('include_total', 'false').lower() == 'true':
+            response['total'] = query.order_by(None).count()
+        return response, 200
+    
+    query = query.order_by(sort_column.desc(), BlogPost.id.desc())
     
     # Paginate
     posts = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    return jsonify({
+    return {
         'posts': [post.to_dict(include_content=False) for post in posts.items],
         'total': posts.total,
         'pages': posts.pages,
         'current_page': page,
         'per_page': per_page
-    })
+    }, 200
+
+@blog_bp.route('/search', methods=['GET'])
+def search_blog_posts():
+    """Full-text search over published posts, best match first, with cursor pagination"""
+    return cached_json(('posts',), build_search_results)
+
+def build_search_results():
+    """Build the search payload for ?q=, ?category=, ?per_page= and ?cursor="""
+    query = request.args.get('q', '').strip()
+    per_page = max(1, min(request.args.get('per_page', 10, type=int), MAX_PER_PAGE))
+    if not query:
+        return {'error': 'Search query is required'}, 400
+    if not search_available(db):
+        return {'error': 'Search is not available on this database'}, 501
+    
+    match = match_expression(query)
+    if match is None:
+        return {'query': query, 'results': [], 'next_cursor': None, 'prev_cursor': None, 'per_page': per_page}, 200
+    
+    try:
+        hits, next_cursor, prev_cursor = search_posts(
+            db, match, per_page, cursor=request.args.get('cursor'), category=request.args.get('category')
+        )
+    except InvalidCursor as e:
+        return {'error': str(e)}, 400
+    
+    # One query for the matched posts, then restore rank order
+    posts = {post.id: post for post in BlogPost.query.filter(BlogPost.id.in_([hit['id'] for hit in hits]))}
+    results = []
+    for hit in hits:
+        post = posts.get(hit['id'])
+        if post is None:
+            continue
+        data = post.to_dict(include_content=False)
+        data.update(title_highlight=hit['title_highlight'], snippet=hit['snippet'], score=-hit['rank'])
+        results.append(data)
+    
+    return {
+        'query': query,
+        'results': results,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'per_page': per_page
+    }, 200
 
 @blog_bp.route('/posts/<slug>', methods=['GET'])
 def get_blog_post(slug):
     """Get a single blog post by slug"""
-    post = BlogPost.query.filter_by(slug=slug).first_or_404()
+    entry = response_cache.get(request.full_path)
+    if entry is None:
+        stamps = response_cache.stamps((post_tag(slug), post_views_tag(slug)))
+        post = BlogPost.query.filter_by(slug=slug).first_or_404()
+        
+        # A revalidation is answered before comments and related posts are read
+        etag, last_modified = post_validators(post, stamps[0][1])
+        if is_not_modified(etag, last_modified):
+            view_counter.record(post.id)
+            return not_modified(etag, last_modified)
+        
+        # Approved comments come as a nested tree, optionally bounded
+        post_data = post_detail(post, max_depth=request.args.get('max_depth', type=int),
+                                reply_limit=request.args.get('reply_limit', type=int))
+        entry = (post_data, etag, last_modified)
+        response_cache.set(request.full_path, entry, stamps)
     
-    # Increment view count
-    post.view_count += 1
-    db.session.commit()
+    post_data, etag, last_modified = entry
     
-    # Get approved comments
-    comments = BlogComment.query.filter_by(
-        post_id=post.id, 
-        status='approved',
-        parent_id=None  # Only top-level comments
-    ).order_by(BlogComment.created_at.desc()).all()
+    # Buffer the view; it reaches the database in the next batched flush
+    view_counter.record(post_data['id'])
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
     
-    post_data = post.to_dict()
-    post_data['comments'] = [comment.to_dict() for comment in comments]
+    # Cached payloads are shared, so the live view count is patched onto a copy
+    post_data = dict(post_data)
+    post_data['view_count'] += view_counter.pending(post_data['id'])
     
-    return jsonify(post_data)
+    return set_validators(jsonify(post_data), etag, last_modified)
+
+def post_validators(post, stamp):
+    """
+    (ETag, Last-Modified) of a post's detail response, from the row and the
+    generation of its post tag rather than the payload. Comments, related
+    posts and same-second edits move the tag; view counts have their own.
+    """
+    etag = make_etag('post', post.id, post.updated_at, stamp, request.full_path)
+    last_modified = as_utc(post.updated_at)
+    if stamp:
+        last_modified = max(last_modified, as_utc(datetime.fromtimestamp(stamp / 1e9, timezone.utc)))
+    return etag, last_modified
+
+@blog_bp.route('/posts/<int:post_id>/views', methods=['POST'])
+def record_blog_post_view(post_id):
+    """Count a view of a post whose body nginx served from its static copy"""
+    view_counter.record(post_id)
+    return '', 204
 
 @blog_bp.route('/posts/<int:post_id>', methods=['GET'])
 def get_blog_post_by_id(post_id):
@@ -123,33 +280,39 @@ def create_blog_post(user):
         if featured_image and not re.match(r'^https?://', featured_image):
             return jsonify({'error': 'Featured image must be a valid URL'}), 400
         
-        # Generate slug from title
-        slug = re.sub(r'[^a-zA-Z0-9\s-]', '', title.lower())
-        slug = re.sub(r'\s+', '-', slug.strip())
-        
-        # Ensure slug is unique
-        base_slug = slug
-        counter = 1
-        while BlogPost.query.filter_by(slug=slug).first():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-        
-        post = BlogPost(
-            title=title,
-            slug=slug,
-            content=content,
-            excerpt=excerpt,
-            author_id=author_id,
-            meta_description=meta_description,
-            featured_image=featured_image,
-            status=data.get('status', 'draft'),
-            category=category,
-            tags=tags,
-            published_at=datetime.now() if data.get('status') == 'published' else None
-        )
-        
-        db.session.add(post)
+        # Categories are created from the categories endpoint, not by naming one here
+        try:
+            resolve_category(category)
+        except UnknownCategory as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def stage(slug):
+            post = BlogPost(
+                title=title,
+                slug=slug,
+                content=content,
+                excerpt=excerpt,
+                author_id=author_id,
+                meta_description=meta_description,
+                featured_image=featured_image,
+                status=data.get('status', 'draft'),
+                tags=tags,
+                published_at=datetime.now() if data.get('status') == 'published' else None
+            )
+            link_post_category(post, category)
+            sync_post_tags(post)
+            sync_post_images(post)
+            db.session.add(post)
+            return post
+        
+        # Generate a unique slug from the title and save
+        post = commit_with_slug(BlogPost, title, stage)
+        refresh_tag_counts(tag.id for tag in post.tag_rows)
+        refresh_category_counts([post.category_id])
         db.session.commit()
+        response_cache.invalidate('posts', 'categories')
+        static_posts.refresh(post.slug)
+        related_posts.schedule()
         
         current_app.logger.info(f"Successfully created blog post ID: {post.id}, Title: {post.title}, Status: {post.status}")
         return jsonify(post.to_dict()), 201
@@ -171,46 +334,64 @@ def update_blog_post(user, post_id):
         current_app.logger.info(f"Updating blog post ID: {post_id} with status: {data.get('status', 'No status')}")
         
         post = BlogPost.query.get_or_404(post_id)
+        old_slug = post.slug
+        old_tag_ids = {tag.id for tag in post.tag_rows}
+        old_category_id = post.category_id
         
-        # Update fields
-        if 'title' in data:
-            post.title = data['title']
-            
-            # Regenerate slug if title changed
-            slug = re.sub(r'[^a-zA-Z0-9\s-]', '', data['title'].lower())
-            slug = re.sub(r'\s+', '-', slug.strip())
-            
-            # Ensure slug is unique (excluding current post)
-            base_slug = slug
-            counter = 1
-            while BlogPost.query.filter(BlogPost.slug == slug, BlogPost.id != post_id).first():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            post.slug = slug
-        
-        if 'content' in data:
-            post.content = data['content']
-        if 'excerpt' in data:
-            post.excerpt = data['excerpt']
-        if 'meta_description' in data:
-            post.meta_description = data['meta_description']
-        if 'featured_image' in data:
-            post.featured_image = data['featured_image']
         if 'category' in data:
-            post.category = data['category']
-        if 'tags' in data:
-            post.tags = data['tags']
-        
-        # Handle status change
-        if 'status' in data:
-            old_status = post.status
-            post.status = data['status']
+            try:
+                resolve_category(data['category'])
+            except UnknownCategory as e:
+                return jsonify({'error': str(e)}), 400
+        
+        # Update fields; re-applied if a slug collision forces a retry
+        def apply_changes(slug=None):
+            if 'title' in data:
+                post.title = data['title']
+                post.slug = slug
             
-            # Set published_at when publishing for the first time
-            if old_status != 'published' and data['status'] == 'published':
-                post.published_at = datetime.now()
+            if 'content' in data:
+                post.content = data['content']
+            if 'excerpt' in data:
+                post.excerpt = data['excerpt']
+            if 'meta_description' in data:
+                post.meta_description = data['meta_description']
+            if 'featured_image' in data:
+                post.featured_image = data['featured_image']
+            if 'category' in data:
+                link_post_category(post, data['category'])
+            if 'tags' in data:
+                post.tags = data['tags']
+                sync_post_tags(post)
+            if 'content' in data or 'featured_image' in data:
+                sync_post_images(post)
+            related_posts.mark_changed(post.id)
+            
+            # Handle status change
+            if 'status' in data:
+                old_status = post.status
+                post.status = data['status']
+                
+                # Set published_at when publishing for the first time
+                if old_status != 'published' and data['status'] == 'published':
+                    post.published_at = datetime.now()
+            return post
         
-        db.session.commit()
+        if 'title' in data:
+            # Regenerate slug from the new title (the current one is kept if still valid)
+            commit_with_slug(BlogPost, data['title'], apply_changes, current_slug=old_slug, exclude_id=post_id)
+        else:
+            apply_changes()
+            db.session.commit()
+        
+        # Tag and category counts only cover published posts, so status changes matter too
+        if 'tags' in data or 'category' in data or 'status' in data:
+            refresh_tag_counts(old_tag_ids | {tag.id for tag in post.tag_rows})
+            refresh_category_counts({old_category_id, post.category_id})
+            db.session.commit()
+        response_cache.invalidate('posts', 'categories', post_tag(old_slug), post_tag(post.slug))
+        static_posts.refresh(old_slug, post.slug)
+        related_posts.schedule()
         
         current_app.logger.info(f"Successfully updated blog post ID: {post.id}, Title: {post.title}, Status: {post.status}")
         return jsonify(post.to_dict())
@@ -226,8 +407,18 @@ def delete_blog_post(user, post_id):
     """Delete a blog post"""
     try:
         post = BlogPost.query.get_or_404(post_id)
+        slug = post.slug
+        tag_ids = [tag.id for tag in post.tag_rows]
+        category_id = post.category_id
+        related_posts.forget(post_id)
         db.session.delete(post)
         db.session.commit()
+        refresh_tag_counts(tag_ids)
+        refresh_category_counts([category_id])
+        db.session.commit()
+        response_cache.invalidate('posts', 'categories', post_tag(slug))
+        static_posts.refresh(slug)
+        related_posts.schedule()
         
         return jsonify({'message': 'Post deleted successfully'})
         
@@ -235,11 +426,78 @@ def delete_blog_post(user, post_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@blog_bp.route('/tags', methods=['GET'])
+def get_blog_tags():
+    """Get the tags of published posts with their post counts, most used first"""
+    def build():
+        tags = BlogTag.query.filter(BlogTag.post_count > 0)\
+            .order_by(BlogTag.post_count.desc(), BlogTag.name.collate('NOCASE')).all()
+        return [tag.to_dict() for tag in tags], 200
+    
+    return cached_json(('posts',), build)
+
+def feed_fingerprint():
+    """(etag, last_modified, count) of the published posts, cached until a post or settings write"""
+    return response_cache.get_or_set('feeds:fingerprint', published_fingerprint, ('posts', 'settings'))
+
+def feed_document(name, mimetype, write):
+    """
+    Serve a feed or sitemap file, rebuilding it only when the published posts changed.
+    
+    write(out, last_modified, count) streams the document into the file. The
+    file is named after the fingerprint, so its mtime is the Last-Modified.
+    """
+    etag, last_modified, count = feed_fingerprint()
+    if is_not_modified(etag):
+        return not_modified(etag)
+    
+    path = document_path(name, etag, lambda out: write(out, last_modified, count))
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+    # Leave Cache-Control to the CACHE_CONTROL policy rather than send_file's no-cache
+    response.headers.pop('Cache-Control', None)
+    return response
+
+@blog_bp.route('/feed.xml', methods=['GET'])
+def get_rss_feed():
+    """RSS 2.0 feed of the newest published posts"""
+    return feed_document('feed.xml', 'application/rss+xml',
+                         lambda out, last_modified, count: write_rss(out, last_modified))
+
+@blog_bp.route('/atom.xml', methods=['GET'])
+def get_atom_feed():
+    """Atom feed of the newest published posts"""
+    return feed_document('atom.xml', 'application/atom+xml',
+                         lambda out, last_modified, count: write_atom(out, last_modified))
+
+@blog_bp.route('/sitemap.xml', methods=['GET'])
+def get_sitemap():
+    """Sitemap of published posts, or a sitemap index once there are too many for one file"""
+    def write(out, last_modified, count):
+        pages = sitemap_pages(count)
+        if pages:
+            write_sitemap_index(out, pages, last_modified)
+        else:
+            write_sitemap(out)
+    
+    return feed_document('sitemap.xml', 'application/xml', write)
+
+@blog_bp.route('/sitemap-<int:page>.xml', methods=['GET'])
+def get_sitemap_page(page):
+    """One page of a sitemap split by get_sitemap"""
+    _, _, count = feed_fingerprint()
+    if not 1 <= page <= sitemap_pages(count):
+        abort(404)
+    return feed_document(f'sitemap-{page}.xml', 'application/xml',
+                         lambda out, last_modified, count: write_sitemap(out, page))
+
 @blog_bp.route('/categories', methods=['GET'])
 def get_blog_categories():
     """Get all blog categories"""
-    categories = BlogCategory.query.order_by(BlogCategory.name).all()
-    return jsonify([category.to_dict() for category in categories])
+    def build():
+        categories = BlogCategory.query.order_by(BlogCategory.name).all()
+        return [category.to_dict() for category in categories], 200
+    
+    return cached_json(('categories',), build)
 
 @blog_bp.route('/categories', methods=['POST'])
 @admin_required
@@ -248,20 +506,20 @@ def create_blog_category(user):
     data = request.json
     
     try:
-        # Generate slug from name
-        slug = re.sub(r'[^a-zA-Z0-9\s-]', '', data['name'].lower())
-        slug = re.sub(r'\s+', '-', slug.strip())
-        
-        category = BlogCategory(
-            name=data['name'],
-            slug=slug,
-            description=data.get('description', ''),
-            color=data.get('color', '#3b82f6'),
-            meta_description=data.get('meta_description', '')
-        )
-        
-        db.session.add(category)
-        db.session.commit()
+        def stage(slug):
+            category = BlogCategory(
+                name=data['name'],
+                slug=slug,
+                description=data.get('description', ''),
+                color=data.get('color', '#3b82f6'),
+                meta_description=data.get('meta_description', '')
+            )
+            db.session.add(category)
+            return category
+        
+        # Generate a unique slug from the name and save
+        category = commit_with_slug(BlogCategory, data['name'], stage)
+        response_cache.invalidate('categories')
         
         return jsonify(category.to_dict()), 201
         
@@ -280,29 +538,36 @@ def update_blog_category(user, category_id):
             
         category = BlogCategory.query.get_or_404(category_id)
         
-        # Update fields
-        if 'name' in data:
-            category.name = data['name']
-            # Regenerate slug if name changed
-            slug = re.sub(r'[^a-zA-Z0-9\s-]', '', data['name'].lower())
-            slug = re.sub(r'\s+', '-', slug.strip())
+        old_slug = category.slug
+        
+        # Update fields; re-applied if a slug collision forces a retry
+        def apply_changes(slug=None):
+            if 'name' in data:
+                category.name = data['name']
+                category.slug = slug
             
-            # Ensure slug is unique (excluding current category)
-            base_slug = slug
-            counter = 1
-            while BlogCategory.query.filter(BlogCategory.slug == slug, BlogCategory.id != category_id).first():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            category.slug = slug
-        
-        if 'description' in data:
-            category.description = data['description']
-        if 'color' in data:
-            category.color = data['color']
-        if 'meta_description' in data:
-            category.meta_description = data['meta_description']
+            if 'description' in data:
+                category.description = data['description']
+            if 'color' in data:
+                category.color = data['color']
+            if 'meta_description' in data:
+                category.meta_description = data['meta_description']
+            return category
+        
+        old_name = category.name
+        if 'name' in data:
+            # Regenerate slug from the new name (the current one is kept if still valid)
+            commit_with_slug(BlogCategory, data['name'], apply_changes, current_slug=old_slug, exclude_id=category_id)
+        else:
+            apply_changes()
+            db.session.commit()
         
-        db.session.commit()
+        slugs = []
+        if category.name != old_name:
+            # Posts link by id; refresh the name they display
+            slugs = relabel_category_posts(category_id, category.name)
+            db.session.commit()
+        invalidate_relabelled_posts(slugs)
         
         return jsonify(category.to_dict())
         
@@ -316,8 +581,11 @@ def delete_blog_category(user, category_id):
     """Delete a blog category"""
     try:
         category = BlogCategory.query.get_or_404(category_id)
+        # Unlink its posts in the same transaction so none point at a missing row
+        slugs = relabel_category_posts(category_id, None)
         db.session.delete(category)
         db.session.commit()
+        invalidate_relabelled_posts(slugs)
         
         return jsonify({'message': 'Category deleted successfully'})
         
@@ -325,6 +593,29 @@ def delete_blog_category(user, category_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+def relabel_category_posts(category_id, name):
+    """
+    Set the category text of a category's posts in one indexed UPDATE.
+    
+    name=None also unlinks the posts from the category. The caller commits
+    and then passes the returned post slugs to invalidate_relabelled_posts.
+    """
+    posts = BlogPost.__table__
+    slugs = db.session.execute(select(posts.c.slug).where(posts.c.category_id == category_id)).scalars().all()
+    values = {'category': name}
+    if name is None:
+        values['category_id'] = None
+    db.session.execute(update(posts).where(posts.c.category_id == category_id).values(**values))
+    return slugs
+
+def invalidate_relabelled_posts(slugs):
+    """Drop cached responses and static copies that show the old category name"""
+    if slugs:
+        response_cache.invalidate('categories', 'posts', *(post_tag(slug) for slug in slugs))
+        static_posts.refresh(*slugs)
+    else:
+        response_cache.invalidate('categories')
+
 # Comment routes
 @blog_bp.route('/posts/<int:post_id>/comments', methods=['POST'])
 def create_comment(post_id):
@@ -371,17 +662,9 @@ def create_comment(post_id):
         
         # Check if commenter is a verified user for auto-approval
         # First check if user is authenticated (logged in)
-        authenticated_user = None
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            try:
-                from utils.auth import verify_token
-                token = auth_header.split(' ')[1]
-                user_id = verify_token(token)
-                if user_id:
-                    authenticated_user = User.query.get(user_id)
-            except:
-                pass  # Invalid token, continue as anonymous user
+        # Invalid tokens fall through as an anonymous user
+        token = bearer_token()
+        authenticated_user = get_principal(token) if token else None
         
         # Determine comment status based on authentication and verification
         if authenticated_user and authenticated_user.email_verified:
@@ -406,6 +689,9 @@ def create_comment(post_id):
         
         db.session.add(comment)
         db.session.commit()
+        if comment_status == 'approved':
+            response_cache.invalidate(post_tag(post.slug))
+            static_posts.refresh(post.slug)
         
         current_app.logger.info(f"New comment created for post {post_id} by {author_name} (status: {comment_status})")
         
@@ -434,6 +720,8 @@ def approve_comment(user, comment_id):
         comment = BlogComment.query.get_or_404(comment_id)
         comment.status = 'approved'
         db.session.commit()
+        response_cache.invalidate(post_tag(comment.post.slug))
+        static_posts.refresh(comment.post.slug)
         
         current_app.logger.info(f"Comment {comment_id} approved by admin {user.username}")
         return jsonify({'message': 'Comment approved successfully'})
@@ -450,6 +738,8 @@ def reject_comment(user, comment_id):
         comment = BlogComment.query.get_or_404(comment_id)
         comment.status = 'rejected'
         db.session.commit()
+        response_cache.invalidate(post_tag(comment.post.slug))
+        static_posts.refresh(comment.post.slug)
         
         current_app.logger.info(f"Comment {comment_id} rejected by admin {user.username}")
         return jsonify({'message': 'Comment rejected successfully'})
@@ -464,8 +754,11 @@ def delete_comment(user, comment_id):
     """Delete a comment"""
     try:
         comment = BlogComment.query.get_or_404(comment_id)
+        slug = comment.post.slug
         db.session.delete(comment)
         db.session.commit()
+        response_cache.invalidate(post_tag(slug))
+        static_posts.refresh(slug)
         
         current_app.logger.info(f"Comment {comment_id} deleted by admin {user.username}")
         return jsonify({'message': 'Comment deleted successfully'})
@@ -487,7 +780,7 @@ def get_pending_comments(user):
             .paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            'comments': [comment.to_dict() for comment in comments.items],
+            'comments': [comment.to_dict(include_replies=False) for comment in comments.items],
             'total': comments.total,
             'pages': comments.pages,
             'current_page': page,
@@ -496,4 +789,10 @@ def get_pending_comments(user):
         
     except Exception as e:
         current_app.logger.error(f"Error fetching pending comments: {str(e)}")
-        return jsonify({'error': 'Failed to fetch comments'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to fetch comments'}), 500
+
+@blog_bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats(user):
+    """Get response cache hit/miss statistics for this worker"""
+    return jsonify(response_cache.stats())
@@ -0,0 +1,110 @@
+"""
+Email outbox routes: delivery state of queued emails, and announcement opt-out
+"""
+import html
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app
+from itsdangerous import BadSignature
+from sqlalchemy import func, update
+from utils.auth import admin_required
+from utils.outbox import email_outbox
+from utils.bulk_mail import unsubscribe_user_id
+from models.outbox import EmailMessage
+from models.user import User
+from __init__ import db
+
+email_bp = Blueprint('email', __name__)
+
+STATUSES = ('pending', 'sent', 'failed')
+
+@email_bp.route('/outbox', methods=['GET'])
+@admin_required
+def get_outbox(user):
+    """Queued emails, newest first, optionally filtered by status and user (admin only)"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        status = request.args.get('status')
+        if status and status not in STATUSES:
+            return jsonify({'error': f'Status must be one of {", ".join(STATUSES)}'}), 400
+
+        query = EmailMessage.query
+        if status:
+            query = query.filter_by(status=status)
+        user_id = request.args.get('user_id', type=int)
+        if user_id:
+            query = query.filter_by(user_id=user_id)
+        messages = query.order_by(EmailMessage.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+
+        counts = dict(db.session.query(EmailMessage.status, func.count(EmailMessage.id))
+                      .group_by(EmailMessage.status).all())
+        return jsonify({
+            'messages': [message.to_dict() for message in messages.items],
+            'counts': {name: counts.get(name, 0) for name in STATUSES},
+            'total': messages.total,
+            'pages': messages.pages,
+            'current_page': page,
+            'per_page': per_page
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching email outbox: {str(e)}")
+        return jsonify({'error': 'Failed to fetch email outbox'}), 500
+
+@email_bp.route('/outbox/<int:message_id>', methods=['GET'])
+@admin_required
+def get_outbox_message(user, message_id):
+    """Delivery state of one queued email (admin only)"""
+    message = EmailMessage.query.get_or_404(message_id)
+    return jsonify(message.to_dict())
+
+@email_bp.route('/outbox/<int:message_id>/retry', methods=['POST'])
+@admin_required
+def retry_outbox_message(user, message_id):
+    """Send a failed email again, with a fresh set of attempts (admin only)"""
+    message = EmailMessage.query.get_or_404(message_id)
+    if message.status == 'sent':
+        return jsonify({'error': 'Email was already sent'}), 400
+
+    try:
+        message.status = 'pending'
+        message.attempts = 0
+        message.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+    email_outbox.notify()
+    db.session.refresh(message)
+    return jsonify(message.to_dict())
+
+UNSUBSCRIBE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Unsubscribe</title></head>
+<body>
+<p>Stop receiving emails about new posts?</p>
+<form method="post" action="{action}"><button type="submit">Unsubscribe</button></form>
+</body></html>
+"""
+
+@email_bp.route('/unsubscribe', methods=['GET', 'POST'])
+def unsubscribe():
+    """
+    Turn off new post emails for the user of a signed ?token=. The link in
+    each announcement GETs a confirmation page, which changes nothing (mail
+    scanners follow links); its form and the List-Unsubscribe one-click
+    POST do the opt-out.
+    """
+    try:
+        user_id = unsubscribe_user_id(current_app.config, request.args.get('token', ''))
+    except (BadSignature, ValueError):
+        return jsonify({'error': 'Invalid unsubscribe link'}), 400
+
+    if request.method == 'GET':
+        return UNSUBSCRIBE_PAGE.format(action=html.escape(request.full_path)), 200, \
+            {'Content-Type': 'text/html; charset=utf-8', 'Cache-Control': 'no-store'}
+
+    users = User.__table__
+    db.session.execute(update(users).where(users.c.id == user_id).values(email_announcements=False))
+    db.session.commit()
+    return jsonify({'message': 'You will no longer receive new post emails'})
@@ -5,6 +5,7 @@ from flask import Blueprint, request, jsonify, current_app
 from utils.auth import token_required, admin_required
 from __init__ import db
 from shared_models import get_setting
+from utils.cache import response_cache
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -48,6 +49,8 @@ def update_settings(current_user):
                 db.session.add(setting)
         
         db.session.commit()
+        # Feeds and sitemaps embed the site settings
+        response_cache.invalidate('settings')
         return jsonify({'message': 'Settings updated successfully'}), 200
         
     except Exception as e:
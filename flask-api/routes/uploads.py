@@ -1,55 +1,77 @@
 """
 Image upload routes for blog CMS
 """
+import json
+import mimetypes
 import os
-import uuid
-from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from flask import Blueprint, request, jsonify, current_app, send_from_directory
 from utils.auth import admin_required
-from PIL import Image
-import re
+from utils.images import image_processor, upload_dirs, image_manifest, save_upload, inspect_image, \
+    ImageQueueFull, UploadTooLarge, InvalidImage, UPLOAD_FORMATS, VARIANT_RE
+from utils.image_references import image_referrers
+from utils.transforms import image_transformer, InvalidTransform
+from __init__ import db
+from shared_models import get_image_upload
+
+ImageUpload = get_image_upload()
 
 uploads_bp = Blueprint('uploads', __name__)
 
 # Allowed image extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+
+# Room for the multipart boundaries and headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
 
 def allowed_file(filename):
     """Check if file has allowed extension"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def create_upload_directory():
-    """Create upload directory if it doesn't exist"""
-    upload_dir = os.path.join(current_app.instance_path, 'uploads', 'images')
-    os.makedirs(upload_dir, exist_ok=True)
-    return upload_dir
+def too_large_response():
+    max_size = current_app.config['IMAGE_MAX_UPLOAD_SIZE']
+    return jsonify({'error': f'File too large. Maximum size is {max_size // (1024 * 1024)}MB'}), 413
 
-def resize_image(image_path, max_width=1200, max_height=800, quality=85):
-    """Resize image to optimize for web"""
-    try:
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            # Calculate new dimensions maintaining aspect ratio
-            width, height = img.size
-            if width > max_width or height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # Save optimized image
-            img.save(image_path, 'JPEG', quality=quality, optimize=True)
-            
-    except Exception as e:
-        current_app.logger.error(f"Error resizing image: {str(e)}")
+def duplicate_response(upload):
+    """Answer an upload whose bytes are already stored with the existing image"""
+    current_app.logger.info(f"Duplicate image upload, reusing {upload.filename}")
+    data = upload_payload(upload)
+    data.update({
+        'success': True,
+        'duplicate': True,
+        'status_url': f"/api/uploads/images/{upload.filename}/status"
+    })
+    return jsonify(data), 200
+
+def find_image(filename):
+    """
+    (directory, mimetype) to serve an image from, decided by its upload row
+    rather than by looking for files: the optimized JPEG once it is ready,
+    the original upload until then. Variants and uploads without a row only
+    exist optimized. A missing file is a 404 from whoever sends it.
+    """
+    originals, optimized = upload_dirs()
+    if VARIANT_RE.match(filename):
+        return optimized, None
+    status = db.session.query(ImageUpload.status).filter_by(filename=filename).scalar()
+    if status in ('processing', 'failed'):
+        return originals, None
+    # Optimized uploads keep their original extension but hold a JPEG
+    return optimized, 'image/jpeg'
 
 @uploads_bp.route('/upload-image', methods=['POST'])
 @admin_required
 def upload_image(user):
     """Upload and process an image file"""
+    max_size = current_app.config['IMAGE_MAX_UPLOAD_SIZE']
+    # A larger Content-Length is refused before any of the body is read, and
+    # reading stops once a body without one grows past the limit. The
+    # multipart parser spools the file to disk rather than memory.
+    request.max_content_length = max_size + MULTIPART_OVERHEAD
+    
     try:
         # Check if file is in request
         if 'image' not in request.files:
@@ -61,64 +83,167 @@ def upload_image(user):
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Check file size
-        if len(file.read()) > MAX_FILE_SIZE:
-            return jsonify({'error': 'File too large. Maximum size is 5MB'}), 400
-        
-        # Reset file pointer
-        file.seek(0)
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WebP'}), 400
         
-        if file and allowed_file(file.filename):
-            # Create upload directory
-            upload_dir = create_upload_directory()
+        # Stream to a temp file, hashing as it arrives
+        originals, _ = upload_dirs()
+        tmp_path, original_size, content_hash = save_upload(file.stream, originals, max_size)
+        try:
+            # Only the header is read here; the one full decode happens in the pool
+            fmt, _, _ = inspect_image(tmp_path, current_app.config['IMAGE_MAX_PIXELS'])
             
-            # Generate unique filename
-            file_extension = secure_filename(file.filename).rsplit('.', 1)[1].lower()
-            unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
+            # The same bytes were uploaded before: reuse that image, retrying
+            # it if processing failed or never finished
+            existing = ImageUpload.query.filter_by(content_hash=content_hash).first()
+            if existing is not None and existing.status != 'failed':
+                os.remove(tmp_path)
+                image_processor.requeue_if_stale(existing)
+                return duplicate_response(existing)
             
-            # Save file
-            file_path = os.path.join(upload_dir, unique_filename)
-            file.save(file_path)
+            # Refuse early rather than store an image no worker will get to
+            try:
+                image_processor.reserve()
+            except ImageQueueFull:
+                os.remove(tmp_path)
+                response = jsonify({'error': 'Too many images are being processed, try again shortly'})
+                response.headers['Retry-After'] = '5'
+                return response, 503
             
-            # Resize and optimize image
-            resize_image(file_path)
-            
-            # Generate URL for accessing the image
-            image_url = f"/api/uploads/images/{unique_filename}"
-            
-            current_app.logger.info(f"Image uploaded successfully: {unique_filename}")
+            if existing is not None:
+                # The new copy replaces the original in case the failed run lost it
+                os.replace(tmp_path, os.path.join(originals, existing.filename))
+                if not image_processor.retry(existing):
+                    image_processor.release()
+                return duplicate_response(existing)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        try:
+            # Stored under its content hash; the original is served until the optimized copy is ready
+            unique_filename = f"{content_hash}.{UPLOAD_FORMATS[fmt]}"
+            os.replace(tmp_path, os.path.join(originals, unique_filename))
             
-            return jsonify({
-                'success': True,
-                'image_url': image_url,
-                'filename': unique_filename,
-                'original_filename': secure_filename(file.filename)
-            }), 201
+            upload = ImageUpload(
+                filename=unique_filename,
+                content_hash=content_hash,
+                original_filename=secure_filename(file.filename),
+                uploaded_by=user.id,
+                original_size=original_size
+            )
+            db.session.add(upload)
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent upload of the same bytes got there first
+            db.session.rollback()
+            image_processor.release()
+            return duplicate_response(ImageUpload.query.filter_by(content_hash=content_hash).first_or_404())
+        except Exception:
+            image_processor.release()
+            raise
         
-        return jsonify({'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WebP'}), 400
+        # Resize and optimize in the background
+        image_processor.submit(upload)
         
+        current_app.logger.info(f"Image uploaded successfully: {unique_filename}")
+        
+        data = upload_payload(upload)
+        data.update({
+            'success': True,
+            'duplicate': False,
+            'status_url': f"/api/uploads/images/{unique_filename}/status"
+        })
+        return jsonify(data), 201
+    
+    except (RequestEntityTooLarge, UploadTooLarge):
+        return too_large_response()
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error uploading image: {str(e)}")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+@uploads_bp.route('/images/<filename>/status', methods=['GET'])
+@admin_required
+def image_status(user, filename):
+    """Processing state of an uploaded image"""
+    upload = ImageUpload.query.filter_by(filename=filename).first()
+    if upload is None:
+        return jsonify({'error': 'Image not found'}), 404
+    
+    # A worker that exited mid-job leaves it processing; pick it up again
+    image_processor.requeue_if_stale(upload)
+    return jsonify(upload_payload(upload))
+
+@uploads_bp.route('/images/<filename>/variants', methods=['GET'])
+def image_variants(filename):
+    """srcset-ready sizes of an uploaded image; empty until it is processed"""
+    upload = ImageUpload.query.filter_by(filename=filename).first()
+    if upload is None:
+        return jsonify({'error': 'Image not found'}), 404
+    return jsonify(image_manifest(upload))
+
+def upload_payload(upload):
+    """An upload's record with its srcset manifest"""
+    data = upload.to_dict()
+    manifest = image_manifest(upload)
+    data['variants'] = manifest['variants']
+    data['srcset'] = manifest['srcset']
+    return data
+
+def send_image(directory, name, mimetype, cache_control):
+    """Send a stored image: through nginx with IMAGE_ACCEL_REDIRECT, else from the app"""
+    mimetype = mimetype or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    accel_prefix = current_app.config.get('IMAGE_ACCEL_REDIRECT')
+    if accel_prefix:
+        # nginx sends the file itself, with its own ETag and Range handling
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{os.path.basename(directory)}/{name}"
+    else:
+        response = send_from_directory(directory, name, mimetype=mimetype, conditional=True, etag=True)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
 @uploads_bp.route('/images/<filename>', methods=['GET'])
 def serve_image(filename):
-    """Serve uploaded images"""
+    """Serve uploaded images, or a resized copy with ?w=&h=&fmt="""
     try:
-        upload_dir = os.path.join(current_app.instance_path, 'uploads', 'images')
-        
         # Security check - ensure filename is safe
         secure_name = secure_filename(filename)
         if secure_name != filename:
             return jsonify({'error': 'Invalid filename'}), 400
         
-        # Check if file exists
-        file_path = os.path.join(upload_dir, secure_name)
-        if not os.path.exists(file_path):
-            return jsonify({'error': 'Image not found'}), 404
+        try:
+            transform = image_transformer.parse(request.args)
+        except InvalidTransform as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if transform is not None:
+            if VARIANT_RE.match(secure_name):
+                return jsonify({'error': 'Only uploaded images can be resized'}), 400
+            # Derived from the original; uploads from before it was kept only have the optimized copy
+            source = next((os.path.join(directory, secure_name) for directory in upload_dirs()
+                           if os.path.exists(os.path.join(directory, secure_name))), None)
+            if source is None:
+                return jsonify({'error': 'Image not found'}), 404
+            try:
+                path = image_transformer.get(source, secure_name, *transform)
+            except InvalidImage as e:
+                return jsonify({'error': str(e)}), 400
+            return send_image(os.path.dirname(path), os.path.basename(path), None,
+                              current_app.config['IMAGE_CACHE_CONTROL'])
         
-        return send_from_directory(upload_dir, secure_name)
+        upload_dir, mimetype = find_image(secure_name)
+        originals, _ = upload_dirs()
+        cache_control = current_app.config['IMAGE_PENDING_CACHE_CONTROL'] if upload_dir == originals \
+            else current_app.config['IMAGE_CACHE_CONTROL']
+        return send_image(upload_dir, secure_name, mimetype, cache_control)
         
+    except NotFound:
+        return jsonify({'error': 'Image not found'}), 404
     except Exception as e:
         current_app.logger.error(f"Error serving image: {str(e)}")
         return jsonify({'error': 'Failed to serve image'}), 500
@@ -128,22 +253,44 @@ def serve_image(filename):
 def delete_image(user, filename):
     """Delete an uploaded image"""
     try:
-        upload_dir = os.path.join(current_app.instance_path, 'uploads', 'images')
-        
         # Security check
         secure_name = secure_filename(filename)
         if secure_name != filename:
             return jsonify({'error': 'Invalid filename'}), 400
         
-        file_path = os.path.join(upload_dir, secure_name)
+        upload = ImageUpload.query.filter_by(filename=secure_name).first()
+        names = [secure_name]
+        if upload is not None:
+            # Uploads are shared by content, so only unused ones go
+            referrers = image_referrers(upload.id)
+            if referrers:
+                return jsonify({
+                    'error': 'Image is used by posts',
+                    'posts': [{'id': post.id, 'title': post.title} for post in referrers]
+                }), 409
+            names += [variant['filename'] for variant in json.loads(upload.variants or '[]')]
+        
+        deleted = False
+        for upload_dir in upload_dirs():
+            for name in names:
+                file_path = os.path.join(upload_dir, name)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    deleted = True
+        if image_transformer.remove(secure_name):
+            deleted = True
+        if upload is not None:
+            db.session.delete(upload)
+            db.session.commit()
+            deleted = True
         
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if deleted:
             current_app.logger.info(f"Image deleted: {secure_name}")
             return jsonify({'message': 'Image deleted successfully'})
         else:
             return jsonify({'error': 'Image not found'}), 404
             
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error deleting image: {str(e)}")
         return jsonify({'error': f'Delete failed: {str(e)}'}), 500
\ No newline at end of file
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Email a published post to every verified user
+
+Creates a campaign for the post, or resumes its unfinished one, and sends it
+over a small pool of SMTP connections (the app's SMTP_* settings), printing
+progress in messages per second. Interrupting it is safe: run the same
+command again and it continues after the last recipient it finished.
+"""
+import argparse
+import sys
+
+from __init__ import create_app, db
+
+def send_announcement(post=None, campaign_id=None, chunk_size=None, connections=None, again=False):
+    """Send (or resume) the announcement campaign of a post slug or id, or campaign_id"""
+    app = create_app()
+
+    with app.app_context():
+        from models.outbox import EmailCampaign
+        from shared_models import get_blog_post
+        from utils.bulk_mail import post_announcement, send_campaign
+        BlogPost = get_blog_post()
+        config = app.config
+
+        if campaign_id is not None:
+            campaign = EmailCampaign.query.get(campaign_id)
+            if campaign is None:
+                print(f"Campaign {campaign_id} not found")
+                return False
+        else:
+            query = BlogPost.query.filter_by(id=int(post)) if post.isdigit() else BlogPost.query.filter_by(slug=post)
+            blog_post = query.first()
+            if blog_post is None or blog_post.status != 'published':
+                print(f"No published post {post}")
+                return False
+            campaign = EmailCampaign.query.filter_by(post_id=blog_post.id) \
+                .order_by(EmailCampaign.id.desc()).first()
+            if campaign is not None and campaign.status == 'completed' and not again:
+                print(f"Post {post} was already announced (campaign {campaign.id}); use --again to send it again")
+                return False
+            if campaign is None or campaign.status == 'completed':
+                subject, body_html, body_text = post_announcement(blog_post, config['BASE_URL'])
+                campaign = EmailCampaign(post_id=blog_post.id, subject=subject, body_html=body_html, body_text=body_text)
+                db.session.add(campaign)
+                db.session.commit()
+                print(f"Created campaign {campaign.id}: {subject}")
+
+        if campaign.status == 'completed':
+            print(f"Campaign {campaign.id} already completed")
+            return True
+        if campaign.last_user_id:
+            print(f"Resuming campaign {campaign.id} after user {campaign.last_user_id}")
+
+        try:
+            return send_campaign(
+                campaign,
+                chunk_size=chunk_size or config.get('BULK_MAIL_CHUNK_SIZE', 200),
+                connections=connections or config.get('SMTP_POOL_SIZE', 4),
+                per_connection=config.get('SMTP_MESSAGES_PER_CONNECTION', 100)
+            )
+        except KeyboardInterrupt:
+            print(f"Interrupted; progress is saved, run again to resume campaign {campaign.id}")
+            return False
+
+def list_campaigns():
+    app = create_app()
+    with app.app_context():
+        from models.outbox import EmailCampaign
+        for campaign in EmailCampaign.query.order_by(EmailCampaign.id.desc()).limit(20):
+            data = campaign.to_dict()
+            print(f"{data['id']:>5}  {data['status']:<9}  sent {data['sent']}, deferred {data['deferred']}, "
+                  f"failed {data['failed']}, {data['messages_per_second'] or '-'} msgs/s  {data['subject']}")
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--post', help='slug or id of the published post to announce')
+    target.add_argument('--campaign', type=int, help='resume this campaign')
+    target.add_argument('--list', action='store_true', help='show recent campaigns')
+    parser.add_argument('--chunk-size', type=int, help='recipients read per batch (default: BULK_MAIL_CHUNK_SIZE)')
+    parser.add_argument('--connections', type=int, help='SMTP connections (default: SMTP_POOL_SIZE)')
+    parser.add_argument('--again', action='store_true', help='announce a post that was already announced')
+    args = parser.parse_args()
+    if args.list:
+        ok = list_campaigns()
+    else:
+        ok = send_announcement(post=args.post, campaign_id=args.campaign,
+                               chunk_size=args.chunk_size, connections=args.connections, again=args.again)
+    sys.exit(0 if ok else 1)
@@ -24,5 +24,23 @@ def get_blog_comment():
 def get_blog_category():
     return get_models()['BlogCategory']
 
+def get_blog_tag():
+    return get_models()['BlogTag']
+
+def get_blog_post_tags():
+    return get_models()['BlogPostTags']
+
+def get_blog_related_post():
+    return get_models()['BlogRelatedPost']
+
+def get_blog_related_source():
+    return get_models()['BlogRelatedSource']
+
+def get_image_upload():
+    return get_models()['ImageUpload']
+
+def get_image_references():
+    return get_models()['ImageReferences']
+
 def get_setting():
     return get_models()['Setting']
\ No newline at end of file
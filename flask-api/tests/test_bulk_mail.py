@@ -0,0 +1,87 @@
+"""
+Campaigns checkpoint every recipient, skip opted-out users and hand what
+the server could not take to the outbox
+"""
+import smtplib
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from __init__ import db
+from models.outbox import EmailCampaign, EmailMessage
+from models.user import User
+from utils import email as email_utils
+from utils.bulk_mail import send_campaign, unsubscribe_url
+
+class FakeServer:
+    """SMTP connection that accepts messages until the shared budget runs out"""
+
+    def __init__(self, sent, budget):
+        self.sent = sent
+        self.budget = budget
+
+    def send_message(self, msg):
+        if len(self.sent) >= self.budget:
+            raise smtplib.SMTPServerDisconnected('gone')
+        self.sent.append(msg)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def users(app):
+    users = [User(username=f'reader{i}', password=generate_password_hash('password123', 'pbkdf2:sha256:1000'),
+                  email=f'reader{i}@example.com', firstname='A', lastname='B', email_verified=True)
+             for i in range(6)]
+    users[1].email_announcements = False
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+def run_campaign(monkeypatch, budget):
+    sent = []
+
+    def connect(config):
+        if len(sent) >= budget:
+            raise OSError('connection refused')
+        return FakeServer(sent, budget)
+
+    monkeypatch.setattr(email_utils, 'smtp_connect', connect)
+    campaign = EmailCampaign(subject='New post', body_html='<html><body><p>Hi</p></body></html>', body_text='Hi\n')
+    db.session.add(campaign)
+    db.session.commit()
+    done = send_campaign(campaign, chunk_size=10, connections=2, report=lambda line: None)
+    return campaign, sent, done
+
+def test_campaign_skips_opted_out_users(monkeypatch, users):
+    campaign, sent, done = run_campaign(monkeypatch, budget=100)
+    assert done
+    assert sorted(msg['To'] for msg in sent) == sorted(user.email for user in users if user.email_announcements)
+    assert all(msg['List-Unsubscribe'].startswith('<') for msg in sent)
+    assert campaign.sent_count == 5
+
+def test_unavailable_server_hands_rest_of_chunk_to_outbox(monkeypatch, users):
+    campaign, sent, done = run_campaign(monkeypatch, budget=2)
+    assert not done
+    assert campaign.sent_count == 2
+    assert campaign.deferred_count == 3
+    assert campaign.last_user_id == users[-1].id
+    queued = {message.to_email for message in EmailMessage.query.filter_by(kind='campaign')}
+    assert queued == {user.email for user in users if user.email_announcements} - {msg['To'] for msg in sent}
+
+def test_unsubscribe_link_turns_off_announcements(client, app, users):
+    link = unsubscribe_url(app.config, users[0].id)
+    path = link[link.index('/api/'):]
+    page = client.get(path)
+    assert page.status_code == 200
+    assert b'<form method="post"' in page.data
+    db.session.refresh(users[0])
+    assert users[0].email_announcements is True
+
+    assert client.post(path).status_code == 200
+    db.session.refresh(users[0])
+    assert users[0].email_announcements is False
+    assert client.get('/api/email/unsubscribe?token=forged').status_code == 400
@@ -0,0 +1,90 @@
+"""
+Blog read validators change whenever the response body does
+"""
+from datetime import datetime
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from __init__ import db
+from routes import blog as blog_routes
+from models.user import User
+from shared_models import get_blog_post, get_setting
+from utils.cache import response_cache, post_tag
+
+@pytest.fixture
+def post(app):
+    BlogPost = get_blog_post()
+    author = User(username='author', password=generate_password_hash('password123', 'pbkdf2:sha256:1000'),
+                  email='author@example.com', firstname='A', lastname='B', email_verified=True)
+    db.session.add(author)
+    db.session.flush()
+    post = BlogPost(title='Post', slug='post', content='Body', status='published', author_id=author.id,
+                    published_at=datetime(2026, 1, 1), updated_at=datetime(2026, 1, 1))
+    db.session.add(post)
+    db.session.commit()
+    return post
+
+def edit_in_same_second(post, **values):
+    """Change a post without moving its one-second updated_at"""
+    for key, value in values.items():
+        setattr(post, key, value)
+    post.updated_at = post.updated_at
+    db.session.commit()
+    response_cache.invalidate('posts', post_tag(post.slug))
+
+def test_post_validators_follow_same_second_edit(client, post):
+    first = client.get('/api/blog/posts/post')
+    assert first.status_code == 200
+    assert first.headers['Last-Modified'] == 'Thu, 01 Jan 2026 00:00:00 GMT'
+    assert client.get('/api/blog/posts/post', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.get('/api/blog/posts/post',
+                      headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+
+    edit_in_same_second(post, title='Edited')
+    second = client.get('/api/blog/posts/post', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.json['title'] == 'Edited'
+    # Still the second of the edit, so no date a later edit could share
+    assert 'Last-Modified' not in second.headers
+    third = client.get('/api/blog/posts/post', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert third.status_code == 200
+
+def test_post_revalidation_skips_building_the_payload(client, post, monkeypatch):
+    etag = client.get('/api/blog/posts/post').headers['ETag']
+    response_cache.clear()
+
+    def build(*args, **kwargs):
+        raise AssertionError('payload built for a 304')
+    monkeypatch.setattr(blog_routes, 'post_detail', build)
+    assert client.get('/api/blog/posts/post', headers={'If-None-Match': etag}).status_code == 304
+
+def test_post_etag_ignores_view_count(client, post):
+    etag = client.get('/api/blog/posts/post').headers['ETag']
+    assert client.get('/api/blog/posts/post', headers={'If-None-Match': etag}).status_code == 304
+
+def test_listing_etag_follows_same_second_edit(client, post):
+    first = client.get('/api/blog/posts?status=published')
+    assert 'Last-Modified' not in first.headers
+
+    edit_in_same_second(post, title='Edited')
+    second = client.get('/api/blog/posts?status=published', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.json['posts'][0]['title'] == 'Edited'
+
+def test_feed_etag_follows_same_second_edit_and_settings(client, post, tmp_path, app):
+    app.config['FEED_DIR'] = str(tmp_path)
+    first = client.get('/api/blog/feed.xml').headers['ETag']
+
+    edit_in_same_second(post, title='Edited')
+    second = client.get('/api/blog/feed.xml', headers={'If-None-Match': first})
+    assert second.status_code == 200
+    assert b'Edited' in second.data
+
+    Setting = get_setting()
+    db.session.add(Setting(key='site_name', value='Renamed'))
+    db.session.commit()
+    response_cache.invalidate('settings')
+    third = client.get('/api/blog/feed.xml', headers={'If-None-Match': second.headers['ETag']})
+    assert third.status_code == 200
+    assert b'Renamed' in third.data
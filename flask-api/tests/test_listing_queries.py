@@ -0,0 +1,69 @@
+"""
+A listing page costs the same number of SQL statements whatever per_page is
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from __init__ import db
+from models.user import User
+from shared_models import get_blog_post, get_blog_category
+from utils.cache import response_cache
+
+@pytest.fixture
+def posts(app):
+    BlogPost = get_blog_post()
+    BlogCategory = get_blog_category()
+    categories = [BlogCategory(name=f'Category {i}', slug=f'category-{i}') for i in range(3)]
+    authors = [User(username=f'author{i}', password=generate_password_hash('password123', 'pbkdf2:sha256:1000'),
+                    email=f'author{i}@example.com', firstname='A', lastname='B', email_verified=True)
+               for i in range(4)]
+    db.session.add_all(categories + authors)
+    db.session.flush()
+    now = datetime.utcnow()
+    for i in range(30):
+        category = categories[i % len(categories)]
+        db.session.add(BlogPost(
+            title=f'Post {i}', slug=f'post-{i}', content='Body', status='published',
+            author_id=authors[i % len(authors)].id, category_id=category.id, category=category.name,
+            tags='one, two', published_at=now - timedelta(minutes=i), created_at=now - timedelta(minutes=i)
+        ))
+    db.session.commit()
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+def listing_statements(client, query):
+    response_cache.clear()
+    with count_statements() as statements:
+        response = client.get(f'/api/blog/posts?{query}')
+    assert response.status_code == 200
+    assert response.json['posts']
+    return len(statements)
+
+@pytest.mark.parametrize('query', [
+    'page=1',
+    'page=2',
+    'status=published&page=2',
+    'cursor=',
+    'status=published&cursor=',
+    'status=published&category=category-1&cursor=',
+])
+def test_listing_statements_do_not_grow_with_per_page(client, posts, query):
+    assert listing_statements(client, f'{query}&per_page=2') == listing_statements(client, f'{query}&per_page=12')
+
+def test_cursor_page_is_one_statement(client, posts):
+    assert listing_statements(client, 'status=published&cursor=&per_page=5') == 1
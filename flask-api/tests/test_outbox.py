@@ -0,0 +1,50 @@
+"""
+Requests only queue email; the sender delivers it later
+"""
+import pytest
+
+from models.outbox import EmailMessage
+from utils import email as email_utils
+from utils.outbox import email_outbox
+
+class FakeServer:
+    def __init__(self, sent):
+        self.sent = sent
+
+    def send_message(self, msg):
+        self.sent.append(msg)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(email_utils, 'smtp_connect', lambda config: FakeServer(sent))
+    yield sent
+    email_outbox.close()
+
+def register(client):
+    return client.post('/register', json={'username': 'reader', 'password': 'password123',
+                                          'email': 'reader@example.com', 'firstname': 'A', 'lastname': 'B'})
+
+def test_register_leaves_verification_email_pending(client, sent):
+    assert register(client).status_code == 201
+    assert sent == []
+    message = EmailMessage.query.one()
+    assert message.status == 'pending'
+    assert message.to_email == 'reader@example.com'
+
+    assert email_outbox.deliver() == 1
+    assert [msg['To'] for msg in sent] == ['reader@example.com']
+    assert EmailMessage.query.one().status == 'sent'
+
+def test_resend_verification_leaves_email_pending(client, sent):
+    register(client)
+    response = client.post('/resend-verification', json={'email': 'reader@example.com'})
+    assert response.status_code == 200
+    assert sent == []
+    assert EmailMessage.query.filter_by(status='pending').count() == 2
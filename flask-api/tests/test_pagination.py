@@ -0,0 +1,37 @@
+"""
+Cursor pagination walks every row, including rows with a NULL sort key
+"""
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from __init__ import db
+from models.user import User
+from shared_models import get_blog_post
+
+def test_cursor_pages_cross_null_sort_keys(client):
+    BlogPost = get_blog_post()
+    author = User(username='author', password=generate_password_hash('password123', 'pbkdf2:sha256:1000'),
+                  email='author@example.com', firstname='A', lastname='B', email_verified=True)
+    db.session.add(author)
+    db.session.flush()
+    now = datetime.utcnow()
+    for i in range(7):
+        # Imported posts may be published without a published_at
+        db.session.add(BlogPost(title=f'Post {i}', slug=f'post-{i}', content='Body', status='published',
+                                author_id=author.id, published_at=now - timedelta(minutes=i) if i % 2 else None))
+    db.session.commit()
+
+    seen, pages, cursor = [], [], ''
+    while cursor is not None:
+        response = client.get(f'/api/blog/posts?status=published&per_page=2&cursor={cursor}')
+        assert response.status_code == 200
+        pages.append(response.json)
+        seen += [post['id'] for post in response.json['posts']]
+        cursor = response.json['next_cursor']
+    assert sorted(seen) == sorted(post.id for post in BlogPost.query)
+    assert len(set(seen)) == len(seen)
+
+    # Walking back from the last page returns the same pages in reverse
+    back = client.get(f"/api/blog/posts?status=published&per_page=2&cursor={pages[-1]['prev_cursor']}")
+    assert [post['id'] for post in back.json['posts']] == [post['id'] for post in pages[-2]['posts']]
@@ -0,0 +1,38 @@
+"""
+Search filters categories the same way the listing does
+"""
+from datetime import datetime
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from __init__ import db
+from models.user import User
+from shared_models import get_blog_post, get_blog_category
+
+@pytest.fixture
+def posts(app):
+    BlogPost = get_blog_post()
+    BlogCategory = get_blog_category()
+    categories = [BlogCategory(name='Web Development', slug='web-development'),
+                  BlogCategory(name='Travel', slug='travel')]
+    author = User(username='author', password=generate_password_hash('password123', 'pbkdf2:sha256:1000'),
+                  email='author@example.com', firstname='A', lastname='B', email_verified=True)
+    db.session.add_all(categories + [author])
+    db.session.flush()
+    for i, category in enumerate(categories):
+        db.session.add(BlogPost(
+            title=f'Python notes {i}', slug=f'python-notes-{i}', content='Body', status='published',
+            author_id=author.id, category_id=category.id, category=category.name, published_at=datetime(2026, 1, 1)
+        ))
+    db.session.commit()
+
+@pytest.mark.parametrize('category', ['web-development', 'Web Development', 'WEB DEVELOPMENT'])
+def test_search_category_matches_name_or_slug(client, posts, category):
+    response = client.get('/api/blog/search', query_string={'q': 'python', 'category': category})
+    assert response.status_code == 200
+    assert [result['slug'] for result in response.json['results']] == ['python-notes-0']
+
+def test_search_unknown_category_matches_nothing(client, posts):
+    response = client.get('/api/blog/search', query_string={'q': 'python', 'category': 'nope'})
+    assert response.json['results'] == []
@@ -0,0 +1,72 @@
+"""
+Re-uploading the bytes of a failed image processes it again, and images
+are served from where their upload row says they are
+"""
+import io
+import os
+
+from PIL import Image
+from werkzeug.security import generate_password_hash
+
+from __init__ import db
+from models.user import User
+from shared_models import get_image_upload
+from utils.auth import generate_access_token
+from utils.images import upload_dirs
+
+def test_failed_duplicate_is_requeued(client):
+    admin = User(username='admin', password=generate_password_hash('password123', 'pbkdf2:sha256:1000'),
+                 email='admin@example.com', firstname='A', lastname='B', email_verified=True, is_admin=True)
+    db.session.add(admin)
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {generate_access_token(admin)}'}
+    image = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(image, 'PNG')
+
+    def upload():
+        data = {'image': (io.BytesIO(image.getvalue()), 'photo.png')}
+        return client.post('/api/uploads/upload-image', data=data, headers=headers,
+                           content_type='multipart/form-data')
+
+    first = upload()
+    assert first.status_code == 201
+    ImageUpload = get_image_upload()
+    row = ImageUpload.query.one()
+    row.status, row.error = 'failed', 'Worker died'
+    db.session.commit()
+
+    second = upload()
+    assert second.status_code == 200
+    assert second.json['duplicate'] is True
+    assert second.json['status'] == 'ready'
+    assert ImageUpload.query.count() == 1
+
+def test_served_file_follows_upload_status(client, app):
+    ImageUpload = get_image_upload()
+    originals, optimized = upload_dirs()
+    with open(os.path.join(originals, 'photo.png'), 'wb') as f:
+        f.write(b'original')
+    row = ImageUpload(filename='photo.png', status='processing')
+    db.session.add(row)
+    db.session.commit()
+
+    pending = client.get('/api/uploads/images/photo.png')
+    assert pending.status_code == 200
+    assert pending.data == b'original'
+    assert pending.headers['Cache-Control'] == app.config['IMAGE_PENDING_CACHE_CONTROL']
+    pending.close()
+
+    # Ready means optimized, without looking for the original
+    row.status = 'ready'
+    db.session.commit()
+    assert client.get('/api/uploads/images/photo.png').status_code == 404
+
+    with open(os.path.join(optimized, 'photo.png'), 'wb') as f:
+        f.write(b'optimized')
+    ready = client.get('/api/uploads/images/photo.png')
+    assert ready.data == b'optimized'
+    assert ready.mimetype == 'image/jpeg'
+    assert ready.headers['Cache-Control'] == app.config['IMAGE_CACHE_CONTROL']
+    ready.close()
+
+    assert client.get('/api/uploads/images/photo-640w.webp').status_code == 404
@@ -2,6 +2,6 @@
 Utility functions package
 """
 from .validation import sanitize_input, validate_blog_post
-from .auth import generate_token, verify_token, token_required
+from .auth import generate_access_token, generate_refresh_token, verify_token, token_required
 
-__all__ = ['sanitize_input', 'validate_blog_post', 'generate_token', 'verify_token', 'token_required']
\ No newline at end of file
+__all__ = ['sanitize_input', 'validate_blog_post', 'generate_access_token', 'generate_refresh_token', 'verify_token', 'token_required']
\ No newline at end of file
@@ -2,24 +2,54 @@
 Authentication utilities for JWT token handling
 """
 import jwt
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from functools import wraps
 from flask import request, jsonify, current_app
+from utils.cache import TaggedCache
 
-def generate_token(user_id):
-    """Generate JWT token for authenticated user"""
+# Principals keyed by token and tagged by user id
+principal_cache = TaggedCache('principal', 'PRINCIPAL_CACHE', max_entries=1024, ttl=60)
+
+def _encode(payload):
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+def generate_access_token(user):
+    """
+    Generate a short-lived access token carrying signed role claims, so
+    authorization needs no database lookup until the token expires
+    """
+    now = datetime.utcnow()
     payload = {
-        'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(days=7),  # 7 days instead of 24 hours
-        'iat': datetime.utcnow()
+        'type': 'access',
+        'user_id': user.id,
+        'username': user.username,
+        'is_admin': bool(user.is_admin),
+        'email_verified': bool(user.email_verified),
+        'exp': now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES'],
+        'iat': now
     }
-    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+    return _encode(payload)
 
-def verify_token(token):
-    """Verify JWT token and return user_id"""
+def generate_refresh_token(user):
+    """Generate a long-lived refresh token, only accepted by the /refresh endpoint"""
+    now = datetime.utcnow()
+    payload = {
+        'type': 'refresh',
+        'user_id': user.id,
+        'exp': now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES'],
+        'iat': now
+    }
+    return _encode(payload)
+
+def decode_token(token, expected_type='access'):
+    """
+    Verify a JWT and return its payload, or None if it is invalid, expired or
+    of the wrong type. Tokens issued before access/refresh typing carry no
+    type and are treated as access tokens until they expire.
+    """
     try:
         payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload['user_id']
     except jwt.ExpiredSignatureError:
         current_app.logger.warning(f"Token expired for request")
         return None
@@ -27,6 +57,82 @@ def verify_token(token):
         current_app.logger.warning(f"Invalid token: {str(e)}")
         return None
 
+    if payload.get('type', 'access') != expected_type:
+        current_app.logger.warning(f"Expected {expected_type} token, got {payload.get('type', 'access')}")
+        return None
+    return payload
+
+def verify_token(token):
+    """Verify an access token and return user_id"""
+    payload = decode_token(token)
+    return payload['user_id'] if payload else None
+
+class Principal:
+    """Authorization-relevant snapshot of a user, cached across requests"""
+    __slots__ = ('id', 'username', 'is_admin', 'email_verified')
+
+    def __init__(self, id, username, is_admin, email_verified):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+        self.email_verified = email_verified
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, bool(user.is_admin), bool(user.email_verified))
+
+def user_tag(user_id):
+    """Invalidation tag for every cached principal of a user"""
+    return f'user:{user_id}'
+
+def invalidate_principal(user_id):
+    """
+    Drop cached principals after a user's admin or verification state changes.
+    Only legacy untyped tokens are cached: an access token keeps the role
+    claims it was signed with until it expires or is refreshed, so this does
+    not revoke a role on such a token.
+    """
+    principal_cache.invalidate(user_tag(user_id))
+
+def get_principal(token):
+    """
+    Resolve an access token to a Principal, or None if it is invalid or the
+    user no longer exists. Access tokens are authorized from their signed
+    claims alone; legacy tokens without claims are looked up in the users
+    table through the principal cache, which never outlives the token.
+    """
+    payload = decode_token(token)
+    if payload is None:
+        return None
+
+    if 'is_admin' in payload:
+        return Principal(payload['user_id'], payload['username'],
+                         payload['is_admin'], payload['email_verified'])
+
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    user_id = payload['user_id']
+    stamps = principal_cache.stamps((user_tag(user_id),))
+
+    from models.user import User
+    user = User.query.get(user_id)
+    if not user:
+        return None
+
+    principal = Principal.from_user(user)
+    ttl = min(principal_cache.default_ttl, int(payload.get('exp', 0) - time.time()))
+    principal_cache.set(token, principal, stamps, ttl=ttl)
+    return principal
+
+def bearer_token():
+    """Return the bearer token from the Authorization header, if any"""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
 def token_required(f):
     """Decorator to require valid JWT token"""
     @wraps(f)
@@ -41,19 +147,13 @@ def token_required(f):
             return jsonify({'error': 'Authentication required - Invalid header format'}), 401
         
         token = auth_header.split(' ')[1]
-        user_id = verify_token(token)
-        if user_id is None:
+        user = get_principal(token)
+        if user is None:
             current_app.logger.warning("Token verification failed")
             return jsonify({'error': 'Invalid or expired token'}), 401
         
-        # Get user object and pass to function
-        from models.user import User
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 401
-        
         # Add user_id to request context
-        request.current_user_id = user_id
+        request.current_user_id = user.id
         return f(user, *args, **kwargs)
     return decorated
 
@@ -71,19 +171,17 @@ def admin_required(f):
             return jsonify({'error': 'Authentication required - Invalid header format'}), 401
         
         token = auth_header.split(' ')[1]
-        user_id = verify_token(token)
-        if user_id is None:
+        user = get_principal(token)
+        if user is None:
             current_app.logger.warning("Token verification failed")
             return jsonify({'error': 'Invalid or expired token'}), 401
         
         # Check if user is admin
-        from models.user import User
-        user = User.query.get(user_id)
-        if not user or not user.is_admin:
-            current_app.logger.warning(f"Non-admin user {user_id} attempted to access admin endpoint")
+        if not user.is_admin:
+            current_app.logger.warning(f"Non-admin user {user.id} attempted to access admin endpoint")
             return jsonify({'error': 'Admin privileges required'}), 403
         
         # Add user_id to request context
-        request.current_user_id = user_id
+        request.current_user_id = user.id
         return f(user, *args, **kwargs)
     return decorated
\ No newline at end of file
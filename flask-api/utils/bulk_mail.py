@@ -0,0 +1,261 @@
+"""
+Bulk email to verified users
+
+A campaign's recipients are streamed from users in id order, a chunk at a
+time, and sent by a few threads that share a small pool of logged-in SMTP
+connections; each connection carries many messages before it is recycled,
+instead of one connection and login per recipient. As each recipient is
+handled the campaign records it as the last user it finished, so a run that
+stops (or is stopped) resumes from there. A recipient the server defers, or
+that could not be sent because the server went away, is handed to the email
+outbox, which retries it with backoff.
+
+Users who opted out of announcements are skipped. Every message carries a
+signed unsubscribe link and List-Unsubscribe headers.
+"""
+import html
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from itsdangerous import URLSafeSerializer
+
+class ServerUnavailable(Exception):
+    """Raised when the mail server cannot be reached or logged in to"""
+
+class SMTPPool:
+    """
+    Up to size connections from smtp_connect, each reused for at most
+    per_connection messages. send() is safe to call from several threads;
+    a thread holds one connection at a time.
+    """
+
+    def __init__(self, config, size=4, per_connection=100):
+        self.config = config
+        self.size = size
+        self.per_connection = per_connection
+        self.opened = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        from utils.email import smtp_connect
+        try:
+            server = smtp_connect(self.config)
+        except (smtplib.SMTPException, OSError) as e:
+            raise ServerUnavailable(str(e)) from e
+        with self._lock:
+            self.opened += 1
+        return [server, 0]
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    @staticmethod
+    def _close(entry):
+        try:
+            entry[0].quit()
+        except (smtplib.SMTPException, OSError):
+            entry[0].close()
+
+    def send(self, msg):
+        """
+        Send msg over a pooled connection. Refusals of the message raise the
+        SMTP error; a connection that cannot be (re)established raises
+        ServerUnavailable.
+        """
+        with self._slots:
+            self._send(msg)
+
+    def _send(self, msg):
+        entry = self._acquire()
+        try:
+            try:
+                entry[0].send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Dropped while idle or by a per-session limit; one fresh attempt
+                entry[0].close()
+                entry = self._connect()
+                entry[0].send_message(msg)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+            # The message was refused, the connection is still good
+            self._idle.put(entry)
+            raise
+        except (smtplib.SMTPException, OSError) as e:
+            entry[0].close()
+            raise ServerUnavailable(str(e)) from e
+
+        entry[1] += 1
+        if entry[1] >= self.per_connection:
+            self._close(entry)
+        else:
+            self._idle.put(entry)
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+def post_announcement(post, base_url):
+    """(subject, html body, text body) announcing a published post"""
+    title = html.unescape(post.title or '')
+    excerpt = html.unescape(post.excerpt or '')
+    link = f"{base_url.rstrip('/')}/blog/{post.slug}"
+    subject = f"New post: {title}"
+    body_html = f"""
+    <html>
+    <body>
+        <h2>{html.escape(title)}</h2>
+        {f'<p>{html.escape(excerpt)}</p>' if excerpt else ''}
+        <p><a href="{html.escape(link)}">Read the post</a></p>
+        <br>
+        <p>You are receiving this because you have a verified account on our blog.</p>
+    </body>
+    </html>
+    """
+    body_text = f"{title}\n\n{excerpt + chr(10) + chr(10) if excerpt else ''}Read the post: {link}\n\n" \
+                "You are receiving this because you have a verified account on our blog.\n"
+    return subject, body_html, body_text
+
+def _unsubscribe_serializer(config):
+    return URLSafeSerializer(config['SECRET_KEY'], salt='announcements-unsubscribe')
+
+def unsubscribe_url(config, user_id):
+    """Signed link that turns off announcements for a user"""
+    token = _unsubscribe_serializer(config).dumps(user_id)
+    return f"{config['BASE_URL'].rstrip('/')}/api/email/unsubscribe?token={token}"
+
+def unsubscribe_user_id(config, token):
+    """User id of an unsubscribe token; raises itsdangerous.BadSignature if it was not issued here"""
+    return int(_unsubscribe_serializer(config).loads(token))
+
+def with_unsubscribe(body_html, body_text, link):
+    """A campaign's bodies with a recipient's unsubscribe link added at the end"""
+    footer = f'<p><a href="{html.escape(link)}">Unsubscribe from new post emails</a></p>'
+    if '</body>' in body_html:
+        body_html = body_html.replace('</body>', f'    {footer}\n    </body>', 1)
+    else:
+        body_html += footer
+    if body_text:
+        body_text += f"Unsubscribe from new post emails: {link}\n"
+    return body_html, body_text
+
+def _recipients(after_id, limit):
+    """Next chunk of verified users after user id after_id, in id order"""
+    from __init__ import db
+    from models.user import User
+    from sqlalchemy import select
+    users = User.__table__
+    return db.session.execute(
+        select(users.c.id, users.c.email)
+        .where(users.c.id > after_id, users.c.email_verified.is_(True), users.c.email_announcements.is_(True))
+        .order_by(users.c.id)
+        .limit(limit)
+    ).all()
+
+def send_campaign(campaign, chunk_size=200, connections=4, per_connection=100, report=print):
+    """
+    Send campaign to the verified users it has not reached yet. Returns
+    True once every recipient is handled; False if the server became
+    unavailable, in which case the rest of that chunk went to the outbox
+    and progress is saved after it.
+    """
+    from __init__ import db
+    from utils.email import build_message, queue_email
+    from utils.outbox import email_outbox
+    config = current_app.config
+    pool = SMTPPool(config, size=connections, per_connection=per_connection)
+    handled_before = campaign.sent_count + campaign.failed_count + campaign.deferred_count
+    started = time.monotonic()
+    stopped = None
+    # Once the server is gone, the rest of the chunk is not attempted
+    unavailable = threading.Event()
+    # Read once: commits expire the campaign, and the sending threads have no app context
+    subject, campaign_html, campaign_text = campaign.subject, campaign.body_html, campaign.body_text
+
+    def message(recipient):
+        link = unsubscribe_url(config, recipient.id)
+        return (link, *with_unsubscribe(campaign_html, campaign_text, link))
+
+    def send(recipient):
+        if unavailable.is_set():
+            return 'unavailable', None
+        link, body_html, body_text = message(recipient)
+        msg = build_message(config['MAIL_FROM'], recipient.email, subject, body_html, body_text,
+                            headers={'List-Unsubscribe': f'<{link}>',
+                                     'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'})
+        try:
+            pool.send(msg)
+            return 'sent', None
+        except smtplib.SMTPRecipientsRefused as e:
+            temporary = any(code < 500 for code, _ in e.recipients.values())
+            return ('deferred' if temporary else 'failed'), e
+        except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+            return ('deferred' if e.smtp_code < 500 else 'failed'), e
+        except ServerUnavailable as e:
+            unavailable.set()
+            return 'unavailable', e
+
+    executor = ThreadPoolExecutor(max_workers=connections, thread_name_prefix='bulk-mail')
+    try:
+        while stopped is None:
+            chunk = _recipients(campaign.last_user_id, chunk_size)
+            if not chunk:
+                break
+            mark = time.monotonic()
+            # Results come back in recipient order, so the checkpoint never skips
+            # anyone. Each is committed as it arrives: an interrupted run only
+            # loses the outcomes of the sends still in flight.
+            for recipient, (outcome, error) in zip(chunk, executor.map(send, chunk)):
+                if outcome == 'sent':
+                    campaign.sent_count += 1
+                elif outcome == 'failed':
+                    campaign.failed_count += 1
+                    current_app.logger.warning(f"Campaign {campaign.id}: {recipient.email} refused: {error}")
+                else:
+                    if outcome == 'unavailable' and stopped is None:
+                        stopped = error
+                    # The outbox retries it with backoff
+                    _, body_html, body_text = message(recipient)
+                    queue_email(recipient.email, subject, body_html, body_text,
+                                kind='campaign', user_id=recipient.id)
+                    campaign.deferred_count += 1
+                campaign.last_user_id = recipient.id
+                now = time.monotonic()
+                campaign.elapsed += now - mark
+                mark = now
+                db.session.commit()
+
+            handled = campaign.sent_count + campaign.failed_count + campaign.deferred_count
+            rate = (handled - handled_before) / max(time.monotonic() - started, 1e-9)
+            report(f"Campaign {campaign.id}: {handled} handled ({campaign.sent_count} sent, "
+                   f"{campaign.deferred_count} deferred, {campaign.failed_count} failed), "
+                   f"up to user {campaign.last_user_id}, {rate:.1f} msgs/s")
+    finally:
+        # Sends not started yet are dropped rather than sent unrecorded
+        executor.shutdown(wait=True, cancel_futures=True)
+        pool.close()
+
+    if campaign.deferred_count:
+        email_outbox.notify()
+    if stopped is not None:
+        report(f"Campaign {campaign.id} paused, mail server unavailable: {stopped}")
+        return False
+
+    campaign.status = 'completed'
+    campaign.finished_at = datetime.utcnow()
+    db.session.commit()
+    handled = campaign.sent_count + campaign.failed_count + campaign.deferred_count - handled_before
+    elapsed = time.monotonic() - started
+    report(f"Campaign {campaign.id} completed: {handled} message(s) in {elapsed:.1f}s "
+           f"({handled / max(elapsed, 1e-9):.1f} msgs/s) over {pool.opened} connection(s)")
+    return True
@@ -0,0 +1,134 @@
+"""
+Tagged in-process caches (public responses, authenticated principals)
+
+Entries are held in a size-bounded LRU with a TTL and carry invalidation
+tags. Invalidating a tag drops matching local entries and touches a stamp
+file under the instance folder, so the other gunicorn workers see the
+change on their next lookup without any database round trip.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class TaggedCache:
+    """Tagged LRU/TTL cache configured from <PREFIX>_* settings"""
+
+    def __init__(self, name, config_prefix, max_entries=512, ttl=300, app=None):
+        self.name = name
+        self.config_prefix = config_prefix
+        self.enabled = True
+        self.max_entries = max_entries
+        self.default_ttl = ttl
+        self.stamp_dir = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        prefix = self.config_prefix
+        self.enabled = app.config.get(f'{prefix}_ENABLED', True)
+        self.max_entries = app.config.get(f'{prefix}_MAX_ENTRIES', self.max_entries)
+        self.default_ttl = app.config.get(f'{prefix}_TTL', self.default_ttl)
+        self.stamp_dir = app.config.get(f'{prefix}_STAMP_DIR') or \
+            os.path.join(app.instance_path, 'cache', self.name)
+        os.makedirs(self.stamp_dir, exist_ok=True)
+        # Entries were stamped against the previous app's directory
+        self._entries.clear()
+        app.extensions[f'{self.name}_cache'] = self
+
+    def _stamp_path(self, tag):
+        return os.path.join(self.stamp_dir, hashlib.sha1(tag.encode()).hexdigest())
+
+    def _stamp(self, tag):
+        try:
+            return os.stat(self._stamp_path(tag)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def get(self, key):
+        """Return the live cached value for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, stamps = entry
+                if expires_at > time.monotonic() and all(self._stamp(tag) == stamp for tag, stamp in stamps):
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+            self._stats['misses'] += 1
+        return None
+
+    def stamps(self, tags):
+        """Snapshot tag generations; take it before reading the data to be cached"""
+        return tuple((tag, self._stamp(tag)) for tag in tags)
+
+    def set(self, key, value, stamps, ttl=None):
+        """Store value under key, tied to the tag generations in stamps"""
+        ttl = self.default_ttl if ttl is None else ttl
+        if not self.enabled or ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl, stamps)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get_or_set(self, key, build, tags, ttl=None):
+        """Return the cached value for key, calling build() to fill it on a miss"""
+        value = self.get(key)
+        if value is None:
+            # Read stamps before building so a concurrent invalidation is never masked
+            stamps = self.stamps(tags)
+            value = build()
+            self.set(key, value, stamps, ttl=ttl)
+        return value
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying one of the tags, in all workers"""
+        tags = set(tag for tag in tags if tag)
+        for tag in tags:
+            path = self._stamp_path(tag)
+            with open(path, 'a'):
+                pass
+            os.utime(path, ns=(time.time_ns(), time.time_ns()))
+
+        with self._lock:
+            stale = [key for key, (_, _, stamps) in self._entries.items()
+                     if any(tag in tags for tag, _ in stamps)]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                hit_ratio=round(self._stats['hits'] / lookups, 4) if lookups else 0.0
+            )
+
+response_cache = TaggedCache('response', 'RESPONSE_CACHE')
+
+def post_tag(slug):
+    """Invalidation tag for a single post's detail response"""
+    return f'post:{slug}'
+
+def post_views_tag(slug):
+    """Invalidation tag for the stored view count in a post's detail response"""
+    return f'post-views:{slug}'
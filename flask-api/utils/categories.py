@@ -0,0 +1,84 @@
+"""
+Post <-> category linking and denormalized category post counts
+"""
+from sqlalchemy import func, or_, select, update
+from utils.slug import allocate_slug, slugify
+
+class UnknownCategory(ValueError):
+    """Raised when a post names a category that does not exist"""
+
+def _matches(model, value):
+    # The exact name, or any spelling with the same slug ('TECH', 'tech' and
+    # 'Tech' all match category Tech); both sides are index lookups
+    return or_(model.name == value, model.slug == slugify(value))
+
+def category_lookup(value):
+    """Scalar subquery for the id of the category named value (name or slug, any case)"""
+    from __init__ import db
+    from shared_models import get_blog_category
+    BlogCategory = get_blog_category()
+    return db.session.query(BlogCategory.id)\
+        .filter(_matches(BlogCategory, value))\
+        .limit(1).scalar_subquery()
+
+def resolve_category(name, known=None, create=False):
+    """
+    Return the BlogCategory for a post's category name, matched by name or
+    slug in any case.
+
+    Empty names resolve to None. An unknown name raises UnknownCategory, or
+    creates the category with create (only migrations do). known is an
+    optional name -> category dict reused across calls by batch jobs.
+    """
+    from __init__ import db
+    from shared_models import get_blog_category
+    BlogCategory = get_blog_category()
+
+    name = (name or '').strip()
+    if not name:
+        return None
+    if known is not None and name in known:
+        return known[name]
+
+    # Callers may hold pending changes whose conflicts they handle at commit
+    with db.session.no_autoflush:
+        category = BlogCategory.query.filter(_matches(BlogCategory, name)).first()
+        if category is None:
+            if not create:
+                raise UnknownCategory(f"Unknown category: {name}")
+            category = BlogCategory(name=name, slug=allocate_slug(BlogCategory, name))
+            db.session.add(category)
+
+    if known is not None:
+        known[name] = category
+    return category
+
+def link_post_category(post, name, known=None, create=False):
+    """Point post at the category called name; the category text follows the row's name"""
+    category = resolve_category(name, known=known, create=create)
+    post.category_row = category
+    post.category = category.name if category else None
+    return category
+
+def refresh_category_counts(category_ids=None):
+    """
+    Recount the published posts of the given categories (every category if None).
+
+    Each count is a range lookup on the (category_id, status) index. The
+    caller commits.
+    """
+    from __init__ import db
+    from shared_models import get_blog_post, get_blog_category
+    categories = get_blog_category().__table__
+    posts = get_blog_post().__table__
+
+    count = select(func.count(posts.c.id))\
+        .where(posts.c.category_id == categories.c.id, posts.c.status == 'published')\
+        .scalar_subquery()
+    stmt = update(categories).values(post_count=count)
+    if category_ids is not None:
+        category_ids = [category_id for category_id in category_ids if category_id is not None]
+        if not category_ids:
+            return
+        stmt = stmt.where(categories.c.id.in_(category_ids))
+    db.session.execute(stmt)
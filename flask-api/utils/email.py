@@ -1,22 +1,20 @@
 """
 Email utilities for sending verification emails
+
+Emails are queued in the outbox (queue_email) and delivered by the
+background sender in utils/outbox.py, or by utils/bulk_mail.py, both over
+smtp_connect() connections configured by the SMTP_* and MAIL_FROM settings.
 """
 import smtplib
 import os
-import uuid
-from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.utils import formatdate, make_msgid
+from email.utils import formatdate, make_msgid, parseaddr
 from flask import current_app
 
-def send_verification_email(user_email, user_name, verification_token):
-    """
-    Send email verification email to user using local SMTP server
-    """
-    
-    # Get base URL from environment or use default
-    base_url = os.getenv('BASE_URL', 'https://isodigm.ca')
+def verification_email(user_name, verification_token, base_url=None):
+    """(subject, html body, text body) of the email verification message"""
+    base_url = (base_url or os.getenv('BASE_URL', 'https://isodigm.ca')).rstrip('/')
     verification_link = f"{base_url}/verify-email?token={verification_token}"
     
     # Email content
@@ -55,130 +53,63 @@ def send_verification_email(user_email, user_name, verification_token):
     Best regards,
     Blog CMS Team
     """
-    
-    try:
-        # Try to send via local SMTP first
-        send_email_smtp_local(user_email, subject, body_html, body_text)
-        if current_app:
-            current_app.logger.info(f"Verification email sent to {user_email} via local SMTP")
-        return True
-    except Exception as e:
-        # Fallback to logging if SMTP fails
-        if current_app:
-            current_app.logger.error(f"Failed to send email via SMTP: {str(e)}")
-            current_app.logger.info(f"Verification link for {user_email}: {verification_link}")
-        
-        print(f"""
-        ========================================
-        EMAIL VERIFICATION REQUIRED
-        ========================================
-        To: {user_email}
-        Name: {user_name}
-        
-        Please click the following link to verify your email address:
-        {verification_link}
-        
-        This link will expire in 24 hours.
-        
-        If you did not create an account, please ignore this email.
-        ========================================
-        """)
-        return True
+    return subject, body_html, body_text
 
-def send_email_smtp_local(to_email, subject, body_html, body_text=None):
+def queue_email(to_email, subject, body_html, body_text=None, kind='generic', user=None, user_id=None):
     """
-    Send email via local Postfix SMTP server with proper RFC 5322 headers
+    Add an email to the outbox in the current transaction; it is sent once
+    the caller commits and wakes the sender with email_outbox.notify().
     """
-    
-    smtp_server = 'host.docker.internal'
-    smtp_port = 25
-    from_email = 'Blog CMS <noreply@isodigm.ca>'
-    
-    # Create message with proper headers
+    from __init__ import db
+    from models.outbox import EmailMessage
+    sender_domain = parseaddr(current_app.config['MAIL_FROM'])[1].rpartition('@')[2] or None
+    message = EmailMessage(
+        kind=kind,
+        user_id=user_id,
+        to_email=to_email,
+        subject=subject,
+        body_html=body_html,
+        body_text=body_text,
+        message_id=make_msgid(domain=sender_domain)
+    )
+    if user is not None:
+        message.user = user
+    db.session.add(message)
+    return message
+
+def queue_verification_email(user, verification_token):
+    """Queue the verification email of a user in the current transaction"""
+    subject, body_html, body_text = verification_email(
+        f"{user.firstname} {user.lastname}", verification_token, current_app.config.get('BASE_URL'))
+    return queue_email(user.email, subject, body_html, body_text, kind='verification', user=user)
+
+def build_message(from_email, to_email, subject, body_html, body_text=None, message_id=None, headers=None):
+    """Multipart text/HTML message with proper RFC 5322 headers, plus any extra headers"""
     msg = MIMEMultipart('alternative')
     msg['Subject'] = subject
     msg['From'] = from_email
     msg['To'] = to_email
     msg['Date'] = formatdate(localtime=True)
-    msg['Message-ID'] = make_msgid(domain='isodigm.ca')
+    msg['Message-ID'] = message_id or make_msgid(domain=parseaddr(from_email)[1].rpartition('@')[2] or None)
     msg['X-Mailer'] = 'Blog CMS 1.0'
-    msg['MIME-Version'] = '1.0'
-    
-    # Add Reply-To header
     msg['Reply-To'] = from_email
+    for name, value in (headers or {}).items():
+        msg[name] = value
     
-    # Add text and HTML parts
     if body_text:
-        text_part = MIMEText(body_text, 'plain', 'utf-8')
-        text_part['Content-Type'] = 'text/plain; charset=utf-8'
-        msg.attach(text_part)
-    
-    html_part = MIMEText(body_html, 'html', 'utf-8')
-    html_part['Content-Type'] = 'text/html; charset=utf-8'
-    msg.attach(html_part)
-    
-    # Send email via local Postfix
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        # Enable debugging for troubleshooting
-        # server.set_debuglevel(1)
-        
-        # Send the message
-        result = server.send_message(msg)
-        server.quit()
-        
-        if current_app:
-            current_app.logger.info(f"Email sent successfully to {to_email}")
-            
-        return True
-    except Exception as e:
-        if current_app:
-            current_app.logger.error(f"Failed to send email to {to_email} via local SMTP: {str(e)}")
-        raise e
+        msg.attach(MIMEText(body_text, 'plain', 'utf-8'))
+    msg.attach(MIMEText(body_html, 'html', 'utf-8'))
+    return msg
 
-def send_email_smtp(to_email, subject, body_html, body_text=None):
-    """
-    Send email via SMTP (for production use)
-    Configure these environment variables:
-    - SMTP_SERVER
-    - SMTP_PORT
-    - SMTP_USERNAME
-    - SMTP_PASSWORD
-    - FROM_EMAIL
-    """
-    
-    smtp_server = os.getenv('SMTP_SERVER')
-    smtp_port = int(os.getenv('SMTP_PORT', 587))
-    smtp_username = os.getenv('SMTP_USERNAME')
-    smtp_password = os.getenv('SMTP_PASSWORD')
-    from_email = os.getenv('FROM_EMAIL', smtp_username)
-    
-    if not all([smtp_server, smtp_username, smtp_password]):
-        raise ValueError("SMTP configuration incomplete. Please set SMTP_SERVER, SMTP_USERNAME, and SMTP_PASSWORD environment variables.")
-    
-    # Create message
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = from_email
-    msg['To'] = to_email
-    
-    # Add text and HTML parts
-    if body_text:
-        text_part = MIMEText(body_text, 'plain')
-        msg.attach(text_part)
-    
-    html_part = MIMEText(body_html, 'html')
-    msg.attach(html_part)
-    
-    # Send email
+def smtp_connect(config):
+    """Open an SMTP connection with the app's SMTP_* settings, logged in if configured"""
+    server = smtplib.SMTP(config['SMTP_SERVER'], config['SMTP_PORT'], timeout=config.get('SMTP_TIMEOUT', 10))
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except Exception as e:
-        if current_app:
-            current_app.logger.error(f"Failed to send email to {to_email}: {str(e)}")
-        raise e
\ No newline at end of file
+        if config.get('SMTP_STARTTLS'):
+            server.starttls()
+        if config.get('SMTP_USERNAME'):
+            server.login(config['SMTP_USERNAME'], config['SMTP_PASSWORD'])
+    except BaseException:
+        server.close()
+        raise
+    return server
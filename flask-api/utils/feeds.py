@@ -0,0 +1,208 @@
+"""
+RSS/Atom feeds and XML sitemaps of published posts
+
+Documents are streamed to files under instance/feeds as rows arrive, never
+held whole in memory, and the encoded file is reused until the published
+post set changes. The file name carries the fingerprint of the post set it
+was built from, so every worker agrees on which file is current and a stale
+one is never served.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from email.utils import format_datetime
+from xml.sax.saxutils import escape, quoteattr
+from flask import current_app
+from sqlalchemy import select
+from utils.http_cache import as_utc
+
+SITEMAP_PAGE_SIZE = 50000  # URL limit of the sitemap protocol
+FETCH_SIZE = 1000
+
+def feed_dir():
+    path = current_app.config.get('FEED_DIR') or os.path.join(current_app.instance_path, 'feeds')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def site_info():
+    """Base URL and site name the documents link to"""
+    from shared_models import get_setting
+    setting = get_setting().query.filter_by(key='site_name').first()
+    return current_app.config.get('BASE_URL', '').rstrip('/'), setting.value if setting else 'Blog CMS'
+
+def published_fingerprint():
+    """
+    (etag, last_modified, count) of the published post set.
+
+    The etag hashes every post column and site setting the documents are
+    written from, so it changes with any edit that changes a document, even
+    one within the same second as the newest updated_at.
+    """
+    digest = hashlib.sha256()
+    base_url, site_name = site_info()
+    digest.update(repr((base_url, site_name, current_app.config.get('FEED_ITEM_LIMIT'))).encode())
+    count = 0
+    last_modified = None
+    rows = _post_rows(lambda posts, users: (posts.c.id, posts.c.slug, posts.c.title, posts.c.excerpt,
+                                            posts.c.category, posts.c.published_at, posts.c.updated_at,
+                                            users.c.username),
+                      with_author=True)
+    for row in rows:
+        digest.update(repr(tuple(row)).encode())
+        count += 1
+        if row.updated_at and (last_modified is None or row.updated_at > last_modified):
+            last_modified = row.updated_at
+    return digest.hexdigest()[:32], last_modified, count
+
+def document_path(name, etag, write):
+    """
+    Return the file holding document name for fingerprint etag, building it
+    with write(out) if it does not exist yet.
+
+    The document is written to a temporary file and renamed into place, so
+    readers only ever see complete files; older versions are removed.
+    """
+    directory = feed_dir()
+    stem, ext = os.path.splitext(name)
+    path = os.path.join(directory, f'{stem}-{etag}{ext}')
+    if os.path.exists(path):
+        return path
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{stem}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            write(out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    version = re.compile(rf'{re.escape(stem)}-[0-9a-f]+{re.escape(ext)}')
+    for old in os.listdir(directory):
+        if version.fullmatch(old) and os.path.join(directory, old) != path:
+            try:
+                os.remove(os.path.join(directory, old))
+            except FileNotFoundError:
+                pass
+    return path
+
+def _post_rows(columns, limit=None, offset=None, newest_first=True, with_author=False):
+    """
+    Stream published posts in published order, FETCH_SIZE rows at a time.
+    
+    columns(posts, users) picks the columns; users is only joined with_author.
+    """
+    from __init__ import db
+    from models.user import User
+    from shared_models import get_blog_post
+    posts = get_blog_post().__table__
+    users = User.__table__
+    order = (posts.c.published_at.desc(), posts.c.id.desc()) if newest_first \
+        else (posts.c.published_at, posts.c.id)
+    query = select(*columns(posts, users)).where(posts.c.status == 'published').order_by(*order)
+    if with_author:
+        query = query.select_from(posts.outerjoin(users, users.c.id == posts.c.author_id))
+    if limit is not None:
+        query = query.limit(limit)
+    if offset:
+        query = query.offset(offset)
+    return db.session.execute(query.execution_options(yield_per=FETCH_SIZE))
+
+def _post_url(base_url, slug):
+    return f'{base_url}/blog/{slug}'
+
+def _iso(value):
+    value = as_utc(value)
+    return value.isoformat().replace('+00:00', 'Z') if value else None
+
+def write_rss(out, last_modified):
+    """RSS 2.0 document of the newest posts"""
+    base_url, site_name = site_info()
+    limit = current_app.config.get('FEED_ITEM_LIMIT', 50)
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    out.write('<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>')
+    out.write(f'<title>{escape(site_name)}</title><link>{escape(base_url)}/</link>')
+    out.write(f'<description>{escape(site_name)}</description>')
+    out.write(f'<atom:link href={quoteattr(base_url + "/api/blog/feed.xml")} rel="self" type="application/rss+xml"/>')
+    if last_modified:
+        out.write(f'<lastBuildDate>{format_datetime(as_utc(last_modified))}</lastBuildDate>')
+
+    rows = _post_rows(lambda posts, users: (posts.c.title, posts.c.slug, posts.c.excerpt, posts.c.category,
+                                            posts.c.published_at, posts.c.updated_at), limit=limit)
+    for row in rows:
+        url = escape(_post_url(base_url, row.slug))
+        out.write(f'<item><title>{escape(row.title)}</title><link>{url}</link>')
+        out.write(f'<guid isPermaLink="true">{url}</guid>')
+        if row.excerpt:
+            out.write(f'<description>{escape(row.excerpt)}</description>')
+        if row.category:
+            out.write(f'<category>{escape(row.category)}</category>')
+        published = as_utc(row.published_at or row.updated_at)
+        if published:
+            out.write(f'<pubDate>{format_datetime(published)}</pubDate>')
+        out.write('</item>')
+    out.write('</channel></rss>\n')
+
+def write_atom(out, last_modified):
+    """Atom 1.0 document of the newest posts"""
+    base_url, site_name = site_info()
+    limit = current_app.config.get('FEED_ITEM_LIMIT', 50)
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    out.write('<feed xmlns="http://www.w3.org/2005/Atom">')
+    out.write(f'<title>{escape(site_name)}</title><id>{escape(base_url)}/</id>')
+    out.write(f'<link href={quoteattr(base_url + "/")}/>')
+    out.write(f'<link rel="self" href={quoteattr(base_url + "/api/blog/atom.xml")}/>')
+    out.write(f'<updated>{_iso(last_modified) or "1970-01-01T00:00:00Z"}</updated>')
+
+    rows = _post_rows(lambda posts, users: (posts.c.title, posts.c.slug, posts.c.excerpt, posts.c.published_at,
+                                            posts.c.updated_at, users.c.username),
+                      limit=limit, with_author=True)
+    for row in rows:
+        url = _post_url(base_url, row.slug)
+        out.write(f'<entry><title>{escape(row.title)}</title><id>{escape(url)}</id>')
+        out.write(f'<link href={quoteattr(url)}/>')
+        out.write(f'<author><name>{escape(row.username or "Unknown")}</name></author>')
+        out.write(f'<updated>{_iso(row.updated_at or row.published_at)}</updated>')
+        if row.published_at:
+            out.write(f'<published>{_iso(row.published_at)}</published>')
+        if row.excerpt:
+            out.write(f'<summary>{escape(row.excerpt)}</summary>')
+        out.write('</entry>')
+    out.write('</feed>\n')
+
+def sitemap_pages(count):
+    """Number of sitemap files needed for count posts (0 means a single urlset)"""
+    return 0 if count <= SITEMAP_PAGE_SIZE else -(-count // SITEMAP_PAGE_SIZE)
+
+def write_sitemap(out, page=None):
+    """Sitemap urlset: the blog index plus every post, or one SITEMAP_PAGE_SIZE page of posts"""
+    base_url, _ = site_info()
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    out.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+    if not page:
+        out.write(f'<url><loc>{escape(base_url)}/</loc></url>')
+
+    offset = (page - 1) * SITEMAP_PAGE_SIZE if page else None
+    limit = SITEMAP_PAGE_SIZE if page else None
+    rows = _post_rows(lambda posts, users: (posts.c.slug, posts.c.updated_at, posts.c.published_at),
+                      limit=limit, offset=offset, newest_first=False)
+    for row in rows:
+        out.write(f'<url><loc>{escape(_post_url(base_url, row.slug))}</loc>')
+        modified = _iso(row.updated_at or row.published_at)
+        if modified:
+            out.write(f'<lastmod>{modified}</lastmod>')
+        out.write('</url>')
+    out.write('</urlset>\n')
+
+def write_sitemap_index(out, pages, last_modified):
+    """Sitemap index pointing at the numbered sitemap pages"""
+    base_url, _ = site_info()
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    out.write('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+    for page in range(1, pages + 1):
+        out.write(f'<sitemap><loc>{escape(base_url)}/api/blog/sitemap-{page}.xml</loc>')
+        if last_modified:
+            out.write(f'<lastmod>{_iso(last_modified)}</lastmod>')
+        out.write('</sitemap>')
+    out.write('</sitemapindex>\n')
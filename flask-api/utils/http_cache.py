@@ -0,0 +1,57 @@
+"""
+HTTP conditional request helpers (ETag / Last-Modified / 304)
+"""
+import hashlib
+from datetime import datetime, timezone
+from flask import current_app, request
+
+def make_etag(*parts):
+    """Build a strong ETag value from the parts that identify a representation"""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+def body_etag(body):
+    """Strong ETag for an already encoded response body"""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+def as_utc(value):
+    """Treat naive database timestamps as UTC and drop sub-second precision"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+def is_not_modified(etag, last_modified=None):
+    """Check the request's validators; If-None-Match wins over If-Modified-Since"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return bool(etag) and request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since:
+        return as_utc(last_modified) <= request.if_modified_since
+    return False
+
+def set_validators(response, etag=None, last_modified=None):
+    """
+    Attach ETag and Last-Modified headers to a response. Last-Modified is
+    left out while it is still the current second: HTTP dates have no finer
+    resolution, so a later change within that second would carry the same
+    date and If-Modified-Since could not see it.
+    """
+    if etag:
+        response.set_etag(etag)
+    if last_modified is not None and as_utc(last_modified) < as_utc(datetime.now(timezone.utc)):
+        response.last_modified = as_utc(last_modified)
+    return response
+
+def not_modified(etag=None, last_modified=None):
+    """Build an empty 304 response carrying the current validators"""
+    return set_validators(current_app.response_class(status=304), etag, last_modified)
+
+def apply_cache_control(response):
+    """Set the Cache-Control configured for the current endpoint, if any"""
+    policies = current_app.config.get('CACHE_CONTROL', {})
+    policy = policies.get(request.endpoint)
+    if policy and response.status_code in (200, 304) and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = policy
+    return response
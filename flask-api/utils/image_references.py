@@ -0,0 +1,51 @@
+"""
+Post -> uploaded image references
+
+A post references every upload its content or featured image links to,
+including the resized copies of one. An image is only deleted once no post
+references it.
+"""
+import re
+from sqlalchemy import and_, or_, select
+
+# /api/uploads/images/<stem>.<ext>, or a <stem>-<width>w.<ext> copy of it
+IMAGE_URL_RE = re.compile(r'/api/uploads/images/([0-9a-f]{64}|[0-9a-f]{32})(?:-\d+w)?\.(?:png|jpe?g|gif|webp)\b')
+
+def referenced_stems(*texts):
+    """File name stems of the uploaded images linked from texts"""
+    stems = set()
+    for text in texts:
+        if text:
+            stems.update(IMAGE_URL_RE.findall(text))
+    return stems
+
+def resolve_images(stems):
+    """ImageUpload rows named <stem>.<ext>, one range scan of the filename index per stem"""
+    from __init__ import db
+    from shared_models import get_image_upload
+    ImageUpload = get_image_upload()
+    if not stems:
+        return []
+    # '/' sorts right after '.', so each range is exactly "<stem>.*"
+    with db.session.no_autoflush:
+        return ImageUpload.query.filter(or_(*(
+            and_(ImageUpload.filename > f'{stem}.', ImageUpload.filename < f'{stem}/') for stem in sorted(stems)
+        ))).all()
+
+def sync_post_images(post):
+    """Point post's image references at the uploads its content and featured image link to"""
+    post.image_rows = resolve_images(referenced_stems(post.content, post.featured_image))
+    return post.image_rows
+
+def image_referrers(image_id):
+    """(id, title) of the posts referencing an upload"""
+    from __init__ import db
+    from shared_models import get_blog_post, get_image_references
+    posts = get_blog_post().__table__
+    references = get_image_references()
+    return db.session.execute(
+        select(posts.c.id, posts.c.title)
+        .select_from(references.join(posts, posts.c.id == references.c.post_id))
+        .where(references.c.image_id == image_id)
+        .order_by(posts.c.id)
+    ).all()
@@ -0,0 +1,392 @@
+"""
+Uploaded image storage and background optimization
+
+An upload is stored as-is under uploads/originals and acknowledged right
+away; resizing and re-encoding run in a small process pool so CPU-heavy
+Pillow work never holds a request worker. The optimized file lands under
+uploads/images with the same name, and until it exists the original is
+served in its place. Smaller JPEG and WebP copies for srcset are written
+next to it as <name>-<width>w.<jpg|webp>.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from PIL import Image
+from sqlalchemy import update
+
+# File extension and Pillow encoder options of each variant format
+VARIANT_FORMATS = {
+    'jpeg': ('jpg', {'format': 'JPEG', 'optimize': True}),
+    'webp': ('webp', {'format': 'WEBP', 'method': 4}),
+}
+VARIANT_RE = re.compile(r'^[\w.]+-\d+w\.(?:jpg|webp)$')
+
+# Pillow formats accepted as uploads, whatever the file extension claims,
+# and the extension stored uploads get
+UPLOAD_FORMATS = {'PNG': 'png', 'JPEG': 'jpg', 'GIF': 'gif', 'WEBP': 'webp'}
+CHUNK_SIZE = 64 * 1024
+
+class ImageQueueFull(Exception):
+    """Raised when this worker already has its maximum of images waiting"""
+
+class UploadTooLarge(Exception):
+    """Raised when an upload passes the size limit while it is being stored"""
+
+class InvalidImage(Exception):
+    """Raised when an upload is not an acceptable image"""
+
+def save_upload(stream, directory, max_size):
+    """
+    Copy an uploaded file stream to a temp file in directory in CHUNK_SIZE
+    pieces, hashing it on the way, never holding it whole in memory; raises
+    UploadTooLarge as soon as more than max_size bytes arrive.
+
+    Returns (temp path, bytes, SHA-256 hex digest); the caller renames the
+    file into place or removes it.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        size = 0
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+        os.chmod(tmp_path, 0o644)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+def file_digest(path):
+    """SHA-256 hex digest of a stored file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def inspect_image(path, max_pixels):
+    """
+    Check a stored upload from its header alone: it must be an image in
+    UPLOAD_FORMATS of at most max_pixels pixels, so a small file that would
+    decode to gigabytes (a decompression bomb) is refused before any decode.
+    Returns (format, width, height).
+    """
+    try:
+        with Image.open(path) as img:
+            fmt, (width, height) = img.format, img.size
+    except Image.DecompressionBombError:
+        raise InvalidImage('Image dimensions are too large')
+    except Exception:
+        raise InvalidImage('File is not a valid image')
+    if fmt not in UPLOAD_FORMATS:
+        raise InvalidImage('Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WebP')
+    if width * height > max_pixels:
+        raise InvalidImage(f'Image dimensions are too large. Maximum is {max_pixels:,} pixels')
+    return fmt, width, height
+
+def upload_dirs():
+    """(originals, optimized) directories, created if missing"""
+    root = os.path.join(current_app.instance_path, 'uploads')
+    originals = os.path.join(root, 'originals')
+    optimized = os.path.join(root, 'images')
+    os.makedirs(originals, exist_ok=True)
+    os.makedirs(optimized, exist_ok=True)
+    return originals, optimized
+
+def variant_filename(filename, width, fmt):
+    """Name of the fmt copy of an upload scaled to width"""
+    return f"{os.path.splitext(filename)[0]}-{width}w.{VARIANT_FORMATS[fmt][0]}"
+
+def save_image(img, target, **options):
+    """Encode img to target through a temp file; returns the bytes written"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            img.save(out, **options)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return os.path.getsize(target)
+
+def optimize_image(source, target, max_width=1200, max_height=800, quality=85,
+                   widths=(), formats=('jpeg', 'webp'), max_pixels=None):
+    """
+    Resize source to fit max_width x max_height and write it to target as an
+    optimized JPEG, plus a copy per format at that size and at every width in
+    widths below it. Runs in a pool process, so it only touches files.
+
+    Returns {'width', 'height', 'size', 'variants': [...]} describing the result.
+    """
+    if max_pixels:
+        # Pillow refuses to decode anything past twice this
+        Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(source) as img:
+        if max_pixels and img.width * img.height > max_pixels:
+            raise InvalidImage('Image dimensions are too large')
+        img.load()
+        width, height = img.size
+        if width > max_width or height > max_height:
+            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+        # JPEG has no alpha or palette; WebP keeps transparency
+        opaque = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+        result = {
+            'width': img.width,
+            'height': img.height,
+            'size': save_image(opaque, target, format='JPEG', quality=quality, optimize=True),
+            'variants': []
+        }
+
+        directory = os.path.dirname(target)
+        filename = os.path.basename(target)
+        scaled = img
+        # The full size is a variant too, except in JPEG where target is that copy
+        sizes = {width for width in widths if width < img.width} | {img.width}
+        for variant_width in sorted(sizes, reverse=True):
+            variant_height = max(1, round(img.height * variant_width / img.width))
+            if variant_width < scaled.width:
+                # Scale down from the previous (next larger) size: cheaper, same quality
+                scaled = scaled.resize((variant_width, variant_height), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                if fmt == 'jpeg' and variant_width == img.width:
+                    continue
+                _, options = VARIANT_FORMATS[fmt]
+                encoded = scaled if fmt == 'webp' or scaled.mode in ('RGB', 'L') else scaled.convert('RGB')
+                name = variant_filename(filename, variant_width, fmt)
+                size = save_image(encoded, os.path.join(directory, name), quality=quality, **options)
+                result['variants'].append({'filename': name, 'format': fmt, 'width': variant_width,
+                                           'height': variant_height, 'size': size})
+        return result
+
+class ImageProcessor:
+    """
+    Per-worker queue of images to optimize, backed by a bounded process pool.
+
+    Job state lives in image_uploads, so any worker can report it; a job
+    left processing by a worker that exited is requeued when polled.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 2
+        self.queue_limit = 16
+        self.stale_after = 600
+        self.max_attempts = 3
+        self._pool = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        # Without background workers images are optimized inline
+        self.workers = app.config.get('IMAGE_WORKERS', 2) if app.config.get('BACKGROUND_WORKERS') else 0
+        self.queue_limit = app.config.get('IMAGE_QUEUE_LIMIT', 16)
+        self.stale_after = app.config.get('IMAGE_PROCESS_TIMEOUT', 600)
+        self._slots = threading.BoundedSemaphore(max(self.queue_limit, 1))
+        app.extensions['image_processor'] = self
+
+    def _executor(self):
+        # Created on first use, i.e. after gunicorn forked this worker. Children
+        # come from a forkserver rather than a fork of this multi-threaded worker
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('forkserver'))
+            return self._pool
+
+    def _discard(self, pool):
+        """Drop a pool broken by a dead child (e.g. OOM-killed) so the next use builds a new one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _submit(self, fn, *args):
+        """Submit to the pool, rebuilding it and retrying once if it is broken"""
+        pool = self._executor()
+        try:
+            return pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            return self._executor().submit(fn, *args)
+
+    def reserve(self):
+        """Claim a queue slot before storing an upload; raises ImageQueueFull"""
+        if not self._slots.acquire(blocking=False):
+            raise ImageQueueFull()
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, upload):
+        """
+        Queue an ImageUpload for optimization; the caller holds a slot from
+        reserve() and has committed the row. Without workers (IMAGE_WORKERS=0)
+        the image is processed before returning.
+        """
+        originals, optimized = upload_dirs()
+        config = self.app.config
+        args = (os.path.join(originals, upload.filename), os.path.join(optimized, upload.filename),
+                config.get('IMAGE_MAX_WIDTH', 1200), config.get('IMAGE_MAX_HEIGHT', 800),
+                config.get('IMAGE_QUALITY', 85), tuple(config.get('IMAGE_VARIANT_WIDTHS', ())),
+                tuple(config.get('IMAGE_VARIANT_FORMATS', ('jpeg', 'webp'))), config.get('IMAGE_MAX_PIXELS'))
+        upload_id = upload.id
+
+        if self.workers <= 0:
+            try:
+                result, error = optimize_image(*args), None
+            except Exception as e:
+                result, error = None, e
+            self._finish(upload_id, result, error)
+            return
+
+        try:
+            future = self._submit(optimize_image, *args)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda done: self._finish(upload_id, *self._outcome(done)))
+
+    @staticmethod
+    def _outcome(future):
+        try:
+            return future.result(), None
+        except Exception as e:
+            return None, e
+
+    def _finish(self, upload_id, result, error):
+        """Record a job's outcome; runs on the pool's result thread"""
+        try:
+            if has_app_context():
+                self._record(upload_id, result, error)
+            else:
+                with self.app.app_context():
+                    self._record(upload_id, result, error)
+        finally:
+            self.release()
+
+    def _record(self, upload_id, result, error):
+        from __init__ import db
+        from shared_models import get_image_upload
+        uploads = get_image_upload().__table__
+        if error is None:
+            values = {'status': 'ready', 'error': None, 'width': result['width'], 'height': result['height'],
+                      'size': result['size'], 'variants': json.dumps(result['variants'])}
+        else:
+            values = {'status': 'failed', 'error': str(error)}
+            current_app.logger.error(f"Error optimizing image {upload_id}: {str(error)}")
+        values['processed_at'] = datetime.now()
+
+        try:
+            db.session.execute(update(uploads).where(uploads.c.id == upload_id).values(**values))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to record image {upload_id} status: {str(e)}")
+
+    def retry(self, upload):
+        """
+        Queue a failed upload again with fresh attempts, e.g. when its bytes
+        are uploaded once more; the caller holds a slot from reserve().
+        Returns whether this call claimed it.
+        """
+        from __init__ import db
+        from shared_models import get_image_upload
+        uploads = get_image_upload().__table__
+        claimed = db.session.execute(
+            update(uploads)
+            .where(uploads.c.id == upload.id, uploads.c.status == 'failed')
+            .values(status='processing', error=None, attempts=0, queued_at=datetime.now(), processed_at=None)
+        ).rowcount
+        db.session.commit()
+        db.session.refresh(upload)
+        if claimed:
+            self.submit(upload)
+        return bool(claimed)
+
+    def requeue_if_stale(self, upload):
+        """
+        Requeue an upload still processing after IMAGE_PROCESS_TIMEOUT, whose
+        worker presumably exited; gives up after max_attempts. Returns
+        whether the row changed.
+        """
+        from __init__ import db
+        from shared_models import get_image_upload
+        uploads = get_image_upload().__table__
+        if upload.status != 'processing' or upload.queued_at is None:
+            return False
+        if upload.queued_at > datetime.now() - timedelta(seconds=self.stale_after):
+            return False
+
+        giving_up = upload.attempts + 1 >= self.max_attempts
+        values = {'status': 'failed', 'error': 'Processing did not finish'} if giving_up \
+            else {'queued_at': datetime.now(), 'attempts': uploads.c.attempts + 1}
+        # Only one poller wins the claim
+        claimed = db.session.execute(
+            update(uploads)
+            .where(uploads.c.id == upload.id, uploads.c.status == 'processing',
+                   uploads.c.queued_at == upload.queued_at)
+            .values(**values)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return False
+
+        db.session.refresh(upload)
+        if not giving_up:
+            try:
+                self.reserve()
+            except ImageQueueFull:
+                return True
+            self.submit(upload)
+        return True
+
+image_processor = ImageProcessor()
+
+def image_manifest(upload):
+    """
+    srcset-ready description of an upload: every stored size per format,
+    smallest first, with the optimized image as the largest JPEG.
+    """
+    base = '/api/uploads/images/'
+    variants = json.loads(upload.variants) if upload.variants else []
+    sources = []
+    if upload.status == 'ready':
+        sources = [{'url': base + variant['filename'], 'format': variant['format'], 'width': variant['width'],
+                    'height': variant['height'], 'size': variant['size']} for variant in variants]
+        sources.append({'url': base + upload.filename, 'format': 'jpeg', 'width': upload.width,
+                        'height': upload.height, 'size': upload.size})
+    sources.sort(key=lambda source: (source['format'], source['width']))
+
+    srcset = {}
+    for source in sources:
+        srcset.setdefault(source['format'], []).append(f"{source['url']} {source['width']}w")
+    return {
+        'filename': upload.filename,
+        'image_url': base + upload.filename,
+        'status': upload.status,
+        'width': upload.width,
+        'height': upload.height,
+        'variants': sources,
+        'srcset': {fmt: ', '.join(entries) for fmt, entries in srcset.items()}
+    }
@@ -0,0 +1,182 @@
+"""
+Background delivery of the email outbox
+
+Requests only add rows to email_outbox, in the same transaction as the
+change the email is about, so registering never waits on the mail server.
+A thread in each worker delivers due messages over one SMTP connection it
+keeps open between batches; a file lock makes sure only one worker sends
+at a time. Failed sends are retried with exponential backoff until
+EMAIL_MAX_ATTEMPTS; a permanent (5xx) refusal fails the message at once.
+"""
+import atexit
+import fcntl
+import os
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+
+class EmailOutbox:
+    """Per-process sender of due email_outbox rows"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 5
+        self.batch_size = 50
+        self.max_attempts = 8
+        self.backoff = 30
+        self.max_backoff = 3600
+        self.idle_timeout = 60
+        self.lock_path = None
+        self._smtp = None
+        self._smtp_used = 0
+        self._wake = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('EMAIL_OUTBOX_INTERVAL', 5)
+        self.batch_size = app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 50)
+        self.max_attempts = app.config.get('EMAIL_MAX_ATTEMPTS', 8)
+        self.backoff = app.config.get('EMAIL_RETRY_BACKOFF', 30)
+        self.max_backoff = app.config.get('EMAIL_RETRY_BACKOFF_MAX', 3600)
+        self.idle_timeout = app.config.get('SMTP_IDLE_TIMEOUT', 60)
+        self.lock_path = os.path.join(app.instance_path, 'email_outbox.lock')
+        os.makedirs(app.instance_path, exist_ok=True)
+        app.extensions['email_outbox'] = self
+
+        # Scripts without background workers leave queued mail to the served app
+        if self.interval > 0 and self._thread is None and app.config.get('BACKGROUND_WORKERS'):
+            self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def notify(self):
+        """
+        Wake the sender thread after a commit that queued email. Without one
+        (EMAIL_OUTBOX_INTERVAL=0 or no background workers) the message stays
+        pending for the served app's sender.
+        """
+        if self._thread is not None:
+            self._wake.set()
+
+    def deliver(self):
+        """
+        Send every due message unless another worker is already doing it.
+        Returns how many were sent.
+        """
+        with open(self.lock_path, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            if has_app_context():
+                return self._deliver()
+            with self.app.app_context():
+                return self._deliver()
+
+    def _deliver(self):
+        from __init__ import db
+        from models.outbox import EmailMessage
+        sent = 0
+        try:
+            while True:
+                due = EmailMessage.query.filter(
+                    EmailMessage.status == 'pending',
+                    EmailMessage.next_attempt_at <= datetime.utcnow()
+                ).order_by(EmailMessage.next_attempt_at).limit(self.batch_size).all()
+                for message in due:
+                    if self._send(message):
+                        sent += 1
+                    elif self._smtp is None:
+                        # The server is unreachable; the rest of the batch would fail the same way
+                        db.session.commit()
+                        return sent
+                    db.session.commit()
+                if len(due) < self.batch_size:
+                    return sent
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Email outbox delivery failed: {str(e)}")
+            return sent
+
+    def _send(self, message):
+        """Send one message and record the outcome on its row; returns whether it was sent"""
+        from utils.email import build_message
+        config = current_app.config
+        message.attempts += 1
+        msg = build_message(config['MAIL_FROM'], message.to_email, message.subject,
+                            message.body_html, message.body_text, message.message_id)
+        try:
+            try:
+                self._connection().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The kept connection was dropped by the server; one fresh attempt
+                self._disconnect()
+                self._connection().send_message(msg)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+            if isinstance(e, smtplib.SMTPRecipientsRefused):
+                permanent = all(code >= 500 for code, _ in e.recipients.values())
+            else:
+                permanent = e.smtp_code >= 500
+            self._failed(message, e, permanent)
+            return False
+        except (smtplib.SMTPException, OSError) as e:
+            self._disconnect()
+            self._failed(message, e, permanent=False)
+            return False
+
+        message.status = 'sent'
+        message.sent_at = datetime.utcnow()
+        message.last_error = None
+        current_app.logger.info(f"Email {message.id} ({message.kind}) sent to {message.to_email}")
+        return True
+
+    def _failed(self, message, error, permanent):
+        message.last_error = str(error)[:1000]
+        if permanent or message.attempts >= self.max_attempts:
+            message.status = 'failed'
+            current_app.logger.error(f"Email {message.id} to {message.to_email} failed after "
+                                     f"{message.attempts} attempt(s): {message.last_error}")
+            return
+        # 30s, 1m, 2m, ... with jitter so retries of a burst do not land together
+        delay = min(self.backoff * 2 ** (message.attempts - 1), self.max_backoff)
+        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(1, 1.2))
+        current_app.logger.warning(f"Email {message.id} to {message.to_email} not sent (attempt "
+                                   f"{message.attempts}), retrying in {delay}s: {message.last_error}")
+
+    def _connection(self):
+        """The kept SMTP connection, opened (and logged in) on first use"""
+        from utils.email import smtp_connect
+        if self._smtp is None:
+            self._smtp = smtp_connect(current_app.config)
+        self._smtp_used = time.monotonic()
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+    def close(self):
+        """Close the kept connection"""
+        self._disconnect()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.deliver()
+            if self._smtp is not None and time.monotonic() - self._smtp_used > self.idle_timeout:
+                # Do not hold a connection the server will time out anyway
+                self._disconnect()
+
+email_outbox = EmailOutbox()
@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import binascii
+import json
+from sqlalchemy import String, and_, or_, literal, type_coerce
+
+MAX_PER_PAGE = 100
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplies a malformed or mismatched cursor"""
+
+def encode_cursor(order, key, row_id, direction):
+    """Encode a position in an ordered listing as an opaque URL-safe string"""
+    payload = json.dumps({'o': order, 'k': key, 'i': row_id, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, order):
+    """Decode a cursor produced by encode_cursor for the given ordering"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key, row_id, direction = data['k'], int(data['i']), data['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor('Malformed cursor')
+
+    if data.get('o') != order or direction not in ('next', 'prev'):
+        raise InvalidCursor('Cursor does not match this listing')
+    return key, row_id, direction
+
+def keyset_paginate(query, order, sort_column, id_column, per_page, cursor=None):
+    """
+    Page through query ordered by (sort_column, id_column) descending.
+
+    Each page is a single indexed range scan with LIMIT, so its cost does not
+    grow with the page's depth. Rows with a NULL sort key (e.g. a draft's
+    published_at) sort after all others. Returns (items, next_cursor, prev_cursor).
+    """
+    # Compare against the raw stored value: SQLite keeps DATETIME as text and
+    # rows written by CURRENT_TIMESTAMP carry no microseconds, so a re-bound
+    # datetime would not compare equal to the value it was read from.
+    raw_key = type_coerce(sort_column, String)
+    query = query.add_columns(raw_key.label('cursor_key'))
+
+    direction = 'next'
+    if cursor:
+        key, row_id, direction = decode_cursor(cursor, order)
+        if key is None:
+            if direction == 'next':
+                query = query.filter(sort_column.is_(None), id_column < row_id)
+            else:
+                query = query.filter(or_(sort_column.isnot(None), id_column > row_id))
+        else:
+            key = literal(key, String)
+            if direction == 'next':
+                query = query.filter(or_(raw_key < key, and_(raw_key == key, id_column < row_id),
+                                         sort_column.is_(None)))
+            else:
+                query = query.filter(or_(raw_key > key, and_(raw_key == key, id_column > row_id)))
+
+    if direction == 'next':
+        query = query.order_by(sort_column.desc().nulls_last(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc().nulls_first(), id_column.asc())
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    if not rows:
+        return items, None, None
+
+    first, last = rows[0], rows[-1]
+    more_after = has_more if direction == 'next' else True
+    more_before = bool(cursor) if direction == 'next' else has_more
+
+    next_cursor = encode_cursor(order, last.cursor_key, last[0].id, 'next') if more_after else None
+    prev_cursor = encode_cursor(order, first.cursor_key, first[0].id, 'prev') if more_before else None
+    return items, next_cursor, prev_cursor
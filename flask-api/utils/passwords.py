@@ -0,0 +1,75 @@
+"""
+Password hashing off the request path
+
+Hashing is deliberately slow and CPU-bound. Each worker hashes in a small
+thread pool of PASSWORD_HASH_WORKERS threads (hashlib releases the GIL), so
+a burst of logins is capped at that many hashes per process while the
+worker's other request threads keep serving reads; past
+PASSWORD_HASH_QUEUE_LIMIT waiting hashes, requests get HasherBusy instead
+of queueing without bound. Hashes are made with PASSWORD_HASH_METHOD (see
+benchmark_password_hash.py) and older ones are upgraded on login.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class HasherBusy(Exception):
+    """Raised when this worker already has its maximum of hashes waiting"""
+
+class PasswordHasher:
+    """Per-process bounded executor for password hashing"""
+
+    def __init__(self, app=None):
+        self.method = 'scrypt'
+        self.workers = 1
+        self.queue_limit = 8
+        self._pool = None
+        self._slots = None
+        self._prefix = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        # Without background workers passwords are hashed inline
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 1) if app.config.get('BACKGROUND_WORKERS') else 0
+        self.queue_limit = app.config.get('PASSWORD_HASH_QUEUE_LIMIT', 8)
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1) + max(self.queue_limit, 0))
+        self._prefix = None
+        app.extensions['password_hasher'] = self
+
+    def _executor(self):
+        # Created on first use, i.e. after gunicorn forked this worker
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self._pool
+
+    def _run(self, fn, *args):
+        """Run fn in the pool and wait for it; raises HasherBusy when the queue is full"""
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash a password with the current PASSWORD_HASH_METHOD"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, stored_hash, password):
+        """Whether password matches stored_hash, whatever method made it"""
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """Whether stored_hash was made with other parameters than PASSWORD_HASH_METHOD"""
+        if self._prefix is None:
+            # Werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1"); compare against its own output
+            self._prefix = self.hash('').split('$', 1)[0]
+        return stored_hash.split('$', 1)[0] != self._prefix
+
+password_hasher = PasswordHasher()
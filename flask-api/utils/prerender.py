@@ -0,0 +1,233 @@
+"""
+Static copies of published posts for nginx to serve without the app
+
+Each published post has two files under PRERENDER_DIR: posts/<slug>.json,
+the body of GET /api/blog/posts/<slug>, and blog/<slug>.html, a snapshot of
+the post page with its meta tags for crawlers that do not run JavaScript.
+They are rewritten whenever what they show changes and removed once the
+post is no longer published; nginx falls back to the app for any missing
+file, so a copy that could not be written only costs speed.
+"""
+import html
+import json
+import os
+import re
+import tempfile
+from flask import current_app
+from utils.feeds import site_info
+
+# Slugs only hold [a-z0-9-]; anything else is never turned into a path
+SLUG_RE = re.compile(r'[a-z0-9-]+')
+DESCRIPTION_LENGTH = 160
+
+def post_detail(post, max_depth=None, reply_limit=None):
+    """Payload of GET /api/blog/posts/<slug> for a post"""
+    from shared_models import get_blog_comment
+    from utils.related import related_posts_for
+    post_data = post.to_dict()
+    post_data['view_count'] = post.view_count or 0
+    post_data['comments'] = get_blog_comment().approved_tree(post.id, max_depth=max_depth, reply_limit=reply_limit)
+    post_data['related_posts'] = related_posts_for(post.id)
+    return post_data
+
+def _text(value):
+    """Escape stored text for HTML; titles and excerpts are stored already escaped once"""
+    return html.escape(html.unescape(value or ''))
+
+def _description(post):
+    text = post.meta_description or post.excerpt
+    if not text:
+        text = ' '.join(re.sub(r'[#*_`>\[\]()$\\]', ' ', post.content or '').split())
+        if len(text) > DESCRIPTION_LENGTH:
+            text = text[:DESCRIPTION_LENGTH - 1].rsplit(' ', 1)[0] + '…'
+    return text
+
+def render_post_html(post, base_url, site_name):
+    """HTML snapshot of a post page: meta tags, structured data and the post text"""
+    from utils.tags import parse_tags
+    url = f'{base_url}/blog/{post.slug}'
+    title = _text(post.title)
+    description = _text(_description(post))
+    author = post.author.username if post.author else 'Unknown'
+    published = post.published_at.isoformat() if post.published_at else None
+    modified = post.updated_at.isoformat() if post.updated_at else None
+
+    meta = [
+        f'<meta name="description" content="{description}">',
+        f'<link rel="canonical" href="{html.escape(url)}">',
+        '<meta property="og:type" content="article">',
+        f'<meta property="og:site_name" content="{_text(site_name)}">',
+        f'<meta property="og:title" content="{title}">',
+        f'<meta property="og:description" content="{description}">',
+        f'<meta property="og:url" content="{html.escape(url)}">',
+        f'<meta name="twitter:card" content="{"summary_large_image" if post.featured_image else "summary"}">',
+    ]
+    if post.featured_image:
+        meta.append(f'<meta property="og:image" content="{html.escape(post.featured_image)}">')
+    if published:
+        meta.append(f'<meta property="article:published_time" content="{published}">')
+    if modified:
+        meta.append(f'<meta property="article:modified_time" content="{modified}">')
+    if post.category:
+        meta.append(f'<meta property="article:section" content="{_text(post.category)}">')
+    for name, _ in parse_tags(post.tags):
+        meta.append(f'<meta property="article:tag" content="{_text(name)}">')
+
+    structured = {
+        '@context': 'https://schema.org',
+        '@type': 'BlogPosting',
+        'headline': html.unescape(post.title or ''),
+        'description': html.unescape(_description(post)),
+        'url': url,
+        'mainEntityOfPage': url,
+        'author': {'@type': 'Person', 'name': author},
+        'publisher': {'@type': 'Organization', 'name': site_name},
+    }
+    if post.featured_image:
+        structured['image'] = post.featured_image
+    if published:
+        structured['datePublished'] = published
+    if modified:
+        structured['dateModified'] = modified
+    # Keep the JSON from closing its script element
+    structured = json.dumps(structured, ensure_ascii=False).replace('<', '\\u003c')
+
+    paragraphs = [block.strip() for block in re.split(r'\n\s*\n', post.content or '') if block.strip()]
+    body = '\n'.join(f'<p>{html.escape(block)}</p>' for block in paragraphs)
+    byline = f'By {html.escape(author)}'
+    if published:
+        byline += f' · <time datetime="{published}">{post.published_at.strftime("%B %d, %Y")}</time>'
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title} | {_text(site_name)}</title>
+{chr(10).join(meta)}
+<script type="application/ld+json">{structured}</script>
+</head>
+<body>
+<article>
+<h1>{title}</h1>
+<p>{byline}</p>
+{body}
+</article>
+<p><a href="{html.escape(base_url)}/blog">{_text(site_name)}</a></p>
+</body>
+</html>
+"""
+
+def _replace(path, data):
+    """
+    Atomically put data at path unless it already holds it; returns whether
+    the file changed. Unchanged files keep nginx's ETag and Last-Modified.
+    """
+    try:
+        with open(path, 'rb') as existing:
+            if existing.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        # nginx runs as another user
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+class StaticPostPublisher:
+    """Keeps PRERENDER_DIR in step with the published posts"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.root = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PRERENDER_POSTS', True)
+        self.root = app.config.get('PRERENDER_DIR') or os.path.join(app.instance_path, 'prerendered')
+        if self.enabled:
+            for subdir in ('posts', 'blog'):
+                os.makedirs(os.path.join(self.root, subdir), exist_ok=True)
+        app.extensions['static_posts'] = self
+
+    def paths(self, slug):
+        """(json, html) file paths of a post"""
+        return (os.path.join(self.root, 'posts', f'{slug}.json'),
+                os.path.join(self.root, 'blog', f'{slug}.html'))
+
+    def slugs(self):
+        """Slugs that currently have a static copy"""
+        found = set()
+        for subdir, ext in (('posts', '.json'), ('blog', '.html')):
+            for name in os.listdir(os.path.join(self.root, subdir)):
+                slug, found_ext = os.path.splitext(name)
+                if found_ext == ext and SLUG_RE.fullmatch(slug):
+                    found.add(slug)
+        return found
+
+    def write(self, post, site=None):
+        """Write a published post's files; site is an optional (base_url, site_name)"""
+        if not SLUG_RE.fullmatch(post.slug or ''):
+            return False
+        base_url, site_name = site or site_info()
+        json_path, html_path = self.paths(post.slug)
+        body = current_app.json.dumps(post_detail(post)).encode()
+        changed = _replace(json_path, body)
+        changed |= _replace(html_path, render_post_html(post, base_url, site_name).encode())
+        return changed
+
+    def remove(self, slug):
+        if not SLUG_RE.fullmatch(slug or ''):
+            return False
+        removed = False
+        for path in self.paths(slug):
+            removed |= _remove(path)
+        return removed
+
+    def refresh(self, *slugs):
+        """
+        Rewrite the files of the posts with these slugs after a commit, or
+        remove them if the post is gone, renamed or no longer published.
+
+        Errors are logged rather than raised: the write already committed.
+        """
+        if not self.enabled:
+            return
+        from shared_models import get_blog_post
+        BlogPost = get_blog_post()
+        slugs = {slug for slug in slugs if slug}
+        if not slugs:
+            return
+        published = {post.slug: post for post in BlogPost.query.filter(
+            BlogPost.slug.in_(slugs), BlogPost.status == 'published'
+        )}
+
+        site = None
+        for slug in slugs:
+            try:
+                if slug in published:
+                    site = site or site_info()
+                    self.write(published[slug], site)
+                else:
+                    self.remove(slug)
+            except OSError as e:
+                current_app.logger.error(f"Failed to update static copy of post {slug}: {str(e)}")
+
+static_posts = StaticPostPublisher()
@@ -0,0 +1,335 @@
+"""
+Related posts from TF-IDF similarity, precomputed in the background
+
+Published posts are vectorized with sublinear TF-IDF over their title, tags,
+excerpt and content. Each post's top-k cosine neighbours are stored in
+blog_related_posts, so a post page reads them with one primary key lookup.
+Runs only recompute posts whose text changed and the posts whose neighbour
+lists those changes can affect, and only re-read and re-tokenize the text
+of changed posts; the term counts of the rest are kept between runs.
+"""
+import fcntl
+import math
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import delete, insert, select, update
+
+TOKEN_RE = re.compile(r'[a-z][a-z0-9]{2,}')
+STOPWORDS = frozenset("""
+    about above after again against also because been before being below between both but can
+    could did does doing down during each few for from further had has have having here how
+    into its itself just more most not now off once only other our out over own same should
+    some such than that the their them then there these they this those through too under
+    until very was were what when where which while who whom why will with would you your
+""".split())
+
+# Title and tag words say more about a post than body words
+FIELD_WEIGHTS = (('title', 3), ('tags', 2), ('excerpt', 1), ('content', 1))
+
+# Neighbours below this cosine similarity are not worth showing
+MIN_SCORE = 0.05
+
+# Posts whose text is read per query
+READ_BATCH_SIZE = 500
+
+def tokenize(row):
+    """Weighted term counts for a post row with title/tags/excerpt/content"""
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        text = getattr(row, field) or ''
+        for term in TOKEN_RE.findall(text.lower()):
+            if term not in STOPWORDS:
+                counts[term] += weight
+    return counts
+
+class TfidfIndex:
+    """
+    L2-normalized TF-IDF vectors for a set of documents.
+
+    Vectors are kept both per document (CSR) and per term (CSC), so one
+    document's similarity to every other is a sparse matrix-vector product:
+    gather the postings of its terms and sum them per document with bincount.
+    """
+
+    def __init__(self, documents, min_df=2, max_df=0.8):
+        self.ids = [doc_id for doc_id, _ in documents]
+        self.position = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        n = len(documents)
+
+        df = Counter()
+        for _, counts in documents:
+            df.update(counts.keys())
+        # Terms in a single document cannot link two posts; near-universal
+        # terms link all of them
+        ceiling = max_df * n if n >= 10 else n
+        vocabulary = {}
+        for term, count in df.items():
+            if min_df <= count <= ceiling:
+                vocabulary[term] = len(vocabulary)
+        idf = np.array([math.log((1 + n) / (1 + df[term])) + 1 for term in vocabulary], dtype=np.float32)
+
+        self.row_terms = []
+        self.row_weights = []
+        for _, counts in documents:
+            pairs = [(vocabulary[term], count) for term, count in counts.items() if term in vocabulary]
+            terms = np.array([term for term, _ in pairs], dtype=np.int64)
+            tf = np.array([count for _, count in pairs], dtype=np.float32)
+            weights = (1 + np.log(tf)) * idf[terms] if len(terms) else tf
+            norm = np.linalg.norm(weights)
+            self.row_terms.append(terms)
+            self.row_weights.append(weights / norm if norm else weights)
+
+        lengths = [len(terms) for terms in self.row_terms]
+        all_terms = np.concatenate(self.row_terms) if n else np.zeros(0, dtype=np.int64)
+        all_weights = np.concatenate(self.row_weights) if n else np.zeros(0, dtype=np.float32)
+        all_docs = np.repeat(np.arange(n), lengths)
+        order = np.argsort(all_terms, kind='stable')
+        self.col_docs = all_docs[order]
+        self.col_weights = all_weights[order]
+        self.col_ptr = np.concatenate(([0], np.cumsum(np.bincount(all_terms, minlength=len(vocabulary)))))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, i):
+        """Cosine similarity of document i to every document"""
+        terms, weights = self.row_terms[i], self.row_weights[i]
+        starts, ends = self.col_ptr[terms], self.col_ptr[terms + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(len(self), dtype=np.float64)
+
+        # Positions of every posting of every term of i, without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        contributions = self.col_weights[offsets] * np.repeat(weights, lengths)
+        return np.bincount(self.col_docs[offsets], weights=contributions, minlength=len(self))
+
+    def neighbours(self, i, limit, scores=None):
+        """The limit most similar documents to i as (doc id, score), best first"""
+        scores = self.scores(i) if scores is None else scores.copy()
+        scores[i] = 0
+        candidates = np.flatnonzero(scores >= MIN_SCORE)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = sorted(candidates, key=lambda j: (-scores[j], self.ids[j]))
+        return [(self.ids[j], float(scores[j])) for j in ranked]
+
+def update_related_posts(limit=5, full=False, documents=None):
+    """
+    Bring stored neighbour lists up to date; returns the number of posts rewritten.
+
+    full recomputes every published post, which also absorbs the slow drift
+    of IDF weights as the corpus grows. documents is an optional post id ->
+    (updated_at, term counts) dict kept by the caller between runs; only
+    posts missing from it or changed since are read from the database.
+    """
+    from __init__ import db
+    from shared_models import get_blog_post, get_blog_related_post, get_blog_related_source
+    from utils.cache import response_cache, post_tag
+    from utils.prerender import static_posts
+    posts = get_blog_post().__table__
+    related = get_blog_related_post().__table__
+    sources = get_blog_related_source().__table__
+
+    published = dict(db.session.execute(
+        select(posts.c.id, posts.c.updated_at).where(posts.c.status == 'published')
+    ).all())
+    computed = dict(db.session.execute(select(sources.c.post_id, sources.c.source_updated_at)).all())
+
+    changed = [post_id for post_id, updated_at in published.items()
+               if full or post_id not in computed or computed[post_id] != updated_at]
+    removed = set(computed) - set(published)
+    if not changed and not removed:
+        return 0
+
+    if documents is None:
+        documents = {}
+    for post_id in set(documents) - set(published):
+        del documents[post_id]
+    changed_ids = set(changed)
+    unread = [post_id for post_id, updated_at in published.items()
+              if post_id in changed_ids or documents.get(post_id, (None,))[0] != updated_at]
+    for start in range(0, len(unread), READ_BATCH_SIZE):
+        rows = db.session.execute(
+            select(posts.c.id, posts.c.updated_at, posts.c.title, posts.c.tags, posts.c.excerpt, posts.c.content)
+            .where(posts.c.id.in_(unread[start:start + READ_BATCH_SIZE]), posts.c.status == 'published')
+        ).all()
+        for row in rows:
+            documents[row.id] = (row.updated_at, tokenize(row))
+    index = TfidfIndex(sorted((post_id, documents[post_id][1]) for post_id in published if post_id in documents))
+    # Posts unpublished since the first query have nothing to compute
+    changed = [post_id for post_id in changed if post_id in index.position]
+
+    lists = {}
+    for row in db.session.execute(select(related.c.post_id, related.c.related_post_id, related.c.score)):
+        lists.setdefault(row.post_id, []).append((row.related_post_id, row.score))
+
+    # Lists that mention a changed or removed post may now be wrong; posts
+    # unpublished since the first query keep theirs until the next run removes them
+    touched = set(changed) | removed
+    affected = set(changed)
+    affected.update(post_id for post_id, neighbours in lists.items()
+                    if post_id in index.position and any(related_id in touched for related_id, _ in neighbours))
+
+    # A changed post also joins every list whose weakest entry it now beats
+    thresholds = np.full(len(index), MIN_SCORE)
+    for post_id, neighbours in lists.items():
+        if post_id in index.position and len(neighbours) >= limit:
+            thresholds[index.position[post_id]] = min(score for _, score in neighbours)
+    fresh = {}
+    for post_id in changed:
+        i = index.position[post_id]
+        scores = index.scores(i)
+        fresh[post_id] = index.neighbours(i, limit, scores=scores)
+        beaten = np.flatnonzero(scores > thresholds)
+        affected.update(index.ids[j] for j in beaten if j != i)
+
+    for post_id in affected - set(fresh):
+        fresh[post_id] = index.neighbours(index.position[post_id], limit)
+
+    stale = list(affected | removed)
+    db.session.execute(delete(related).where(related.c.post_id.in_(stale)))
+    db.session.execute(delete(sources).where(sources.c.post_id.in_(list(removed) + changed)))
+    neighbour_rows = [
+        {'post_id': post_id, 'rank': rank, 'related_post_id': related_id, 'score': score}
+        for post_id, neighbours in fresh.items()
+        for rank, (related_id, score) in enumerate(neighbours)
+    ]
+    if neighbour_rows:
+        db.session.execute(insert(related), neighbour_rows)
+    if changed:
+        db.session.execute(insert(sources), [
+            {'post_id': post_id, 'source_updated_at': published[post_id]} for post_id in changed
+        ])
+    db.session.commit()
+
+    # Post pages embed their related posts
+    slugs = db.session.execute(select(posts.c.slug).where(posts.c.id.in_(list(fresh)))).scalars().all()
+    response_cache.invalidate(*(post_tag(slug) for slug in slugs))
+    static_posts.refresh(*slugs)
+    return len(fresh)
+
+class RelatedPostsBuilder:
+    """Background job that keeps related posts current; one worker runs it at a time"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 300
+        self.limit = 5
+        self.lock_path = None
+        self._documents = {}
+        self._wake = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        # Without background workers every schedule() runs inline
+        self.interval = app.config.get('RELATED_POSTS_INTERVAL', 300) if app.config.get('BACKGROUND_WORKERS') else 0
+        self.limit = app.config.get('RELATED_POSTS_LIMIT', 5)
+        self.lock_path = os.path.join(app.instance_path, 'related_posts.lock')
+        os.makedirs(app.instance_path, exist_ok=True)
+        app.extensions['related_posts'] = self
+
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='related-posts', daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def mark_changed(*post_ids):
+        """
+        Clear the computed versions of edited posts in the caller's
+        transaction: updated_at has one second resolution, so an edit right
+        after the last run could otherwise look unchanged.
+        """
+        from __init__ import db
+        from shared_models import get_blog_related_source
+        sources = get_blog_related_source().__table__
+        db.session.execute(update(sources).where(sources.c.post_id.in_(post_ids)).values(source_updated_at=None))
+
+    @staticmethod
+    def forget(post_id):
+        """
+        Drop a post's own neighbour list in the caller's transaction, before
+        the post is deleted. Its computed version stays, so the next run sees
+        it removed and fixes the lists that mention it.
+        """
+        from __init__ import db
+        from shared_models import get_blog_related_post
+        related = get_blog_related_post().__table__
+        db.session.execute(delete(related).where(related.c.post_id == post_id))
+
+    def schedule(self):
+        """Ask for a run soon after posts were written"""
+        if self.interval <= 0:
+            self.run()
+        else:
+            self._wake.set()
+
+    def run(self, full=False, wait=False):
+        """
+        Update related posts unless another worker is already doing it (or
+        after it finishes, with wait). Returns the posts updated, or None if
+        the update failed.
+        """
+        with open(self.lock_path, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            if has_app_context():
+                return self._update(full)
+            with self.app.app_context():
+                return self._update(full)
+
+    def _update(self, full):
+        from __init__ import db
+        try:
+            updated = update_related_posts(limit=self.limit, full=full, documents=self._documents)
+            if updated:
+                current_app.logger.info(f"Recomputed related posts for {updated} post(s)")
+            return updated
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to update related posts: {str(e)}")
+            return None
+
+    def _run(self):
+        while True:
+            self.run()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+related_posts = RelatedPostsBuilder()
+
+def related_posts_for(post_id):
+    """Stored neighbours of a post that are still published, best first"""
+    from __init__ import db
+    from shared_models import get_blog_post, get_blog_related_post
+    posts = get_blog_post().__table__
+    related = get_blog_related_post().__table__
+
+    rows = db.session.execute(
+        select(posts.c.id, posts.c.title, posts.c.slug, posts.c.excerpt, posts.c.featured_image,
+               posts.c.published_at, related.c.score)
+        .select_from(related)
+        .join(posts, posts.c.id == related.c.related_post_id)
+        .where(related.c.post_id == post_id, posts.c.status == 'published')
+        .order_by(related.c.rank)
+    ).all()
+    return [{
+        'id': row.id,
+        'title': row.title,
+        'slug': row.slug,
+        'excerpt': row.excerpt,
+        'featured_image': row.featured_image,
+        'published_at': row.published_at.isoformat() if row.published_at else None,
+        'score': round(row.score, 4)
+    } for row in rows]
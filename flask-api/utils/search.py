@@ -0,0 +1,170 @@
+"""
+Full-text search over blog posts backed by an SQLite FTS5 index
+"""
+import hashlib
+import html
+import re
+from sqlalchemy import select, text
+from utils.categories import category_lookup
+from utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+
+SEARCH_TABLE = 'blog_posts_fts'
+SEARCH_COLUMNS = ('title', 'excerpt', 'content', 'tags')
+
+# bm25 weight per column, in SEARCH_COLUMNS order: title and tag hits rank highest
+SEARCH_RANK = 'bm25(10.0, 4.0, 1.0, 6.0)'
+
+MAX_QUERY_TERMS = 16
+SNIPPET_TOKENS = 24
+
+# Placeholder markers that cannot appear in stored text; swapped for <mark>
+# after the snippet has been HTML-escaped
+_OPEN, _CLOSE = '\x02', '\x03'
+
+# External content table: the index stores only tokens, and the triggers keep
+# it in step with blog_posts inside the writing transaction. The update trigger
+# only fires for indexed columns, so view count flushes never touch the index.
+_COLUMN_LIST = ', '.join(SEARCH_COLUMNS)
+_NEW_VALUES = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+_OLD_VALUES = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+
+SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        {_COLUMN_LIST}, content='blog_posts', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON blog_posts BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, {_COLUMN_LIST}) VALUES (new.id, {_NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON blog_posts BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {_COLUMN_LIST}) VALUES ('delete', old.id, {_OLD_VALUES});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF {_COLUMN_LIST} ON blog_posts BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {_COLUMN_LIST}) VALUES ('delete', old.id, {_OLD_VALUES});
+        INSERT INTO {SEARCH_TABLE}(rowid, {_COLUMN_LIST}) VALUES (new.id, {_NEW_VALUES});
+    END""",
+]
+
+def search_available(db):
+    """FTS5 search needs SQLite; other databases have no index to query"""
+    return db.engine.dialect.name == 'sqlite'
+
+def ensure_search_index(db):
+    """
+    Create the search index and its sync triggers if they are missing.
+
+    A newly created index is populated from the existing posts. Returns True
+    if the index was created.
+    """
+    if not search_available(db):
+        return False
+    with db.engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': SEARCH_TABLE}
+        ).first() is not None
+        for statement in SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            _rebuild(connection)
+    return not exists
+
+def rebuild_search_index(db):
+    """Repopulate the search index from blog_posts and merge its segments"""
+    with db.engine.begin() as connection:
+        for statement in SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+        _rebuild(connection)
+        connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+        return connection.exec_driver_sql(f"SELECT count(*) FROM {SEARCH_TABLE}").scalar()
+
+def _rebuild(connection):
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+    # Persist the column weights so ORDER BY rank uses them
+    connection.exec_driver_sql(
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('rank', '{SEARCH_RANK}')"
+    )
+
+def match_expression(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word must match (implicit AND) and the last one also matches as a
+    prefix, so results follow the user as they type. FTS5 operators in the
+    input are treated as plain words.
+    """
+    terms = re.findall(r'\w+', query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def _marked(value):
+    """HTML-escape highlighted text, then turn the placeholder markers into <mark>"""
+    if value is None:
+        return None
+    return html.escape(value).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+def search_posts(db, match, per_page, cursor=None, status='published', category=None):
+    """
+    Rank posts matching an FTS5 expression, best first.
+
+    Pages are keyed on (rank, id), so deeper pages cost no more than the
+    first. Returns (hits, next_cursor, prev_cursor); each hit is a dict with
+    the post id, its rank and highlighted title and snippet.
+    """
+    # Cursors are only valid for the query that produced them
+    order = 'search:' + hashlib.sha256(repr((match, status, category)).encode()).hexdigest()[:16]
+    params = {'match': match, 'status': status, 'limit': per_page + 1,
+              'open': _OPEN, 'close': _CLOSE, 'tokens': SNIPPET_TOKENS}
+
+    filters = 'AND blog_posts.status = :status'
+    if category:
+        # Same name-or-slug match as the listing; unknown categories match nothing
+        filters += ' AND blog_posts.category_id = :category_id'
+        params['category_id'] = db.session.scalar(select(category_lookup(category)))
+
+    direction = 'next'
+    if cursor:
+        key, row_id, direction = decode_cursor(cursor, order)
+        try:
+            params.update(key=float(key), row_id=row_id)
+        except (TypeError, ValueError):
+            raise InvalidCursor('Malformed cursor')
+        comparison = '>' if direction == 'next' else '<'
+        filters += (f" AND ({SEARCH_TABLE}.rank {comparison} :key "
+                    f"OR ({SEARCH_TABLE}.rank = :key AND {SEARCH_TABLE}.rowid {comparison} :row_id))")
+    sort = 'ASC' if direction == 'next' else 'DESC'
+
+    rows = db.session.execute(text(f"""
+        SELECT {SEARCH_TABLE}.rowid AS id, {SEARCH_TABLE}.rank AS rank,
+               highlight({SEARCH_TABLE}, 0, :open, :close) AS title_highlight,
+               snippet({SEARCH_TABLE}, -1, :open, :close, '…', :tokens) AS snippet
+        FROM {SEARCH_TABLE}
+        JOIN blog_posts ON blog_posts.id = {SEARCH_TABLE}.rowid
+        WHERE {SEARCH_TABLE} MATCH :match {filters}
+        ORDER BY {SEARCH_TABLE}.rank {sort}, {SEARCH_TABLE}.rowid {sort}
+        LIMIT :limit
+    """), params).all()
+
+    # Fetch one extra row to learn whether another page exists
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    hits = [{
+        'id': row.id,
+        'rank': row.rank,
+        'title_highlight': _marked(row.title_highlight),
+        'snippet': _marked(row.snippet),
+    } for row in rows]
+    if not rows:
+        return hits, None, None
+
+    more_after = has_more if direction == 'next' else True
+    more_before = bool(cursor) if direction == 'next' else has_more
+    first, last = rows[0], rows[-1]
+    next_cursor = encode_cursor(order, last.rank, last.id, 'next') if more_after else None
+    prev_cursor = encode_cursor(order, first.rank, first.id, 'prev') if more_before else None
+    return hits, next_cursor, prev_cursor
@@ -0,0 +1,61 @@
+"""
+Slug generation and allocation utilities
+"""
+import re
+from sqlalchemy.exc import IntegrityError
+
+SLUG_ATTEMPTS = 3
+
+def slugify(text):
+    """Lowercase text and reduce it to letters, digits and hyphens"""
+    slug = re.sub(r'[^a-zA-Z0-9\s-]', '', str(text).lower())
+    return re.sub(r'\s+', '-', slug.strip())
+
+def allocate_slug(model, text, current_slug=None, exclude_id=None):
+    """
+    Return a free slug for text in model's table with a single indexed query.
+
+    All rows whose slug is the base slug or starts with "base-" are fetched as
+    one range scan on the unique slug index, and the smallest free -N suffix is
+    picked in memory. A row keeps current_slug if it is still valid for text.
+    """
+    base = slugify(text)
+    suffix = re.compile(rf'^{re.escape(base)}-(\d+)$')
+    if current_slug is not None and (current_slug == base or suffix.match(current_slug)):
+        return current_slug
+
+    # Slugs only contain [a-z0-9-] and '.' sorts right after '-', so this
+    # range covers exactly base and base-*
+    from __init__ import db
+    query = db.session.query(model.slug).filter(model.slug >= base, model.slug < base + '.')
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    taken = {row.slug for row in query}
+
+    if base not in taken:
+        return base
+
+    used = {int(match.group(1)) for match in map(suffix.match, taken) if match}
+    counter = 1
+    while counter in used:
+        counter += 1
+    return f"{base}-{counter}"
+
+def commit_with_slug(model, text, apply, current_slug=None, exclude_id=None, attempts=SLUG_ATTEMPTS):
+    """
+    Allocate a slug, let apply(slug) stage the row, and commit.
+
+    If a concurrent writer claims the same slug first, the unique constraint
+    fails; the transaction is rolled back and apply is called again with a
+    freshly allocated slug, up to attempts times. Returns apply's result.
+    """
+    from __init__ import db
+    for attempt in range(attempts):
+        result = apply(allocate_slug(model, text, current_slug=current_slug, exclude_id=exclude_id))
+        try:
+            db.session.commit()
+            return result
+        except IntegrityError as e:
+            db.session.rollback()
+            if 'slug' not in str(e.orig) or attempt + 1 == attempts:
+                raise
@@ -0,0 +1,99 @@
+"""
+Tag parsing and post <-> tag synchronization
+"""
+import json
+from sqlalchemy import func, select, update
+from utils.slug import slugify
+
+MAX_TAG_LENGTH = 100
+
+def parse_tags(value):
+    """
+    Split a stored tags value into (name, slug) pairs.
+
+    Accepts the comma-separated form the editor sends as well as a JSON
+    array. Tags are de-duplicated by slug, keeping the first spelling.
+    """
+    if not value:
+        return []
+    value = str(value).strip()
+
+    names = None
+    if value.startswith('['):
+        try:
+            parsed = json.loads(value)
+            if isinstance(parsed, list):
+                names = [str(name) for name in parsed]
+        except ValueError:
+            pass
+    if names is None:
+        names = value.split(',')
+
+    seen = set()
+    tags = []
+    for name in names:
+        name = ' '.join(name.split())[:MAX_TAG_LENGTH]
+        slug = slugify(name)
+        if slug and slug not in seen:
+            seen.add(slug)
+            tags.append((name, slug))
+    return tags
+
+def resolve_tags(pairs, known=None):
+    """
+    Return BlogTag rows for (name, slug) pairs, creating missing ones.
+
+    Existing tags are fetched with a single query; known is an optional
+    slug -> tag dict reused across calls by batch jobs.
+    """
+    from __init__ import db
+    from shared_models import get_blog_tag
+    BlogTag = get_blog_tag()
+
+    known = {} if known is None else known
+    missing = [slug for _, slug in pairs if slug not in known]
+    # Callers may hold pending changes (e.g. a new slug) that must not be
+    # flushed before their own commit handles conflicts
+    with db.session.no_autoflush:
+        if missing:
+            for tag in BlogTag.query.filter(BlogTag.slug.in_(missing)):
+                known[tag.slug] = tag
+
+        tags = []
+        for name, slug in pairs:
+            if slug not in known:
+                known[slug] = BlogTag(name=name, slug=slug)
+                db.session.add(known[slug])
+            tags.append(known[slug])
+    return tags
+
+def sync_post_tags(post, known=None):
+    """Point post's tag associations at the tags in its tags text"""
+    post.tag_rows = resolve_tags(parse_tags(post.tags), known=known)
+    return post.tag_rows
+
+def refresh_tag_counts(tag_ids=None):
+    """
+    Recount the published posts of the given tags (every tag if None).
+
+    Each count is an index lookup on the tag's associations, and recounting
+    rather than incrementing keeps the stored value correct under concurrent
+    writers. The caller commits.
+    """
+    from __init__ import db
+    from shared_models import get_blog_post, get_blog_tag, get_blog_post_tags
+    tags = get_blog_tag().__table__
+    posts = get_blog_post().__table__
+    links = get_blog_post_tags()
+
+    count = select(func.count())\
+        .select_from(links.join(posts, posts.c.id == links.c.post_id))\
+        .where(links.c.tag_id == tags.c.id, posts.c.status == 'published')\
+        .scalar_subquery()
+    stmt = update(tags).values(post_count=count)
+    if tag_ids is not None:
+        tag_ids = list(tag_ids)
+        if not tag_ids:
+            return
+        stmt = stmt.where(tags.c.id.in_(tag_ids))
+    db.session.execute(stmt)
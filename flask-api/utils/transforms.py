@@ -0,0 +1,194 @@
+"""
+On-demand resized copies of uploaded images
+
+GET /api/uploads/images/<filename>?w=&h=&fmt= derives a copy of an upload
+from its stored original, at sizes from IMAGE_TRANSFORM_SIZES only so the
+set of possible copies stays small. Copies are cached under
+uploads/transforms and the least recently used ones are evicted once the
+directory grows past IMAGE_TRANSFORM_CACHE_SIZE. Each copy is rendered
+under a file lock, so concurrent requests for it, from any worker, wait for
+one render instead of all doing it.
+"""
+import fcntl
+import os
+import re
+import time
+import zlib
+from flask import current_app
+from PIL import Image, ImageOps
+from utils.images import VARIANT_FORMATS, InvalidImage, save_image
+
+# Requests for different copies may share a lock; the same copy always does
+LOCK_STRIPES = 64
+# A cached copy's mtime records its last use, refreshed at most this often (seconds)
+TOUCH_INTERVAL = 3600
+# Eviction frees space down to this share of the cap, so it does not run on every render
+EVICT_TO = 0.9
+# <stem>-<width>x<height>.<ext>, 0 meaning "scaled to the other side"
+TRANSFORM_RE = re.compile(r'^(?P<stem>[\w.]+)-\d+x\d+\.(?:jpg|webp)$')
+
+class InvalidTransform(Exception):
+    """Raised when a requested size or format is not allowed"""
+
+def render_transform(source, target, width, height, fmt, quality=85, max_pixels=None):
+    """
+    Write source to target in fmt, cropped to width x height when both are
+    given, else scaled to the one given. Images are never scaled up.
+    """
+    # Runs in request threads, so Pillow's process-wide MAX_IMAGE_PIXELS is
+    # left alone; opening only reads the header, and the size is checked here
+    with Image.open(source) as img:
+        if max_pixels and img.width * img.height > max_pixels:
+            raise InvalidImage('Image dimensions are too large')
+        if width and height:
+            scale = max(width / img.width, height / img.height)
+        else:
+            scale = (width / img.width) if width else (height / img.height)
+        # JPEGs can decode straight at a fraction of their size, far cheaper than a full decode
+        img.draft('RGB', (max(1, round(img.width * scale)), max(1, round(img.height * scale))))
+        img.load()
+
+        # Resample in a mode that keeps colour and transparency
+        if img.mode not in ('RGB', 'RGBA', 'L'):
+            img = img.convert('RGBA' if img.mode in ('P', 'LA', 'PA') else 'RGB')
+        if width and height:
+            if width <= img.width and height <= img.height:
+                img = ImageOps.fit(img, (width, height), Image.Resampling.LANCZOS)
+            else:
+                # Too small for the box: crop to its aspect ratio without scaling up
+                ratio = min(img.width / width, img.height / height)
+                img = ImageOps.fit(img, (max(1, round(width * ratio)), max(1, round(height * ratio))),
+                                   Image.Resampling.LANCZOS)
+        else:
+            img.thumbnail((width or img.width, height or img.height), Image.Resampling.LANCZOS)
+
+        _, options = VARIANT_FORMATS[fmt]
+        if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        return save_image(img, target, quality=quality, **options)
+
+class ImageTransformer:
+    """Renders and caches the on-demand copies of uploaded images"""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.sizes = frozenset()
+        self.max_bytes = 256 * 1024 * 1024
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = os.path.join(app.instance_path, 'uploads', 'transforms')
+        self.sizes = frozenset(app.config.get('IMAGE_TRANSFORM_SIZES', ()))
+        self.max_bytes = app.config.get('IMAGE_TRANSFORM_CACHE_SIZE', 256 * 1024 * 1024)
+        os.makedirs(os.path.join(self.root, '.locks'), exist_ok=True)
+        app.extensions['image_transformer'] = self
+
+    def parse(self, args):
+        """
+        (width, height, fmt) requested by query args w, h and fmt, or None
+        when none is given; raises InvalidTransform for anything not allowed.
+        """
+        if not any(key in args for key in ('w', 'h', 'fmt')):
+            return None
+        dimensions = []
+        for key in ('w', 'h'):
+            value = args.get(key)
+            if value in (None, ''):
+                dimensions.append(None)
+                continue
+            try:
+                value = int(value)
+            except ValueError:
+                raise InvalidTransform(f'{key} must be a number')
+            if value not in self.sizes:
+                raise InvalidTransform(f'{key} must be one of {", ".join(map(str, sorted(self.sizes)))}')
+            dimensions.append(value)
+        if not any(dimensions):
+            raise InvalidTransform('w or h is required')
+        fmt = args.get('fmt', 'jpeg').lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in VARIANT_FORMATS:
+            raise InvalidTransform(f'fmt must be one of {", ".join(VARIANT_FORMATS)}')
+        return dimensions[0], dimensions[1], fmt
+
+    @staticmethod
+    def filename(name, width, height, fmt):
+        return f"{os.path.splitext(name)[0]}-{width or 0}x{height or 0}.{VARIANT_FORMATS[fmt][0]}"
+
+    def get(self, source, name, width, height, fmt):
+        """Path of the cached copy of upload name (stored at source), rendering it if needed"""
+        target = os.path.join(self.root, self.filename(name, width, height, fmt))
+        if self._touch(target):
+            return target
+
+        stripe = zlib.crc32(os.path.basename(target).encode()) % LOCK_STRIPES
+        with open(os.path.join(self.root, '.locks', f'{stripe}.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Whoever held the lock may have just rendered it
+            if os.path.exists(target):
+                return target
+            config = current_app.config
+            size = render_transform(source, target, width, height, fmt,
+                                    quality=config.get('IMAGE_QUALITY', 85),
+                                    max_pixels=config.get('IMAGE_MAX_PIXELS'))
+        current_app.logger.info(f"Rendered {os.path.basename(target)} ({size} bytes)")
+        self._evict(keep=target)
+        return target
+
+    def remove(self, name):
+        """Delete every cached copy of upload name; returns how many"""
+        stem = os.path.splitext(name)[0]
+        removed = 0
+        for entry in os.scandir(self.root):
+            match = TRANSFORM_RE.match(entry.name)
+            if match and match.group('stem') == stem:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    @staticmethod
+    def _touch(path):
+        """Mark a cached copy as used; False if it is not cached"""
+        try:
+            if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+                os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _evict(self, keep):
+        """Delete the least recently used copies while the cache is over its cap"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if not TRANSFORM_RE.match(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        current_app.logger.info(f"Evicted {evicted} cached image copies")
+
+image_transformer = ImageTransformer()
@@ -0,0 +1,114 @@
+"""
+Buffered post view counter
+
+Public reads record views in memory; a background thread folds them into
+blog_posts with one batched UPDATE ... SET view_count = view_count + n.
+"""
+import atexit
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, func, select, update
+
+class ViewCounter:
+    """Per-process buffer of pending view increments keyed by post id"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 30
+        self.threshold = 100
+        self._pending = {}
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        # Without background workers every view is written inline
+        self.interval = app.config.get('VIEW_COUNT_FLUSH_INTERVAL', 30) if app.config.get('BACKGROUND_WORKERS') else 0
+        self.threshold = app.config.get('VIEW_COUNT_FLUSH_THRESHOLD', 100)
+        app.extensions['view_counter'] = self
+
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def record(self, post_id):
+        """Count one view of a post without touching the database"""
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + 1
+            self._pending_total += 1
+            full = self._pending_total >= self.threshold
+
+        if self.interval <= 0:
+            self.flush()
+        elif full:
+            self._wake.set()
+
+    def pending(self, post_id):
+        """Views recorded by this process that are not yet in the database"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """Write all buffered increments in one statement; returns posts updated"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._pending_total = 0
+        if not batch:
+            return 0
+
+        if has_app_context():
+            return self._write(batch)
+        with self.app.app_context():
+            return self._write(batch)
+
+    def _write(self, batch):
+        from __init__ import db
+        from shared_models import get_blog_post
+        posts = get_blog_post().__table__
+        stmt = update(posts)\
+            .where(posts.c.id == bindparam('post_id'))\
+            .values(
+                view_count=func.coalesce(posts.c.view_count, 0) + bindparam('increment'),
+                # A view is not an edit: keep updated_at (and Last-Modified) unchanged
+                updated_at=posts.c.updated_at
+            )
+
+        # Its own connection, so an inline flush never commits or discards
+        # whatever the request's session has pending
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(stmt, [
+                    {'post_id': post_id, 'increment': n} for post_id, n in batch.items()
+                ])
+                slugs = connection.execute(select(posts.c.slug).where(posts.c.id.in_(list(batch)))).scalars().all()
+        except Exception as e:
+            self._restore(batch)
+            current_app.logger.error(f"Failed to flush view counts: {str(e)}")
+            return 0
+
+        # Cached post payloads carry the stored count; refresh the ones just
+        # bumped without touching their content tag, which their ETag follows
+        from utils.cache import response_cache, post_views_tag
+        response_cache.invalidate(*(post_views_tag(slug) for slug in slugs))
+
+        return len(batch)
+
+    def _restore(self, batch):
+        """Put a failed batch back so its views are retried on the next flush"""
+        with self._lock:
+            for post_id, n in batch.items():
+                self._pending[post_id] = self._pending.get(post_id, 0) + n
+                self._pending_total += n
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+view_counter = ViewCounter()
@@ -5,6 +5,7 @@ export const API_BASE_URL = process.env.REACT_APP_API_URL || 'https://isodigm.ca
 export const API_ENDPOINTS = {
   // Authentication
   LOGIN: `https://isodigm.ca/api/login`,
+  REFRESH: `https://isodigm.ca/api/refresh`,
   REGISTER: `https://isodigm.ca/api/register`,
   REGISTER_ADMIN: `https://isodigm.ca/api/register_user`,
   VERIFY_EMAIL: `https://isodigm.ca/api/verify-email`,
@@ -14,6 +15,8 @@ export const API_ENDPOINTS = {
   BLOG_POSTS: `${API_BASE_URL}/blog/posts`,
   BLOG_POST_BY_ID: (id) => `${API_BASE_URL}/blog/posts/${id}`,
   BLOG_POST_BY_SLUG: (slug) => `${API_BASE_URL}/blog/posts/${slug}`,
+  BLOG_POST_VIEWS: (id) => `${API_BASE_URL}/blog/posts/${id}/views`,
+  BLOG_SEARCH: `${API_BASE_URL}/blog/search`,
   
   // Categories
   BLOG_CATEGORIES: `${API_BASE_URL}/blog/categories`,
@@ -3,6 +3,10 @@ import ReactDOM from 'react-dom/client';
 import './index.css';
 import App from './App';
 import reportWebVitals from './reportWebVitals';
+import { installTokenRefresh } from './utils/tokenRefresh';
+
+// Renew expired access tokens transparently on 401 responses
+installTokenRefresh();
 
 const root = ReactDOM.createRoot(document.getElementById('root'));
 root.render(
@@ -27,6 +27,8 @@ const BlogPage = () => {
         total: 0,
         pages: 0
     });
+    // Search results are cursor-paginated; searchCursors[n] fetches page n + 1
+    const [searchCursors, setSearchCursors] = useState(['']);
 
     // Analytics hooks
     const analytics = useAnalytics();
@@ -49,9 +51,47 @@ const BlogPage = () => {
         fetchCategories();
     }, [slug, filters, pagination.current_page]);
 
+    const fetchSearchResults = async (searchTerm) => {
+        const page = pagination.current_page;
+        const queryParams = new URLSearchParams({
+            q: searchTerm,
+            per_page: pagination.per_page,
+            cursor: searchCursors[page - 1] || '',
+            ...(filters.category && { category: filters.category })
+        });
+
+        const response = await fetch(`${API_ENDPOINTS.BLOG_SEARCH}?${queryParams}`);
+        if (!response.ok) {
+            console.error('Failed to search posts');
+            setPosts([]);
+            return;
+        }
+
+        const data = await response.json();
+        setPosts(data.results || []);
+        if (data.next_cursor) {
+            setSearchCursors(prev => {
+                const cursors = prev.slice(0, page);
+                cursors[page] = data.next_cursor;
+                return cursors;
+            });
+        }
+        setPagination(prev => ({
+            ...prev,
+            total: data.results ? data.results.length : 0,
+            pages: data.next_cursor ? page + 1 : page
+        }));
+    };
+
     const fetchPosts = async () => {
         try {
             setLoading(true);
+            const searchTerm = filters.search.trim();
+            if (searchTerm) {
+                await fetchSearchResults(searchTerm);
+                return;
+            }
+
             const queryParams = new URLSearchParams({
                 page: pagination.current_page,
                 per_page: pagination.per_page,
@@ -90,6 +130,10 @@ const BlogPage = () => {
             if (response.ok) {
                 const post = await response.json();
                 setCurrentPost(post);
+                // nginx served the pre-rendered copy, so the API has not counted this view
+                if (response.headers.get('X-Prerendered')) {
+                    fetch(API_ENDPOINTS.BLOG_POST_VIEWS(post.id), { method: 'POST' }).catch(() => {});
+                }
                 setPostNotFound(false);
             } else {
                 console.error('Failed to fetch post');
@@ -147,6 +191,7 @@ const BlogPage = () => {
     const handleCategoryFilter = (categoryValue) => {
         setFilters(prev => ({ ...prev, category: categoryValue }));
         setPagination(prev => ({ ...prev, current_page: 1 }));
+        setSearchCursors(['']);
         
         // Track category filtering
         if (categoryValue) {
@@ -157,6 +202,7 @@ const BlogPage = () => {
     const handleSearchInput = (searchTerm) => {
         setFilters(prev => ({ ...prev, search: searchTerm }));
         setPagination(prev => ({ ...prev, current_page: 1 }));
+        setSearchCursors(['']);
         
         // Track search (debounced)
         if (searchTerm.length > 2) {
@@ -170,6 +216,7 @@ const BlogPage = () => {
     const handleClearFilters = () => {
         setFilters({ category: '', search: '' });
         setPagination(prev => ({ ...prev, current_page: 1 }));
+        setSearchCursors(['']);
         
         // Track filter clearing
         analytics.trackEvent('filters_cleared', {
@@ -462,6 +509,40 @@ const BlogPage = () => {
                         </div>
                     )}
                     
+                    {/* Related Posts */}
+                    {currentPost.related_posts && currentPost.related_posts.length > 0 && (
+                        <div className="blog-divider" style={{
+                            paddingTop: '32px',
+                            borderTop: '1px solid',
+                            marginBottom: '40px'
+                        }}>
+                            <h3 className="blog-post-title" style={{
+                                fontSize: '18px',
+                                fontWeight: '600',
+                                margin: '0 0 16px 0'
+                            }}>
+                                Related posts
+                            </h3>
+                            <div style={{ display: 'flex', flexDirection: 'column', gap: '12px' }}>
+                                {currentPost.related_posts.map(related => (
+                                    <Link
+                                        key={related.id}
+                                        to={`/blog/${related.slug}`}
+                                        className="blog-nav-link"
+                                        style={{ textDecoration: 'none' }}
+                                    >
+                                        <span style={{ fontWeight: '500' }}>{related.title}</span>
+                                        {related.published_at && (
+                                            <span className="blog-post-meta" style={{ fontSize: '14px', marginLeft: '8px' }}>
+                                                {formatDate(related.published_at)}
+                                            </span>
+                                        )}
+                                    </Link>
+                                ))}
+                            </div>
+                        </div>
+                    )}
+                    
                     {/* Comments Section */}
                     <BlogComments 
                         post={currentPost} 
@@ -641,7 +722,14 @@ const BlogPage = () => {
                                             {post.title}
                                         </h2>
                                         
-                                        {post.excerpt && (
+                                        {post.snippet ? (
+                                            // Search snippets arrive HTML-escaped with <mark> around matches
+                                            <p className="blog-post-meta" style={{
+                                                marginBottom: '16px',
+                                                lineHeight: '1.5',
+                                                margin: '0 0 16px 0'
+                                            }} dangerouslySetInnerHTML={{ __html: post.snippet }} />
+                                        ) : post.excerpt && (
                                             <p className="blog-post-meta" style={{
                                                 marginBottom: '16px',
                                                 lineHeight: '1.5',
@@ -43,7 +43,8 @@ function LoginPage() {
       // Save user session data and token in local storage with expiry time
       const expiryTime = new Date().getTime() + 30 * 24 * 60 * 60 * 1000; // 30 days from now
       localStorage.setItem('user', JSON.stringify({ data: data.user, expiry: expiryTime }));
-      localStorage.setItem('token', data.token); // Store JWT token
+      localStorage.setItem('token', data.token); // Store short-lived JWT access token
+      localStorage.setItem('refresh_token', data.refresh_token); // Used to renew the access token
       navigate('/');
     } else {
       // Handle login error. You might want to set some error state here
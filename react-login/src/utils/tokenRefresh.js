@@ -0,0 +1,58 @@
+// Transparent access-token refresh for authenticated API calls
+import { API_ENDPOINTS } from '../config/constants';
+
+let refreshInFlight = null;
+
+// Exchange the stored refresh token for a new access token (shared by concurrent callers)
+const refreshAccessToken = (originalFetch) => {
+  if (!refreshInFlight) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshInFlight = (async () => {
+      if (!refreshToken) {
+        return null;
+      }
+      try {
+        const response = await originalFetch(API_ENDPOINTS.REFRESH, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh_token: refreshToken })
+        });
+        const data = await response.json();
+        if (!response.ok || !data.refreshed) {
+          localStorage.removeItem('refresh_token');
+          return null;
+        }
+        localStorage.setItem('token', data.token);
+        return data.token;
+      } catch (error) {
+        return null;
+      }
+    })().finally(() => {
+      refreshInFlight = null;
+    });
+  }
+  return refreshInFlight;
+};
+
+// Wrap window.fetch so a 401 on a Bearer request refreshes the access token and retries once
+export const installTokenRefresh = () => {
+  const originalFetch = window.fetch.bind(window);
+
+  window.fetch = async (input, init = {}) => {
+    const response = await originalFetch(input, init);
+    const headers = new Headers(init.headers || {});
+    const authorization = headers.get('Authorization');
+
+    if (response.status !== 401 || !authorization || !authorization.startsWith('Bearer ')) {
+      return response;
+    }
+
+    const token = await refreshAccessToken(originalFetch);
+    if (!token) {
+      return response;
+    }
+
+    headers.set('Authorization', `Bearer ${token}`);
+    return originalFetch(input, { ...init, headers });
+  };
+};